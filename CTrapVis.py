@@ -51,7 +51,7 @@ button opens a new window used to track lines and extract data using the algorit
 in the pylake library.
 
 Tested in Python 3.8.6
-Modules Used: numpy, lumicks.pylake, matplotlib, tkinter, pandas, glob, os, tifffile
+Modules Used: numpy, lumicks.pylake, matplotlib, tkinter, pandas, glob, os, tifffile, h5py
 If any of the modules are not avaliable run "pip install moduleName" in terminal
 or "conda install moduleName"
 
@@ -67,6 +67,8 @@ matplotlib.use("Agg")
 import os
 import glob
 from matplotlib import pyplot as plt
+import matplotlib.figure
+import matplotlib.image
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg, NavigationToolbar2Tk)
 import tkinter as tk
 from tkinter import filedialog
@@ -74,17 +76,2087 @@ from tkinter import ttk
 import pandas as pd
 import math
 import tifffile as tiff
+from collections import OrderedDict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import sqlite3
+import json
+import hashlib
+import uuid
+import h5py
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+from kymotracker_tiles import (share_channel_data, track_image, detach_channel_data, attach_channel_data, plan_tracking_tiles,
+                               track_time_tile, stitch_tile_lines, build_stitched_lines)
+import zipfile
+import sys
+import argparse
+import fnmatch
+import itertools
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None #only needed for the Parquet exports
+    pq = None
+try:
+    import zarr
+except ImportError:
+    zarr = None #only needed for the Zarr photon count export
+
+#worker processes of the GUI are started with spawn instead of fork - the GUI process already runs threads
+#(prefetching, indexing, drawing) and a forked child could inherit their h5py/BLAS/allocator locks held
+processContext = multiprocessing.get_context("spawn")
 
 # test version info of lumicks.pylake to make sure the image reconstruction bug is avoided
 if int((lk.__version__).split(".")[1]) < 8:
     raise ValueError("Please update your lumicks.pylake package (with the command 'pip install --upgrade lumicks.pylake') to update to at least version 0.8.1 to fix an image reconstruction bug/have KymoTracking functionalities")
 
+"""
+Cache of open lumicks.pylake File objects shared by every callback in the GUI.
+Opening a multi-GB .h5 file and parsing its structure is slow, so every callback
+asks the cache for the file instead of calling lk.File() again. Files are keyed
+by their absolute path and modification time (a re-exported file gets reopened)
+and the least recently used file is dropped once more than maxOpenFiles are open.
+The hit/miss counts are printed when the GUI is closed.
+"""
+class H5FileCache():
+    def __init__(self, maxOpenFiles=4):
+        self.maxOpenFiles = maxOpenFiles
+        self.hits = 0
+        self.misses = 0
+        self._openFiles = OrderedDict()
+        self._lock = threading.Lock() #the prefetch threads share the cache with the Tk thread
+
+    def get(self, filepath):
+        absolutePath = os.path.abspath(filepath)
+        key = (absolutePath, os.path.getmtime(absolutePath))
+
+        with self._lock:
+            if key in self._openFiles:
+                self.hits += 1
+                self._openFiles.move_to_end(key)
+                return self._openFiles[key]
+
+            self.misses += 1
+
+        #opened outside the lock so a prefetch thread opening a large file does not hold up cache hits on the Tk thread
+        #the path is passed as given so that h5.filename stays relative to the working directory (used for save names)
+        h5file = lk.File(filepath)
+
+        with self._lock:
+            if key in self._openFiles:
+                #another thread opened the same file in the meantime - keep the handle that is already shared
+                self._openFiles.move_to_end(key)
+                return self._openFiles[key]
+
+            #a different modification time means the file changed on disk - forget the old handle
+            for staleKey in [k for k in self._openFiles if k[0] == absolutePath]:
+                del self._openFiles[staleKey]
+            self._openFiles[key] = h5file
+
+            #dropping the reference lets h5py close the file once no plot/export is still using it
+            while len(self._openFiles) > self.maxOpenFiles:
+                self._openFiles.popitem(last=False)
+        return h5file
+
+    def clear(self):
+        with self._lock:
+            self._openFiles.clear()
+        return
+
+    def __repr__(self):
+        return f"H5FileCache({len(self._openFiles)}/{self.maxOpenFiles} files open, {self.hits} hits, {self.misses} misses)"
+
+"""
+List the kymos/scans/fdcurves of a file in the format used by the "File Components"
+pulldown, along with the available Distance and Trap position channels.
+"""
+def list_h5_components(h5file):
+    listOfFileTypes = []
+    for key in h5file.kymos.keys():
+        listOfFileTypes.append('kymos-'+key)
+    for key in h5file.scans.keys():
+        listOfFileTypes.append('scans-'+key)
+    for key in h5file.fdcurves.keys():
+        listOfFileTypes.append('fdcurves-'+key)
+    
+    try:
+        listOfDistOptions = [i for i in h5file['Distance']]
+    except:
+        listOfDistOptions = []
+    try:
+        listOfTrapPos = [i for i in h5file['Trap position']]
+    except:
+        listOfTrapPos = []
+    return listOfFileTypes, listOfDistOptions, listOfTrapPos
+
+"""
+Decode the photon counts (rgb_image) of a "kymos-..." or "scans-..." component string.
+fdcurves have no photon counts and return 0, which the GUI uses for "no color data".
+"""
+def load_component_rgb(h5file, componentString):
+    componentType = componentString.split('-')[0]
+    componentName = "-".join(componentString.split('-')[1:])
+    if componentType == "kymos":
+        return h5file.kymos[componentName].rgb_image
+    elif componentType == "scans":
+        return h5file.scans[componentName].rgb_image
+    return 0
+
+"""
+Shape of the rgb_image of a "kymos-..." or "scans-..." component, worked out from the scan
+metadata instead of reconstructing the image: (pixels per line, number of lines, 3) for a
+kymo - the number of lines comes from the pixel ends in the infowave, an incomplete last
+line counting as a line like in the reconstruction - and
+([frames,] lines per frame, pixels per line, 3) for a scan. fdcurves return None.
+"""
+def component_image_shape(h5file, componentString):
+    componentType = componentString.split('-')[0]
+    componentName = "-".join(componentString.split('-')[1:])
+    if componentType == "kymos":
+        kymoPointer = h5file.kymos[componentName]
+        pixelsPerLine = int(kymoPointer.pixels_per_line)
+        numberOfPixels = int(np.count_nonzero(np.asarray(kymoPointer.infowave.data) == 2)) #2 marks the end of a pixel
+        return (pixelsPerLine, -(-numberOfPixels // pixelsPerLine), 3)
+    elif componentType == "scans":
+        scanPointer = h5file.scans[componentName]
+        frameShape = (int(scanPointer.lines_per_frame), int(scanPointer.pixels_per_line), 3)
+        if scanPointer.num_frames == 1:
+            return frameShape
+        return (int(scanPointer.num_frames),) + frameShape
+    return None
+
+"""
+Two-tier cache of decoded photon counts (the rgb_image of a kymo or scan).
+Decoded arrays are kept in memory up to maxMemoryMB, least recently used first out,
+and every decoded array is also written as a .npy file to a .ctrapvis_cache folder
+next to the .h5 file (capped at maxDiskMB), so going back to an earlier component or
+reopening the file in a later session skips the image reconstruction.
+Entries are keyed by the absolute path, modification time and component of the file.
+Cached arrays are made read-only since the same array is handed to every caller.
+With memoryMap=True the image is instead reconstructed one color channel at a time
+straight into the .npy file and returned as a read-only np.memmap, so kymographs
+larger than the available memory never have to be resident as a whole.
+"""
+class PhotonCountCache():
+    spillFolderName = ".ctrapvis_cache"
+
+    def __init__(self, maxMemoryMB=1024, maxDiskMB=8192):
+        self.maxMemory = maxMemoryMB * 1024**2
+        self.maxDisk = maxDiskMB * 1024**2
+        self.bytesInMemory = 0
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, filepath, componentString):
+        absolutePath = os.path.abspath(filepath)
+        return (absolutePath, os.path.getmtime(absolutePath), componentString)
+
+    def _spill_path(self, key):
+        keyHash = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(os.path.dirname(key[0]), self.spillFolderName, keyHash + ".npy")
+
+    def get(self, h5file, filepath, componentString, memoryMap=False):
+        key = self._key(filepath, componentString)
+        with self._lock:
+            if key in self._arrays and not memoryMap:
+                self.memoryHits += 1
+                self._arrays.move_to_end(key)
+                return self._arrays[key]
+
+        spillPath = self._spill_path(key)
+        if os.path.exists(spillPath):
+            try:
+                if memoryMap:
+                    colorData = np.load(spillPath, mmap_mode='r')
+                else:
+                    colorData = np.load(spillPath)
+                os.utime(spillPath) #mark as recently used for the disk clean up
+                self.diskHits += 1
+                if not memoryMap:
+                    self._store(key, colorData)
+                return colorData
+            except (OSError, ValueError) as e:
+                print(f"Could not read cached photon counts {spillPath}: {e}")
+
+        self.misses += 1
+        if memoryMap and componentString.split('-')[0] in ("kymos", "scans"):
+            try:
+                return self._build_memmap(h5file, componentString, spillPath)
+            except OSError as e:
+                print(f"Could not memory-map the photon counts, loading them into memory instead: {e}")
+        #make room before decoding, so the decoded array never sits on top of a full cache
+        self._make_room(self.expected_nbytes(h5file, componentString))
+        colorData = load_component_rgb(h5file, componentString)
+        if isinstance(colorData, np.ndarray):
+            self._spill(spillPath, colorData)
+            self._store(key, colorData)
+        return colorData
+
+    def _build_memmap(self, h5file, componentString, spillPath):
+        componentName = "-".join(componentString.split('-')[1:])
+        if componentString.split('-')[0] == "kymos":
+            componentPointer = h5file.kymos[componentName]
+        else:
+            componentPointer = h5file.scans[componentName]
+
+        os.makedirs(os.path.dirname(spillPath), exist_ok=True)
+        temporaryPath = spillPath[:-4] + f".{os.getpid()}.{threading.get_ident()}.tmp.npy"
+        #only one decoded color channel is in memory at a time - same layout as rgb_image
+        redChannel = componentPointer.red_image
+        colorData = np.lib.format.open_memmap(temporaryPath, mode='w+', dtype=redChannel.dtype, shape=redChannel.shape + (3,))
+        colorData[..., 0] = redChannel
+        del redChannel
+        colorData[..., 1] = componentPointer.green_image
+        colorData[..., 2] = componentPointer.blue_image
+        colorData.flush()
+        del colorData
+        os.replace(temporaryPath, spillPath)
+        self._trim_spill_folder(os.path.dirname(spillPath))
+        return np.load(spillPath, mmap_mode='r')
+
+    @staticmethod
+    def expected_nbytes(h5file, componentString):
+        #upper bound from the metadata (8 bytes per count) - fdcurves have no photon counts
+        shape = component_image_shape(h5file, componentString)
+        return 0 if shape is None else int(np.prod(shape)) * 8
+
+    def _make_room(self, nbytes):
+        if nbytes > self.maxMemory:
+            return #will not be kept in memory anyway
+        with self._lock:
+            while self._arrays and self.bytesInMemory + nbytes > self.maxMemory:
+                self.bytesInMemory -= self._arrays.popitem(last=False)[1].nbytes
+        return
+
+    def _store(self, key, colorData):
+        colorData.setflags(write=False)
+        if colorData.nbytes > self.maxMemory:
+            return
+        with self._lock:
+            if key not in self._arrays:
+                self._arrays[key] = colorData
+                self.bytesInMemory += colorData.nbytes
+            while self.bytesInMemory > self.maxMemory:
+                self.bytesInMemory -= self._arrays.popitem(last=False)[1].nbytes
+        return
+
+    def _spill(self, spillPath, colorData):
+        try:
+            os.makedirs(os.path.dirname(spillPath), exist_ok=True)
+            #write to a temporary name first so a half written file is never read back
+            temporaryPath = spillPath[:-4] + f".{os.getpid()}.{threading.get_ident()}.tmp.npy"
+            np.save(temporaryPath, colorData)
+            os.replace(temporaryPath, spillPath)
+            self._trim_spill_folder(os.path.dirname(spillPath))
+        except OSError as e:
+            print(f"Could not write cached photon counts to {spillPath}: {e}")
+        return
+
+    def _trim_spill_folder(self, spillFolder):
+        spilledFiles = [os.path.join(spillFolder, f) for f in os.listdir(spillFolder) if f.endswith(".npy") and ".tmp" not in f]
+        spilledFiles.sort(key=os.path.getmtime)
+        totalSize = sum(os.path.getsize(f) for f in spilledFiles)
+        while totalSize > self.maxDisk and len(spilledFiles) > 1:
+            oldestFile = spilledFiles.pop(0)
+            totalSize -= os.path.getsize(oldestFile)
+            os.remove(oldestFile)
+        return
+
+    def __repr__(self):
+        return (f"PhotonCountCache({len(self._arrays)} arrays, {self.bytesInMemory/1024**2:.1f}/{self.maxMemory/1024**2:.0f} MB in memory, "
+                f"{self.memoryHits} memory hits, {self.diskHits} disk hits, {self.misses} misses)")
+
+"""
+In-memory cache of force, distance and trap position slices.
+Entries are keyed by the .h5 file (path and modification time), the channel group and name,
+the start/stop timestamps and the downsampling factor, and hold the data and timestamps
+together so the slice is only read (and downsampled) once no matter how many times it is
+plotted. Channel names "Force 1" to "Force 4" are the magnitude of the x and y channels of
+that bead and are built from (and cached next to) the two cached components.
+Cached arrays are made read-only since the same arrays are handed to every caller.
+"""
+class ForceSliceCache():
+    def __init__(self, maxMemoryMB=512):
+        self.maxMemory = maxMemoryMB * 1024**2
+        self.bytesInMemory = 0
+        self.hits = 0
+        self.misses = 0
+        self._slices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, h5file, group, channel, t0, t1, factor):
+        try:
+            absolutePath = os.path.abspath(h5file.h5.filename)
+            fileKey = (absolutePath, os.path.getmtime(absolutePath))
+        except (AttributeError, OSError):
+            fileKey = (id(h5file),)
+        return fileKey + (group, channel, t0, t1, int(factor))
+
+    def get(self, h5file, group, channel, t0, t1, factor=1):
+        key = self._key(h5file, group, channel, t0, t1, factor)
+        with self._lock:
+            if key in self._slices:
+                self.hits += 1
+                self._slices.move_to_end(key)
+                return self._slices[key]
+
+        self.misses += 1
+        if group.startswith("Force") and channel[-1].isdigit():
+            #magnitude of the x and y force on one bead
+            xComponent, timestamps = self.get(h5file, group, channel + "x", t0, t1, factor)
+            yComponent = self.get(h5file, group, channel + "y", t0, t1, factor)[0]
+            data = np.sqrt(np.square(xComponent) + np.square(yComponent))
+        else:
+            channelSlice = h5file[group][channel][t0 : t1]
+            if factor > 1:
+                channelSlice = channelSlice.downsampled_by(int(factor))
+            data = np.asarray(channelSlice.data)
+            timestamps = np.asarray(channelSlice.timestamps)
+        self._store(key, data, timestamps)
+        return data, timestamps
+
+    def _store(self, key, data, timestamps):
+        data.setflags(write=False)
+        timestamps.setflags(write=False)
+        entrySize = data.nbytes + timestamps.nbytes
+        if entrySize > self.maxMemory:
+            return
+        with self._lock:
+            if key not in self._slices:
+                self._slices[key] = (data, timestamps)
+                self.bytesInMemory += entrySize
+            while self.bytesInMemory > self.maxMemory:
+                oldData, oldTimestamps = self._slices.popitem(last=False)[1]
+                self.bytesInMemory -= oldData.nbytes + oldTimestamps.nbytes
+        return
+
+    def clear(self):
+        with self._lock:
+            self._slices.clear()
+            self.bytesInMemory = 0
+        return
+
+    def __repr__(self):
+        return (f"ForceSliceCache({len(self._slices)} slices, {self.bytesInMemory/1024**2:.1f}/{self.maxMemory/1024**2:.0f} MB, "
+                f"{self.hits} hits, {self.misses} misses)")
+
+"""
+Multi-rate summary of the high-frequency channels of one .h5 file, kept as a sidecar HDF5
+file in the .ctrapvis_cache folder next to it (build() writes it once, "Build Force Index").
+For every continuous channel of Force HF and Trap position, level r holds the min, max, mean
+and count of every block of r samples for r = 4, 16, 64, ... - the top level has about a
+thousand blocks. block_means() answers a downsampled slice by averaging whole blocks of the
+finest level that still leaves at least 32 blocks per output point, so the result is read in
+time proportional to its length. The magnitude 'Force 1'/'Force 2'... is the magnitude of the
+x and y block means, the same as ForceSliceCache gives for a downsampled slice. The blocks are aligned to the start of the channel rather than to the slice,
+and the downsample factor is rounded to a whole number of blocks (within ~1.5%).
+Returns None when the factor is too small for the index, which then reads the raw data.
+build() calls releaseSidecar() right before the new index replaces the sidecar, so an index that
+is still open on it can be closed first (an open file cannot be replaced on Windows).
+"""
+class ForcePyramid():
+    spillFolderName = ".ctrapvis_cache"
+    chunkSamples = 4**10 #raw samples read per step while building - keeps the finer levels aligned
+    minBlocksPerPoint = 32
+
+    def __init__(self, filepath):
+        self.filepath = os.path.abspath(filepath)
+        self.sidecarPath = self.sidecar_path(self.filepath)
+        self._sidecar = h5py.File(self.sidecarPath, "r")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def sidecar_path(cls, filepath):
+        filepath = os.path.abspath(filepath)
+        return os.path.join(os.path.dirname(filepath), cls.spillFolderName, os.path.basename(filepath)[:-3] + ".forcepyramid.h5")
+
+    @classmethod
+    def is_current(cls, filepath):
+        sidecarPath = cls.sidecar_path(filepath)
+        if not os.path.exists(sidecarPath):
+            return False
+        try:
+            with h5py.File(sidecarPath, "r") as sidecar:
+                return (sidecar.attrs["sourceSize"] == os.path.getsize(filepath)
+                        and sidecar.attrs["sourceMtime"] == os.path.getmtime(filepath))
+        except (OSError, KeyError):
+            return False
+
+    @staticmethod
+    def _continuous_channels(h5):
+        channels = []
+        for group in ("Force HF", "Trap position"):
+            if group not in h5:
+                continue
+            for channel in h5[group]:
+                dataset = h5[group][channel]
+                if isinstance(dataset, h5py.Dataset) and dataset.dtype.names is None and "Sample rate (Hz)" in dataset.attrs:
+                    channels.append((group, channel))
+        return channels
+
+    @staticmethod
+    def _reduce(blockMin, blockMax, blockMean, blockCount):
+        #combine every 4 blocks into one - a partial last block is padded with empty blocks
+        padding = (-len(blockMin)) % 4
+        if padding:
+            blockMin = np.concatenate([blockMin, np.full(padding, np.inf)])
+            blockMax = np.concatenate([blockMax, np.full(padding, -np.inf)])
+            blockMean = np.concatenate([blockMean, np.zeros(padding)])
+            blockCount = np.concatenate([blockCount, np.zeros(padding, dtype=blockCount.dtype)])
+        blockCount = blockCount.reshape(-1, 4)
+        counts = blockCount.sum(axis=1)
+        means = (blockMean.reshape(-1, 4) * blockCount).sum(axis=1) / np.maximum(counts, 1)
+        return blockMin.reshape(-1, 4).min(axis=1), blockMax.reshape(-1, 4).max(axis=1), means, counts
+
+    @classmethod
+    def build(cls, h5file, filepath, progress=print, releaseSidecar=None):
+        filepath = os.path.abspath(filepath)
+        sidecarPath = cls.sidecar_path(filepath)
+        os.makedirs(os.path.dirname(sidecarPath), exist_ok=True)
+        temporaryPath = sidecarPath[:-3] + f".{threading.get_ident()}.tmp.h5"
+        h5 = h5file.h5
+        with h5py.File(temporaryPath, "w") as sidecar:
+            for group, channel in cls._continuous_channels(h5):
+                progress(f"Indexing {group}/{channel} of {os.path.basename(filepath)}")
+                sourceDataset = h5[group][channel]
+                totalSamples = len(sourceDataset)
+                if totalSamples == 0:
+                    continue
+                channelGroup = sidecar.create_group(f"{group}/{channel}")
+                channelGroup.attrs["start"] = int(sourceDataset.attrs["Start time (ns)"])
+                channelGroup.attrs["sampleRate"] = float(sourceDataset.attrs["Sample rate (Hz)"])
+                channelGroup.attrs["samples"] = totalSamples
+
+                #the top level has about a thousand blocks
+                maxRatio = 4
+                while totalSamples // (maxRatio * 4) >= 1024:
+                    maxRatio *= 4
+
+                #levels up to the chunk size are complete within every chunk of raw samples
+                for firstSample in range(0, totalSamples, cls.chunkSamples):
+                    chunk = np.asarray(sourceDataset[firstSample:min(firstSample + cls.chunkSamples, totalSamples)], dtype=np.float64)
+                    level = (chunk, chunk, chunk, np.ones(len(chunk), dtype=np.uint32))
+                    ratio = 1
+                    while ratio < min(maxRatio, cls.chunkSamples):
+                        level = cls._reduce(*level)
+                        ratio *= 4
+                        cls._append_level(channelGroup, ratio, level)
+
+                #coarser levels are built from the last complete one
+                if ratio < maxRatio:
+                    levelGroup = channelGroup[str(ratio)]
+                    level = tuple(levelGroup[name][:].astype(np.float64) for name in ("min", "max", "mean")) + (levelGroup["count"][:],)
+                    while ratio < maxRatio:
+                        level = cls._reduce(*level)
+                        ratio *= 4
+                        cls._append_level(channelGroup, ratio, level)
+            sidecar.attrs["sourceSize"] = os.path.getsize(filepath)
+            sidecar.attrs["sourceMtime"] = os.path.getmtime(filepath)
+        if releaseSidecar is not None:
+            releaseSidecar()
+        os.replace(temporaryPath, sidecarPath)
+        progress(f"Force index written to {sidecarPath}")
+        return sidecarPath
+
+    @staticmethod
+    def _append_level(channelGroup, ratio, level):
+        if str(ratio) not in channelGroup:
+            levelGroup = channelGroup.create_group(str(ratio))
+            for name, dtype in zip(("min", "max", "mean", "count"), (np.float32, np.float32, np.float32, np.uint32)):
+                levelGroup.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(65536,))
+        levelGroup = channelGroup[str(ratio)]
+        for name, values in zip(("min", "max", "mean", "count"), level):
+            dataset = levelGroup[name]
+            dataset.resize((len(dataset) + len(values),))
+            dataset[-len(values):] = values
+        return
+
+    def has_channel(self, group, channel):
+        return f"{group}/{channel}" in self._sidecar
+
+    def block_means(self, group, channel, t0, t1, factor):
+        if group.startswith("Force") and channel[-1].isdigit():
+            #magnitude of the averaged x and y force on one bead
+            xSlice = self.block_means(group, channel + "x", t0, t1, factor)
+            ySlice = self.block_means(group, channel + "y", t0, t1, factor)
+            if xSlice is None or ySlice is None:
+                return None
+            return np.sqrt(np.square(xSlice[0]) + np.square(ySlice[0])), xSlice[1]
+        with self._lock:
+            #an index closed for a rebuild reads the raw data instead
+            if not self._sidecar or not self.has_channel(group, channel):
+                return None
+            channelGroup = self._sidecar[f"{group}/{channel}"]
+            ratios = sorted(int(ratio) for ratio in channelGroup)
+            usableRatios = [ratio for ratio in ratios if factor / ratio >= self.minBlocksPerPoint]
+            if len(usableRatios) == 0:
+                return None
+            ratio = usableRatios[-1]
+            blocksPerPoint = int(round(factor / ratio))
+
+            start = int(channelGroup.attrs["start"])
+            dt = 1e9 / float(channelGroup.attrs["sampleRate"])
+            samples = int(channelGroup.attrs["samples"])
+            firstSample = 0 if t0 in ('', None) else int(np.clip(np.ceil((int(t0) - start) / dt), 0, samples))
+            lastSample = samples if t1 in ('', None) else int(np.clip(np.ceil((int(t1) - start) / dt), 0, samples))
+            firstBlock = -(-firstSample // ratio)
+            points = max((lastSample // ratio - firstBlock) // blocksPerPoint, 0)
+
+            levelGroup = channelGroup[str(ratio)]
+            blockMean = levelGroup["mean"][firstBlock:firstBlock + points * blocksPerPoint].astype(np.float64)
+            blockCount = levelGroup["count"][firstBlock:firstBlock + points * blocksPerPoint].astype(np.float64)
+        blockMean = blockMean.reshape(points, blocksPerPoint)
+        blockCount = blockCount.reshape(points, blocksPerPoint)
+        data = (blockMean * blockCount).sum(axis=1) / np.maximum(blockCount.sum(axis=1), 1)
+        #timestamps at the middle of every averaged block, like downsampled_by
+        samplesPerPoint = ratio * blocksPerPoint
+        pointStarts = (firstBlock * ratio + np.arange(points) * samplesPerPoint).astype(np.float64)
+        timestamps = (start + (pointStarts + (samplesPerPoint - 1) / 2) * dt).astype(np.int64)
+        return data, timestamps
+
+    def close(self):
+        with self._lock: #not while block_means is reading
+            self._sidecar.close()
+        return
+
+    def __repr__(self):
+        return f"ForcePyramid({self.sidecarPath})"
+
+"""
+Streams selected force channels of a file to disk without loading a whole high-frequency channel.
+hfChannels is a list of (column name, Force HF channel name). Those channels are read straight from the
+.h5 file in blocks of chunkSamples. downsampledColumns is a list of (column name, array) that is small
+enough to write at once. ".csv" keeps the layout of the original export in <name>_force.csv:
+high-frequency and downsampled columns side by side, with the shorter columns left empty.
+".parquet", ".h5" and ".npz" store the two tables separately:
+- <name>_force.parquet and <name>_force_downsamp.parquet
+- the 'HF' and 'downsampled' groups of <name>_force.h5
+- the hf_* and downsamp_* arrays of <name>_force.npz
+"""
+def export_force_tables(h5file, filenameBase, hfChannels, downsampledColumns, fileFormat=".csv", chunkSamples=2**20, progress=print):
+    hfDatasets = OrderedDict((columnName, h5file.h5['Force HF'][channel]) for columnName, channel in hfChannels)
+    hfSamples = min(len(dataset) for dataset in hfDatasets.values()) if len(hfDatasets) > 0 else 0
+    if hfSamples > 0:
+        sampleRate = float(next(iter(hfDatasets.values())).attrs["Sample rate (Hz)"])
+    downsampledColumns = OrderedDict((columnName, np.asarray(values)) for columnName, values in downsampledColumns)
+
+    #blocks of the time column and the high-frequency channels in columnNames
+    def hf_blocks(columnNames):
+        for firstSample in range(0, hfSamples, chunkSamples):
+            lastSample = min(firstSample + chunkSamples, hfSamples)
+            block = OrderedDict()
+            for columnName in columnNames:
+                if columnName == 'Time (s)':
+                    block[columnName] = np.arange(firstSample, lastSample) / sampleRate
+                else:
+                    block[columnName] = np.asarray(hfDatasets[columnName][firstSample:lastSample])
+            progress(f"Exported {lastSample} of {hfSamples} samples ({100*lastSample/hfSamples:.0f}%)")
+            yield block
+    hfColumnNames = ['Time (s)'] + list(hfDatasets)
+
+    outputPaths = []
+    if fileFormat == ".csv":
+        outputPaths.append(filenameBase + "_force.csv")
+        downsampledFrame = pd.DataFrame(downsampledColumns)
+        with open(outputPaths[0], "w", newline="") as csvFile:
+            if hfSamples == 0:
+                downsampledFrame.to_csv(csvFile, sep=',', index=False, header=True)
+            firstRow = 0
+            for block in hf_blocks(hfColumnNames):
+                blockFrame = pd.DataFrame(block)
+                #the downsampled columns continue next to the high-frequency rows until they run out
+                downsampledPart = downsampledFrame.iloc[firstRow:firstRow + len(blockFrame)].reset_index(drop=True)
+                blockFrame = blockFrame.join(downsampledPart.reindex(blockFrame.index))
+                blockFrame.to_csv(csvFile, sep=',', index=False, header=(firstRow == 0), na_rep='')
+                firstRow += len(blockFrame)
+    elif fileFormat == ".parquet":
+        if pq is None:
+            raise ImportError("Parquet export needs the pyarrow module ('pip install pyarrow')")
+        if hfSamples > 0:
+            outputPaths.append(filenameBase + "_force.parquet")
+            parquetWriter = None
+            for block in hf_blocks(hfColumnNames):
+                blockTable = pa.table(block)
+                if parquetWriter is None:
+                    parquetWriter = pq.ParquetWriter(outputPaths[-1], blockTable.schema)
+                parquetWriter.write_table(blockTable)
+            parquetWriter.close()
+        if len(downsampledColumns) > 0:
+            outputPaths.append(filenameBase + "_force_downsamp.parquet")
+            pq.write_table(pa.table(downsampledColumns), outputPaths[-1])
+    elif fileFormat == ".h5":
+        outputPaths.append(filenameBase + "_force.h5")
+        with h5py.File(outputPaths[0], "w") as exportFile:
+            if hfSamples > 0:
+                hfGroup = exportFile.create_group("HF")
+                hfGroup.attrs["Sample rate (Hz)"] = sampleRate
+                firstRow = 0
+                for block in hf_blocks(hfColumnNames):
+                    for columnName, values in block.items():
+                        if columnName not in hfGroup:
+                            hfGroup.create_dataset(columnName, shape=(hfSamples,), dtype=values.dtype, chunks=True)
+                        hfGroup[columnName][firstRow:firstRow + len(values)] = values
+                    firstRow += len(values)
+            if len(downsampledColumns) > 0:
+                downsampledGroup = exportFile.create_group("downsampled")
+                for columnName, values in downsampledColumns.items():
+                    downsampledGroup.create_dataset(columnName, data=values)
+    elif fileFormat == ".npz":
+        outputPaths.append(filenameBase + "_force.npz")
+        def npz_key(prefix, columnName):
+            return prefix + columnName.replace(" (s)", "_s").replace(" ", "_")
+        #every column is streamed into its own .npy entry of the archive, one column at a time
+        with zipfile.ZipFile(outputPaths[0], "w", allowZip64=True) as npzFile:
+            for columnName in hfColumnNames if hfSamples > 0 else []:
+                columnDtype = np.dtype(np.float64) if columnName == 'Time (s)' else hfDatasets[columnName].dtype
+                with npzFile.open(npz_key("hf_", columnName) + ".npy", "w", force_zip64=True) as npyEntry:
+                    np.lib.format.write_array_header_2_0(npyEntry, {'descr': np.lib.format.dtype_to_descr(columnDtype), 'fortran_order': False, 'shape': (hfSamples,)})
+                    for block in hf_blocks([columnName]):
+                        npyEntry.write(np.ascontiguousarray(block[columnName], dtype=columnDtype).tobytes())
+            for columnName, values in downsampledColumns.items():
+                with npzFile.open(npz_key("downsamp_", columnName) + ".npy", "w", force_zip64=True) as npyEntry:
+                    np.lib.format.write_array(npyEntry, np.ascontiguousarray(values))
+    else:
+        raise ValueError(f"Unknown force export format {fileFormat}")
+    return outputPaths
+
+"""
+Writes photon counts (the rgb_image of a kymo or scan) in their own integer dtype, one block of
+scan lines (kymos) or frames (multi-frame scans) at a time so memory-mapped images are not loaded whole.
+metadata holds the component name, pixel size and line time, plus 'timestamps_ns': the start of every
+scan line of a kymo, of every frame of a multi-frame scan, or of the scan itself.
+".npz" - compressed arrays 'red', 'green', 'blue' and 'timestamps_ns' plus one array per metadata value
+".parquet" - one row per pixel (line/frame index, pixel position, timestamp_ns, red, green, blue),
+    with the remaining metadata as JSON in the file metadata (needs pyarrow)
+".zarr" - a group with the chunked array 'photon_counts' (color last) and 'timestamps_ns', metadata as attributes (needs zarr)
+"""
+def export_photon_counts(colorData, filenameBase, fileFormat, metadata, linesPerChunk=4096):
+    componentType = metadata['component'].split('-')[0]
+    timestamps = np.asarray(metadata['timestamps_ns'], dtype=np.int64)
+    otherMetadata = {key: value for key, value in metadata.items() if key != 'timestamps_ns'}
+    #the axis that is written in blocks and the names of the image axes
+    if componentType == "kymos":
+        blockAxis, axisNames = 1, ('pixel', 'line')
+    elif colorData.ndim > 3:
+        #about as many pixels per block of frames as in a block of kymo lines
+        blockAxis, axisNames, linesPerChunk = 0, ('frame', 'row', 'column'), max(linesPerChunk * 256 // (colorData.shape[1] * colorData.shape[2]), 1)
+    else:
+        blockAxis, axisNames = 0, ('row', 'column')
+
+    def blocks():
+        for firstIndex in range(0, colorData.shape[blockAxis], linesPerChunk):
+            blockSlice = [slice(None)] * colorData.ndim
+            blockSlice[blockAxis] = slice(firstIndex, firstIndex + linesPerChunk)
+            yield firstIndex, np.asarray(colorData[tuple(blockSlice)])
+
+    if fileFormat == ".npz":
+        outputPath = filenameBase + "_photon_counts.npz"
+        #every color is streamed into its own .npy entry of the archive block by block, like export_force_tables.
+        #Kymo blocks are runs of lines (the last axis of a color), so those entries are stored in Fortran order
+        fortranOrder = componentType == "kymos"
+        with zipfile.ZipFile(outputPath, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as npzFile:
+            for colorIndex, colorName in enumerate(('red', 'green', 'blue')):
+                with npzFile.open(colorName + ".npy", "w", force_zip64=True) as npyEntry:
+                    np.lib.format.write_array_header_2_0(npyEntry, {'descr': np.lib.format.dtype_to_descr(colorData.dtype), 'fortran_order': fortranOrder, 'shape': colorData.shape[:-1]})
+                    for firstIndex, block in blocks():
+                        colorBlock = block[..., colorIndex]
+                        npyEntry.write(np.ascontiguousarray(colorBlock.T if fortranOrder else colorBlock).tobytes())
+            for key, value in {'timestamps_ns': timestamps, **otherMetadata}.items():
+                with npzFile.open(key + ".npy", "w", force_zip64=True) as npyEntry:
+                    np.lib.format.write_array(npyEntry, np.asarray(value))
+    elif fileFormat == ".parquet":
+        if pq is None:
+            raise ImportError("Parquet export needs the pyarrow module ('pip install pyarrow')")
+        outputPath = filenameBase + "_photon_counts.parquet"
+        parquetWriter = None
+        for firstIndex, block in blocks():
+            positions = np.indices(block.shape[:-1])
+            positions[blockAxis] += firstIndex
+            columns = OrderedDict((name, positions[i].ravel()) for i, name in enumerate(axisNames))
+            if len(timestamps) > 1:
+                columns['timestamp_ns'] = timestamps[positions[blockAxis].ravel()]
+            for colorIndex, colorName in enumerate(('red', 'green', 'blue')):
+                columns[colorName] = block[..., colorIndex].ravel()
+            blockTable = pa.table(columns)
+            if parquetWriter is None:
+                schema = blockTable.schema.with_metadata({'ctrapvis': json.dumps({**otherMetadata, 'start_ns': int(timestamps[0])})})
+                parquetWriter = pq.ParquetWriter(outputPath, schema)
+            parquetWriter.write_table(blockTable.replace_schema_metadata(schema.metadata))
+        parquetWriter.close()
+    elif fileFormat == ".zarr":
+        if zarr is None:
+            raise ImportError("Zarr export needs the zarr module ('pip install zarr')")
+        outputPath = filenameBase + "_photon_counts.zarr"
+        chunkShape = list(colorData.shape)
+        chunkShape[blockAxis] = min(linesPerChunk, colorData.shape[blockAxis])
+        zarrGroup = zarr.open_group(outputPath, mode='w')
+        countArray = zarrGroup.zeros(name='photon_counts', shape=colorData.shape, chunks=tuple(chunkShape), dtype=colorData.dtype)
+        for firstIndex, block in blocks():
+            blockSlice = [slice(None)] * colorData.ndim
+            blockSlice[blockAxis] = slice(firstIndex, firstIndex + block.shape[blockAxis])
+            countArray[tuple(blockSlice)] = block
+        zarrGroup.zeros(name='timestamps_ns', shape=timestamps.shape, dtype=np.int64)[...] = timestamps
+        zarrGroup.attrs.update({**otherMetadata, 'axes': list(axisNames) + ['color'], 'colors': ['red', 'green', 'blue']})
+    else:
+        raise ValueError(f"Unknown photon count export format {fileFormat}")
+    return outputPath
+
+"""
+Maps photon counts to a uint8 RGB (or single channel greyscale) image for display and
+export. Integer photon counts go through a cached uint8 lookup table per channel setting
+(multiplier, brightness, gamma) instead of float arithmetic on the whole array: the table
+only has to run up to the count where the channel saturates at 255, every higher count is
+clipped onto the last entry by np.take. Float input (or a table that would be too long)
+falls back to the same calculation done directly on the array.
+A value v is int(count * multiplier + brightness) clipped to 0-255 - the same image the
+int64 arrays of the old modify_rgb_image gave once imshow clipped them - and gamma maps it
+to 255 * (v/255)**gamma. percentile_multipliers() gives the multipliers that put a
+percentile of each channel at 255, for auto-scaling.
+"""
+class RGBCompositor():
+    def __init__(self, maxTables=64, maxTableSize=2**20):
+        self.maxTables = maxTables
+        self.maxTableSize = maxTableSize
+        self._tables = OrderedDict()
+
+    @staticmethod
+    def _to_uint8(values, gamma):
+        values = np.clip(np.trunc(values), 0, 255)
+        if gamma != 1:
+            values = np.round(255 * (values / 255) ** gamma)
+        return values.astype(np.uint8)
+
+    def _channel_table(self, multiplier, brightness, gamma):
+        key = (multiplier, brightness, gamma)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+
+        if multiplier > 0:
+            tableSize = max(int(math.ceil((255 - brightness) / multiplier)) + 1, 1)
+        else:
+            tableSize = 1 #every count gives the same value
+        if tableSize > self.maxTableSize:
+            return None
+
+        table = self._to_uint8(np.arange(tableSize) * multiplier + brightness, gamma)
+        self._tables[key] = table
+        if len(self._tables) > self.maxTables:
+            self._tables.popitem(last=False)
+        return table
+
+    def map_channel(self, channelData, multiplier, brightness=0, gamma=1.0):
+        if channelData.dtype.kind in "ui":
+            table = self._channel_table(multiplier, brightness, gamma)
+            if table is not None:
+                return np.take(table, channelData, mode='clip')
+        return self._to_uint8(channelData * multiplier + brightness, gamma)
+
+    def composite(self, colorData, multipliers, brightness=0, grayscaleChannel=None, gamma=1.0):
+        if grayscaleChannel is not None:
+            return self.map_channel(colorData[..., grayscaleChannel], multipliers[grayscaleChannel], 0, gamma)
+
+        composited = np.empty(colorData.shape, dtype=np.uint8)
+        for channel in range(3):
+            composited[..., channel] = self.map_channel(colorData[..., channel], multipliers[channel], brightness, gamma)
+        return composited
+
+    @staticmethod
+    def percentile_multipliers(colorData, percentile, maxSamples=10**6):
+        #a strided subsample is enough for a percentile and avoids copying a large image
+        step = max(1, int(math.sqrt(colorData[..., 0].size / maxSamples)))
+        sampleSlice = (slice(None, None, step),) * (colorData.ndim - 1)
+        multipliers = []
+        for channel in range(3):
+            percentileValue = np.percentile(colorData[sampleSlice + (channel,)], percentile)
+            multipliers.append(255 / percentileValue if percentileValue > 0 else 1.0)
+        return multipliers
+
+"""
+Composites a block of frames with the same RGBCompositor settings and writes every frame to its own
+file, one image pixel per photon-count pixel: TIFF (.tif) through tifffile, anything else through
+matplotlib.image.imsave without creating a figure. Kept at module level so the batch image export
+can hand blocks of frames to a process pool.
+"""
+def write_composited_frames(frames, filenames, compositeSettings):
+    compositor = RGBCompositor()
+    for frame, filename in zip(frames, filenames):
+        rgbImage = compositor.composite(np.asarray(frame), **compositeSettings)
+        if filename.endswith(".tif"):
+            tiff.imwrite(filename, rgbImage, photometric='rgb' if rgbImage.ndim == 3 else 'minisblack')
+        else:
+            matplotlib.image.imsave(filename, rgbImage, cmap='gray' if rgbImage.ndim == 2 else None, vmin=0, vmax=255)
+    return len(filenames)
+
+#file and photon count caches of an image export worker process
+exportWorkerCaches = None
+
+#photon counts of a component in an image export worker, memory-mapped from the .npy file of the photon count cache
+def export_worker_color_data(filepath, componentString):
+    global exportWorkerCaches
+    if exportWorkerCaches is None:
+        exportWorkerCaches = (H5FileCache(maxOpenFiles=1), PhotonCountCache(maxMemoryMB=0))
+    fileCache, photonCountCache = exportWorkerCaches
+    return photonCountCache.get(fileCache.get(filepath), filepath, componentString, memoryMap=True)
+
+"""
+First image export job of a component: makes sure its photon counts are in the .npy file of the
+photon count cache (so the jobs writing its frames only read it) and returns the auto-scale
+multipliers of the whole image for percentile, taken from a subsample - None without auto-scaling.
+"""
+def prepare_export_component(filepath, componentString, percentile):
+    colorData = export_worker_color_data(filepath, componentString)
+    if percentile is None:
+        return None
+    return RGBCompositor.percentile_multipliers(colorData, percentile)
+
+"""
+Image export job of a worker process: the worker reads frames [frameRange[0], frameRange[1]) of a
+component itself - memory-mapped from the .npy file prepare_export_component already wrote -
+so only names and settings are sent to it. frameRange=None writes the whole image as one file.
+"""
+def write_component_frames(filepath, componentString, frameRange, filenames, compositeSettings):
+    colorData = export_worker_color_data(filepath, componentString)
+    frames = [colorData] if frameRange is None else colorData[frameRange[0]:frameRange[1]]
+    return write_composited_frames(frames, filenames, compositeSettings)
+
+"""
+Writes a scan stack (or a single scan/kymograph as one frame) to one multi-page OME-TIFF that ImageJ
+(Bio-Formats) opens as a stack. Pages are composited/sliced one frame at a time while tifffile
+writes them, so the stack never has to be converted as a whole.
+With compositeSettings=None the raw photon counts are written in their own dtype as a TCYX stack
+with the channels Red, Green and Blue. Otherwise every frame is composited to uint8 with those
+RGBCompositor settings, as an RGB TYXS stack or a single-channel TYX stack for the grayscale option.
+metadata is that of export_photon_counts. The physical pixel size and the time of every frame
+relative to the first one are stored in the OME metadata (tifffile wants one DeltaT and one unit per plane).
+"""
+def write_ome_tiff(filename, colorData, metadata, compositeSettings=None):
+    isKymo = metadata['component'].split('-')[0] == "kymos"
+    stack = colorData if colorData.ndim == 4 else colorData[np.newaxis]
+    timestamps = np.asarray(metadata['timestamps_ns'], dtype=np.int64)
+    frameTimes = (timestamps[:len(stack)] - timestamps[0]) / 1e9 if len(stack) > 1 else np.zeros(1)
+    pixelSize = metadata['pixelsize_um']
+    omeMetadata = {'Name': metadata['component'], 'PhysicalSizeY': pixelSize[-1], 'PhysicalSizeYUnit': 'µm'}
+    if not isKymo: #the x axis of a kymograph is time
+        omeMetadata.update({'PhysicalSizeX': pixelSize[0], 'PhysicalSizeXUnit': 'µm'})
+
+    compositor = RGBCompositor()
+    if compositeSettings is None:
+        omeMetadata.update({'axes': 'TCYX', 'Channel': {'Name': ['Red', 'Green', 'Blue']}, 'Plane': {'DeltaT': [float(t) for t in np.repeat(frameTimes, 3)], 'DeltaTUnit': ['s'] * (3 * len(stack))}})
+        shape, dtype, photometric = (len(stack), 3) + stack.shape[1:3], stack.dtype, 'minisblack'
+        def pages():
+            for frame in stack:
+                for channel in range(3):
+                    yield np.asarray(frame[..., channel])
+    elif compositeSettings.get('grayscaleChannel') is not None:
+        omeMetadata.update({'axes': 'TYX', 'Channel': {'Name': [['Red', 'Green', 'Blue'][compositeSettings['grayscaleChannel']]]}, 'Plane': {'DeltaT': [float(t) for t in frameTimes], 'DeltaTUnit': ['s'] * len(stack)}})
+        shape, dtype, photometric = stack.shape[:3], np.uint8, 'minisblack'
+        def pages():
+            for frame in stack:
+                yield compositor.composite(np.asarray(frame), **compositeSettings)
+    else:
+        omeMetadata.update({'axes': 'TYXS', 'Plane': {'DeltaT': [float(t) for t in frameTimes], 'DeltaTUnit': ['s'] * len(stack)}})
+        shape, dtype, photometric = stack.shape, np.uint8, 'rgb'
+        def pages():
+            for frame in stack:
+                yield compositor.composite(np.asarray(frame), **compositeSettings)
+
+    with tiff.TiffWriter(filename, bigtiff=True, ome=True) as omeFile:
+        omeFile.write(pages(), shape=shape, dtype=dtype, photometric=photometric, compression='zlib', metadata=omeMetadata)
+    return filename
+
+"""
+Ring buffer of display-ready (uint8) frames of a scan stack, used to scrub and play a
+stack without compositing every frame on the tk thread. A background thread composites
+the frames around the current one with its own RGBCompositor - nearest first, ahead of
+the current frame before behind it and wrapping around the end of the stack like the
+playback does - until maxMemoryMB is used; frames that fall out of that window are dropped.
+restart() throws every frame away when the photon counts or the composite settings change.
+get() composites a frame that is not buffered yet on the calling thread, so the viewer
+never has to wait on the worker.
+"""
+class StackFrameBuffer():
+    def __init__(self, maxMemoryMB=256):
+        self.maxMemory = maxMemoryMB * 1024**2
+        self.maxFrames = 0
+        self._compositor = RGBCompositor() #tk thread
+        self._workerCompositor = RGBCompositor() #background thread - the lookup tables are not shared between threads
+        self._condition = threading.Condition()
+        self._frames = OrderedDict()
+        self._colorData = None
+        self._settings = None
+        self._position = 0
+        self._generation = 0
+        self._thread = None
+
+    def restart(self, colorData, compositeSettings, position=0):
+        frameShape = colorData.shape[1:] if compositeSettings.get('grayscaleChannel') is None else colorData.shape[1:-1]
+        frameBytes = max(int(np.prod(frameShape)), 1)
+        with self._condition:
+            self._generation += 1
+            self._colorData = colorData
+            self._settings = compositeSettings
+            self._position = position
+            self._frames = OrderedDict()
+            self.maxFrames = int(min(len(colorData), max(self.maxMemory // frameBytes, 2)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._fill, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+        return
+
+    def stop(self):
+        with self._condition:
+            self._generation += 1
+            self._colorData = None
+            self._frames = OrderedDict()
+            self._condition.notify_all()
+        return
+
+    def get(self, frameIndex):
+        with self._condition:
+            self._position = frameIndex
+            self._condition.notify_all()
+            frame = self._frames.get(frameIndex)
+            generation = self._generation
+            colorData = self._colorData
+            settings = self._settings
+        if frame is None:
+            frame = self._compositor.composite(np.asarray(colorData[frameIndex]), **settings)
+            with self._condition:
+                if generation == self._generation:
+                    self._store(frameIndex, frame)
+        return frame
+
+    def _wanted_frames(self):
+        #must be called while holding self._condition - frame indexes to keep, most important first
+        numFrames = len(self._colorData)
+        framesAhead = max((3 * self.maxFrames) // 4, 1)
+        wanted = [self._position]
+        for offset in range(1, numFrames):
+            if len(wanted) >= self.maxFrames:
+                break
+            if offset < framesAhead:
+                wanted.append((self._position + offset) % numFrames)
+            if offset <= self.maxFrames - framesAhead and len(wanted) < self.maxFrames:
+                wanted.append((self._position - offset) % numFrames)
+        return list(OrderedDict.fromkeys(wanted))
+
+    def _store(self, frameIndex, frame):
+        #must be called while holding self._condition
+        self._frames[frameIndex] = frame
+        if len(self._frames) > self.maxFrames:
+            wanted = set(self._wanted_frames())
+            for unwantedIndex in [i for i in self._frames if i not in wanted]:
+                del self._frames[unwantedIndex]
+        return
+
+    def _fill(self):
+        while True:
+            with self._condition:
+                if self._colorData is None:
+                    self._thread = None
+                    return
+                missing = [i for i in self._wanted_frames() if i not in self._frames]
+                if len(missing) == 0:
+                    self._condition.wait()
+                    continue
+                frameIndex = missing[0]
+                generation = self._generation
+                colorData = self._colorData
+                settings = self._settings
+            frame = self._workerCompositor.composite(np.asarray(colorData[frameIndex]), **settings)
+            with self._condition:
+                if generation == self._generation:
+                    self._store(frameIndex, frame)
+
+"""
+Time-binned levels of a kymograph (2x, 4x, 8x ... lines summed together, stored as
+uint32 photon counts) so a long kymograph can be drawn without matplotlib resampling
+every line on each redraw. get_window() picks the coarsest level that still gives at
+least maxColumns columns for the requested time range and returns the summed
+photon counts of that level with its binning factor - scale the counts by 1/factor when
+drawing so the brightness does not change with the zoom.
+Levels are built block by block from the full image (which may be a memmap) and only
+levels smaller than maxLevelMB are kept; finer windows are binned from the full image
+on request, which only reads the lines that are being shown. Windows coarser than the coarsest
+stored level are binned further from it, so a window never has more than 2*maxColumns columns.
+"""
+class KymoPyramid():
+    def __init__(self, colorData, maxLevelMB=256, minLines=256, linesPerBlock=4096):
+        self.colorData = colorData
+        self.numberOfLines = colorData.shape[1]
+        self.levels = {} #binning factor -> summed photon counts
+
+        bytesPerLine = colorData.shape[0] * colorData.shape[2] * np.dtype(np.uint32).itemsize
+        factor = 2
+        while self.numberOfLines // factor * bytesPerLine > maxLevelMB * 1024**2:
+            factor *= 2
+
+        #first stored level straight from the full image, every coarser level from the previous one
+        previousLevel = None
+        while self.numberOfLines // factor >= minLines:
+            if previousLevel is None:
+                blockLines = max(factor, linesPerBlock // factor * factor)
+                level = np.empty((colorData.shape[0], self.numberOfLines // factor, colorData.shape[2]), dtype=np.uint32)
+                for firstLine in range(0, self.numberOfLines // factor * factor, blockLines):
+                    block = np.asarray(colorData[:, firstLine:min(firstLine + blockLines, self.numberOfLines // factor * factor)])
+                    level[:, firstLine // factor:firstLine // factor + block.shape[1] // factor] = self._bin(block, factor)
+            else:
+                level = self._bin(previousLevel, 2)
+            self.levels[factor] = level
+            previousLevel = level
+            factor *= 2
+
+    @staticmethod
+    def _bin(colorData, factor):
+        usableLines = colorData.shape[1] // factor * factor
+        return colorData[:, :usableLines].reshape(colorData.shape[0], usableLines // factor, factor, colorData.shape[2]).sum(axis=2, dtype=np.uint32)
+
+    def get_window(self, firstLine, lastLine, maxColumns):
+        firstLine = int(min(max(firstLine, 0), self.numberOfLines - 1))
+        lastLine = int(min(max(lastLine, firstLine + 1), self.numberOfLines))
+
+        #largest factor that still leaves at least maxColumns columns
+        factor = 1
+        while (lastLine - firstLine) / (factor * 2) >= maxColumns:
+            factor *= 2
+        if factor == 1:
+            return self.colorData[:, firstLine:lastLine], firstLine, lastLine, 1
+
+        numberOfColumns = self.numberOfLines // factor
+        lastColumn = min(math.ceil(lastLine / factor), numberOfColumns)
+        firstColumn = min(firstLine // factor, lastColumn - 1)
+        if factor in self.levels:
+            window = self.levels[factor][:, firstColumn:lastColumn]
+        elif len(self.levels) > 0 and factor > max(self.levels):
+            #coarser than any stored level - bin the coarsest level further
+            levelFactor = max(self.levels)
+            extraFactor = factor // levelFactor
+            window = self._bin(self.levels[levelFactor][:, firstColumn * extraFactor:lastColumn * extraFactor], extraFactor)
+        else:
+            #finer than any stored level - bin just the requested lines of the full image
+            window = self._bin(np.asarray(self.colorData[:, firstColumn * factor:lastColumn * factor]), factor)
+        return window, firstColumn * factor, lastColumn * factor, factor
+
+"""
+Min/max decimation of a time trace for drawing.
+The points between firstIndex and lastIndex are split into at most maxColumns equal blocks and
+only the minimum and maximum of every block are kept (in time order), so a trace of tens of
+millions of high-frequency points is drawn with a few thousand vertices and every spike stays
+visible at the resolution of the screen. Ranges short enough to draw as is are returned unchanged.
+"""
+def minmax_decimate(xData, yData, firstIndex, lastIndex, maxColumns):
+    firstIndex = max(int(firstIndex), 0)
+    lastIndex = min(int(lastIndex), len(yData))
+    xVisible = xData[firstIndex:lastIndex]
+    yVisible = yData[firstIndex:lastIndex]
+    if len(yVisible) <= 4 * maxColumns:
+        return xVisible, yVisible
+
+    blockSize = int(np.ceil(len(yVisible) / maxColumns))
+    fullBlocks = len(yVisible) // blockSize
+    blockIndexes = []
+    blockStarts = np.arange(fullBlocks) * blockSize
+    blocks = yVisible[:fullBlocks * blockSize].reshape(fullBlocks, blockSize)
+    blockIndexes.append((blockStarts + np.argmin(blocks, axis=1), blockStarts + np.argmax(blocks, axis=1)))
+    if fullBlocks * blockSize < len(yVisible):
+        lastBlock = yVisible[fullBlocks * blockSize:]
+        blockIndexes.append(([fullBlocks * blockSize + np.argmin(lastBlock)], [fullBlocks * blockSize + np.argmax(lastBlock)]))
+
+    minIndexes = np.concatenate([indexes[0] for indexes in blockIndexes])
+    maxIndexes = np.concatenate([indexes[1] for indexes in blockIndexes])
+    #first and second point of every block in time order
+    keptIndexes = np.empty(2 * len(minIndexes), dtype=np.int64)
+    keptIndexes[0::2] = np.minimum(minIndexes, maxIndexes)
+    keptIndexes[1::2] = np.maximum(minIndexes, maxIndexes)
+    return xVisible[keptIndexes], yVisible[keptIndexes]
+
+"""
+Prefetches the files on either side of the current one in the "H5 Files in Directory"
+pulldown on a small thread pool. Each neighbour is opened through the shared file cache,
+its components are listed and the photon counts of its first component are decoded
+(through the photon count cache), so stepping to the next/previous file does not have
+to wait on the disk.
+Decoded photon counts are only kept while they fit in memoryBudgetMB - once the budget
+is reached nothing else is decoded until entries are taken or dropped again.
+The worker threads never touch Tk widgets; the GUI asks for the results when it needs them.
+"""
+class NeighbourPrefetcher():
+    def __init__(self, fileCache, photonCountCache, memoryBudgetMB=512, maxWorkers=2):
+        self.fileCache = fileCache
+        self.photonCountCache = photonCountCache
+        self.memoryBudget = memoryBudgetMB * 1024**2
+        self.bytesUsed = 0
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        self._lock = threading.Lock()
+        self._prefetched = {} #absolute path -> modification time, component lists and decoded color data
+        self._pending = {} #absolute path -> future of a prefetch that has not finished yet
+
+    def schedule(self, fileList, currentIndex):
+        fileList = list(fileList)
+        neighbours = [fileList[i] for i in (currentIndex + 1, currentIndex - 1) if 0 <= i < len(fileList)]
+        wantedPaths = set(os.path.abspath(f) for f in neighbours + [fileList[currentIndex]])
+
+        with self._lock:
+            #anything that is no longer next to the current file gives its memory back
+            for absolutePath in [p for p in self._prefetched if p not in wantedPaths]:
+                self._drop(absolutePath)
+            for absolutePath in [p for p in self._pending if p not in wantedPaths]:
+                self._pending.pop(absolutePath).cancel()
+
+            for filepath in neighbours:
+                absolutePath = os.path.abspath(filepath)
+                if absolutePath in self._prefetched or absolutePath in self._pending:
+                    continue
+                self._pending[absolutePath] = self._executor.submit(self._prefetch_file, filepath)
+        return
+
+    def _prefetch_file(self, filepath):
+        absolutePath = os.path.abspath(filepath)
+        entry = {'mtime': os.path.getmtime(absolutePath), 'colorData': {}}
+        try:
+            h5file = self.fileCache.get(filepath)
+            entry['fileTypes'], entry['distOptions'], entry['trapOptions'] = list_h5_components(h5file)
+
+            firstComponent = entry['fileTypes'][0] if len(entry['fileTypes']) > 0 else None
+            #the size is checked against the budget before anything is decoded
+            if firstComponent is not None and self.bytesUsed + self.photonCountCache.expected_nbytes(h5file, firstComponent) <= self.memoryBudget:
+                colorData = self.photonCountCache.get(h5file, filepath, firstComponent)
+                with self._lock:
+                    if isinstance(colorData, np.ndarray) and self.bytesUsed + colorData.nbytes <= self.memoryBudget:
+                        entry['colorData'][firstComponent] = colorData
+                        self.bytesUsed += colorData.nbytes
+        except Exception as e:
+            print(f"Could not prefetch {filepath}: {e}")
+            with self._lock:
+                self._pending.pop(absolutePath, None)
+            return
+
+        with self._lock:
+            #the file may have stopped being a neighbour while it was being read
+            if self._pending.pop(absolutePath, None) is None:
+                self.bytesUsed -= sum(data.nbytes for data in entry['colorData'].values())
+            else:
+                self._prefetched[absolutePath] = entry
+        return
+
+    def _drop(self, absolutePath):
+        #must be called while holding self._lock
+        entry = self._prefetched.pop(absolutePath)
+        self.bytesUsed -= sum(data.nbytes for data in entry['colorData'].values())
+        return
+
+    def _current_entry(self, filepath):
+        #must be called while holding self._lock - prefetched data of a file that changed on disk is thrown away
+        absolutePath = os.path.abspath(filepath)
+        entry = self._prefetched.get(absolutePath)
+        if entry is not None and entry['mtime'] != os.path.getmtime(absolutePath):
+            self._drop(absolutePath)
+            entry = None
+        return entry
+
+    def get_components(self, filepath):
+        with self._lock:
+            entry = self._current_entry(filepath)
+            if entry is None:
+                return None
+            return entry['fileTypes'], entry['distOptions'], entry['trapOptions']
+
+    def take_color_data(self, filepath, componentString):
+        with self._lock:
+            entry = self._current_entry(filepath)
+            if entry is None or componentString not in entry['colorData']:
+                return None
+            colorData = entry['colorData'].pop(componentString)
+            self.bytesUsed -= colorData.nbytes
+            return colorData
+
+    def shutdown(self):
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=False)
+        return
+
+    def __repr__(self):
+        return f"NeighbourPrefetcher({len(self._prefetched)} files ready, {self.bytesUsed/1024**2:.1f}/{self.memoryBudget/1024**2:.0f} MB used)"
+
+"""
+SQLite index of the structure of every .h5 file in a folder, stored next to the files
+as .ctrapvis_index.sqlite. For each file it keeps the component names, the channel names
+of every group and the description text, so a folder can fill its pulldowns without opening
+the HDF5 data.
+An entry is only used while the size and modification time of the file still match.
+refresh_in_background() re-indexes just the files that are missing or changed.
+Every call opens its own short-lived connection, so the index can be used from the
+Tk thread and the refresher thread at the same time.
+"""
+class H5FolderIndex():
+    indexFileName = ".ctrapvis_index.sqlite"
+    schemaVersion = 2 #indexes of an older version are rebuilt
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        self.dbPath = os.path.join(self.folder, self.indexFileName)
+        self._refreshThread = None
+        self._stopRefresh = threading.Event()
+        with self._connect() as connection:
+            if connection.execute("PRAGMA user_version").fetchone()[0] != self.schemaVersion:
+                connection.execute("DROP TABLE IF EXISTS files")
+                connection.execute("DROP TABLE IF EXISTS components")
+                connection.execute(f"PRAGMA user_version = {self.schemaVersion}")
+            connection.execute("CREATE TABLE IF NOT EXISTS files (filename TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+                               "description TEXT, channels TEXT)")
+            connection.execute("CREATE TABLE IF NOT EXISTS components (filename TEXT, position INTEGER, component TEXT, "
+                               "PRIMARY KEY (filename, component))")
+
+    def _connect(self):
+        return sqlite3.connect(self.dbPath, timeout=30)
+
+    def _file_signature(self, filename):
+        fileStats = os.stat(os.path.join(self.folder, filename))
+        return fileStats.st_size, fileStats.st_mtime
+
+    def is_current(self, filename):
+        with self._connect() as connection:
+            row = connection.execute("SELECT size, mtime FROM files WHERE filename = ?", (filename,)).fetchone()
+        return row is not None and tuple(row) == self._file_signature(filename)
+
+    def stale_files(self, fileList):
+        with self._connect() as connection:
+            indexed = {row[0]: (row[1], row[2]) for row in connection.execute("SELECT filename, size, mtime FROM files")}
+        return [f for f in fileList if indexed.get(f) != self._file_signature(f)]
+
+    def update_file(self, filename, h5file):
+        size, mtime = self._file_signature(filename)
+        channels = {}
+        for groupName in h5file.h5.keys():
+            try:
+                channels[groupName] = list(h5file.h5[groupName].keys())
+            except AttributeError:
+                pass #datasets at the top level have no channels
+
+        listOfFileTypes = list_h5_components(h5file)[0]
+        componentRows = [(filename, position, componentString) for position, componentString in enumerate(listOfFileTypes)]
+
+        with self._connect() as connection:
+            connection.execute("DELETE FROM components WHERE filename = ?", (filename,))
+            connection.executemany("INSERT INTO components VALUES (?,?,?)", componentRows)
+            connection.execute("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?)",
+                               (filename, size, mtime, h5file.description, json.dumps(channels)))
+        return
+
+    def get_components(self, filename):
+        if not self.is_current(filename):
+            return None
+        with self._connect() as connection:
+            listOfFileTypes = [row[0] for row in connection.execute(
+                "SELECT component FROM components WHERE filename = ? ORDER BY position", (filename,))]
+            channels = json.loads(connection.execute("SELECT channels FROM files WHERE filename = ?", (filename,)).fetchone()[0])
+        return listOfFileTypes, channels.get('Distance', []), channels.get('Trap position', [])
+
+    def get_description(self, filename):
+        if not self.is_current(filename):
+            return None
+        with self._connect() as connection:
+            return connection.execute("SELECT description FROM files WHERE filename = ?", (filename,)).fetchone()[0]
+
+    def refresh_in_background(self, fileList):
+        self.stop_refresh()
+        self._stopRefresh = threading.Event()
+        self._refreshThread = threading.Thread(target=self._refresh, args=(list(fileList), self._stopRefresh), daemon=True)
+        self._refreshThread.start()
+        return
+
+    def _refresh(self, fileList, stopRefresh):
+        staleFiles = self.stale_files(fileList)
+        if len(staleFiles) > 0:
+            print(f"Indexing {len(staleFiles)} new or changed .h5 files in the background")
+        for filename in staleFiles:
+            if stopRefresh.is_set():
+                return
+            try:
+                #opened directly rather than through the file cache so indexing a folder does not evict the files in use
+                self.update_file(filename, lk.File(os.path.join(self.folder, filename)))
+            except Exception as e:
+                print(f"Could not index {filename}: {e}")
+        return
+
+    def stop_refresh(self):
+        self._stopRefresh.set()
+        return
+
+"""
+Plotting core shared by the GUI and the command line batch mode (--render, see the bottom
+of this file). These functions take their options as arguments or as a plot settings dict
+(default_plot_settings()) instead of reading the tk widgets, so figures can be drawn on a
+machine without a display. The GUI builds the same dict from its widgets
+(plot_settings_from_widgets) and "Save Plot Settings" writes it as a .json file for --render.
+"""
+def force_channel_name(forceString):
+    if len(forceString) < 3:
+        return 'Force ' + forceString
+    return 'Force ' + forceString[0]
+
+#first/last timestamp (ns) of a kymo or scan (all frames of a multi-frame scan), and the line time (s) of a kymo (None for scans)
+def read_component_time_range(h5file, componentString):
+    componentType = componentString.split('-')[0]
+    componentName = "-".join(componentString.split('-')[1:])
+    lineTime = None
+    if componentType == "kymos":
+        timestampArray = h5file.kymos[componentName].timestamps
+        timeRange = (timestampArray[0,0].astype(np.int64), np.max(timestampArray).astype(np.int64))
+        lineTime = (timestampArray[0,1]-timestampArray[0,0]) / 1000000000
+    elif h5file.scans[componentName].num_frames > 1:
+        timestampArray = h5file.scans[componentName].timestamps
+        timeRange = (np.min(timestampArray[0,0,0]).astype(np.int64), np.amax(timestampArray[-1,:,:]).astype(np.int64))
+    else:
+        timestampArray = h5file.scans[componentName].timestamps
+        timeRange = (np.min(timestampArray[0,:]).astype(np.int64), np.max(timestampArray[0,:]).astype(np.int64))
+    return timeRange, lineTime
+
+#data and timestamps of a channel between two timestamps - high frequency channels are downsampled when downsampleSettings[0] == 1,
+#from the force index when one is given and covers the factor
+def read_force_slice(h5file, group, channel, timestamps, downsampleSettings, forceSliceCache, forcePyramid=None):
+    downsampleFactor = 1
+    if group not in ("Force LF","Distance") and int(downsampleSettings[0]) == 1:
+        #get sample rate to determine the amount to downsample
+        sample_rate = h5file['Force HF']['Force 1x'].sample_rate
+        downsampleFactor = int(sample_rate/float(downsampleSettings[1]))
+        if forcePyramid is not None:
+            indexedSlice = forcePyramid.block_means(group,channel,timestamps[0],timestamps[1],downsampleFactor)
+            if indexedSlice is not None:
+                return indexedSlice
+    return forceSliceCache.get(h5file,group,channel,timestamps[0],timestamps[1],downsampleFactor)
+
+"""
+Force trace between two timestamps: high frequency force against time (s from the first timestamp)
+when forceTime is True, otherwise low frequency force against distance. The '2x' channel is flipped.
+sliceReader(group, channel, timestamps) returns the (data, timestamps) of a channel.
+Returns the force, time/distance and raw timestamps (ns) of every point.
+"""
+def read_force_trace(sliceReader, forceString, distanceChannel, forceTime, timeRange):
+    if forceTime:
+        yData, rawTimestamps = sliceReader("Force HF",force_channel_name(forceString),timeRange)
+        maxTime = (int(timeRange[1]) - int(timeRange[0])) / 1e9
+        xData = np.interp(rawTimestamps, (np.min(rawTimestamps),np.max(rawTimestamps)), (0, maxTime))
+    else:
+        yData, rawTimestamps = sliceReader("Force LF",force_channel_name(forceString),timeRange)
+        xData = sliceReader("Distance",distanceChannel,timeRange)[0]
+    if forceString == '2x':
+        yData = yData * -1
+    return yData, xData, rawTimestamps
+
+#trap position (nm above its minimum) against time (s from the first timestamp), with the raw timestamps (ns) of every point
+def read_trap_position_trace(sliceReader, trapChannel, timeRange):
+    yData, rawTimestamps = sliceReader("Trap position",trapChannel,timeRange)
+    yData = (yData - np.amin(yData)) * 1000
+    maxTime = (int(timeRange[1]) - int(timeRange[0])) / 1e9
+    xData = np.interp(rawTimestamps, (np.min(rawTimestamps),np.max(rawTimestamps)), (0, maxTime))
+    return yData, xData, rawTimestamps
+
+def default_plot_settings():
+    return {'plotting': "Both", #Both, RGB Only or Non-RGB Only
+            'nonRGB': "Force-Time", #Force-Time, Force-Distance or Trap Pos.-Time
+            'forceChannel': "2x",
+            'distanceChannel': None, #None uses the first channel in the file
+            'trapPositionChannel': None,
+            'downsample': 1,
+            'downsampleHz': 100,
+            'red': 10,
+            'green': 10,
+            'blue': 10,
+            'brightness': 0,
+            'gamma': 1.0,
+            'autoScalePercentile': '',
+            'grayscale': "No", #No, R, G or B
+            'autoAspect': True,
+            'frame': 1, #frame of a multi-frame scan
+            'highlightScan': 1,
+            'title': '', #may use {file} and {component}
+            'imageFormat': "PNG",
+            'dpi': 110,
+            #axis ranges [min, max] - None uses the full range of the data like the '-' entries of the GUI
+            'timeRange': None,
+            'distanceRange': None,
+            'positionRange': None,
+            'scanWidthRange': None,
+            'forceRange': None,
+            'trapPositionRange': None}
+
+#keyword arguments of RGBCompositor.composite for the multipliers/brightness/gamma/grayscale of a plot settings dict
+def plot_composite_settings(colorData, settings, countScale=1.0, multipliers=None):
+    gamma = float(settings['gamma'])
+    if multipliers is None:
+        if str(settings['autoScalePercentile']).strip() != "":
+            multipliers = RGBCompositor.percentile_multipliers(colorData,float(settings['autoScalePercentile']))
+        else:
+            multipliers = [float(settings['red']) * countScale, float(settings['green']) * countScale, float(settings['blue']) * countScale]
+    if settings['grayscale'] == "No":
+        return dict(multipliers=multipliers,brightness=int(settings['brightness']),gamma=gamma)
+    return dict(multipliers=multipliers,grayscaleChannel="RGB".index(settings['grayscale']),gamma=gamma)
+
+#the _desc.txt file saved next to a figure - experiment description, scaling factors and scan timing
+def write_figure_metadata(filename, h5file, filepath, componentString, settings):
+    with open(filename,'w') as metaDataFile:
+        metaDataFile.write(f'Metadata for image analysis of {filepath} --- {componentString}\n')
+        metaDataFile.write(h5file.description)
+        metaDataFile.write('------------------------------------------\n')
+        metaDataFile.write(f"Image Scaling Factors\nR\t{settings['red']}\nG\t{settings['green']}\nB\t{settings['blue']}\n")
+        metaDataFile.write(f"Brightness Shift: {settings['brightness']}\n")
+        
+        arrayForKymoOrScan = componentString.split('-')
+        if arrayForKymoOrScan[0] == "scans":
+            scanPointer = h5file.scans["-".join(arrayForKymoOrScan[1:])]
+            timestampArray = scanPointer.timestamps
+            if scanPointer.num_frames == 1:
+                metaDataFile.write(f"First Timestamp Value: {timestampArray[0,0]/1e9} seconds\n")
+                metaDataFile.write(f"Image Acquisition Time: {(np.max(timestampArray[:,:]) - timestampArray[0,0])/1e9} seconds\n")
+            else:
+                metaDataFile.write(f"First Timestamp Value: {timestampArray[0,0,0]/1e9} seconds\n")
+                metaDataFile.write(f"Image Acquisition Time: {(np.max(timestampArray[0,:,:]) - timestampArray[0,0,0])/1e9} seconds\n")
+    return
+
+"""
+Draws the figure of one kymo, scan (one frame of a stack) or FD curve from a plot settings dict
+on a plain matplotlib Figure, with the same layout, labels and titles as the GUI: the image on
+top and the force/trap position trace below it ("Both"), or either one on its own.
+Kymographs are drawn from a KymoPyramid level with about two lines per output pixel and long
+time traces as their min/max envelope, so the saved figure looks the same as drawing every point.
+Keeps its own file, photon count and force caches, so one plotter per process can render many
+figures of the same files.
+"""
+class HeadlessPlotter():
+    traceColumns = 2000 #min/max pairs a time trace is reduced to
+
+    def __init__(self, photonCacheMemoryMB=1024, forceCacheMemoryMB=512):
+        self.fileCache = H5FileCache(maxOpenFiles=2)
+        self.photonCountCache = PhotonCountCache(maxMemoryMB=photonCacheMemoryMB)
+        self.forceSliceCache = ForceSliceCache(maxMemoryMB=forceCacheMemoryMB)
+        self.compositor = RGBCompositor()
+        self._forcePyramids = {}
+
+    def _force_pyramid(self, filepath):
+        #keyed by the size and modification time as well, so a re-exported file does not use the index of the old one
+        absolutePath = os.path.abspath(filepath)
+        pyramidKey = (absolutePath, os.path.getsize(absolutePath), os.path.getmtime(absolutePath))
+        if pyramidKey not in self._forcePyramids:
+            for staleKey in [key for key in self._forcePyramids if key[0] == absolutePath]:
+                if self._forcePyramids[staleKey] is not None:
+                    self._forcePyramids[staleKey].close()
+                del self._forcePyramids[staleKey]
+            self._forcePyramids[pyramidKey] = ForcePyramid(absolutePath) if ForcePyramid.is_current(absolutePath) else None
+        return self._forcePyramids[pyramidKey]
+
+    def _channel(self, h5file, settings, key, listIndex):
+        if settings[key] not in (None, ''):
+            return settings[key]
+        channels = list_h5_components(h5file)[listIndex]
+        return channels[0] if len(channels) > 0 else ''
+
+    @staticmethod
+    def _set_limits(axis, xRange, yRange, xDefault, yDefault):
+        axis.set_xlim(*(xDefault if xRange is None else [float(value) for value in xRange]))
+        axis.set_ylim(*(yDefault if yRange is None else [float(value) for value in yRange]))
+        return
+
+    def render(self, filepath, componentString, settings):
+        settings = {**default_plot_settings(), **settings}
+        h5file = self.fileCache.get(filepath)
+        componentType = componentString.split('-')[0]
+        componentName = "-".join(componentString.split('-')[1:])
+        
+        figure = matplotlib.figure.Figure(dpi=float(settings['dpi']))
+        figure.set_constrained_layout(True)
+        if componentType == "fdcurves":
+            self._draw_fd_curve(figure.subplots(), h5file, componentName, settings)
+        else:
+            showImage = settings['plotting'] != "Non-RGB Only"
+            showTrace = settings['plotting'] != "RGB Only"
+            axes = figure.subplots(nrows=int(showImage) + int(showTrace), ncols=1, squeeze=False)[:,0]
+            timeRange, lineTime = read_component_time_range(h5file,componentString)
+            highlightRange = self._frame_range(h5file, componentType, componentName, settings)
+            if showImage:
+                self._draw_image(axes[0], h5file, filepath, componentString, settings, lineTime)
+            if showTrace:
+                self._draw_trace(axes[-1], h5file, filepath, settings, timeRange, highlightRange)
+        
+        title = str(settings['title']).format(file=os.path.basename(filepath), component=componentString)
+        figure.suptitle(title, fontsize=16, va='top')
+        return figure
+
+    #first/last timestamp of the shown frame of a multi-frame scan - the highlighted part of the trace
+    def _frame_range(self, h5file, componentType, componentName, settings):
+        if componentType != "scans" or int(settings['highlightScan']) != 1 or h5file.scans[componentName].num_frames == 1:
+            return None
+        scanPointer = h5file.scans[componentName]
+        frameIndex = int(np.clip(int(settings['frame']) - 1, 0, scanPointer.num_frames - 1))
+        frameTimestamps = np.asarray(scanPointer.timestamps[frameIndex]).astype(np.int64)
+        return frameTimestamps.flat[0], np.max(frameTimestamps)
+
+    def _draw_image(self, axis, h5file, filepath, componentString, settings, lineTime):
+        componentType = componentString.split('-')[0]
+        componentName = "-".join(componentString.split('-')[1:])
+        colorData = self.photonCountCache.get(h5file, filepath, componentString)
+        
+        if componentType == "kymos":
+            numberPixels, numberLines = colorData.shape[:2]
+            maxTrueTime = numberLines * lineTime
+            maxTrueDist = h5file.kymos[componentName].pixelsize_um[0] * numberPixels
+            axisPixelWidth = max(int(axis.bbox.width), 100)
+            window, firstLine, lastLine, factor = KymoPyramid(colorData).get_window(0, numberLines, 2*axisPixelWidth)
+            image = self.compositor.composite(window, **plot_composite_settings(window, settings, countScale=1/factor))
+            extent = [firstLine*lineTime, lastLine*lineTime, 0, maxTrueDist]
+            aspect = (numberPixels / numberLines) * (maxTrueTime / maxTrueDist)
+            axis.set_xlabel('Time(s)')
+            xDefault, xRange = (0, maxTrueTime), settings['timeRange']
+        else:
+            scanPointer = h5file.scans[componentName]
+            if scanPointer.num_frames > 1:
+                colorData = colorData[int(np.clip(int(settings['frame']) - 1, 0, scanPointer.num_frames - 1))]
+            totalScanWidth = scanPointer.scan_width_um[0]
+            maxTrueDist = scanPointer.pixelsize_um[0] * len(colorData)
+            image = self.compositor.composite(colorData, **plot_composite_settings(colorData, settings))
+            extent = [0, totalScanWidth, 0, maxTrueDist]
+            aspect = (image.shape[0] / image.shape[1]) * (totalScanWidth / maxTrueDist)
+            axis.set_xlabel(u'Width(\u03bcm)')
+            xDefault, xRange = (0, totalScanWidth), settings['scanWidthRange']
+        
+        imageKwargs = dict(extent=extent, aspect="auto" if settings['autoAspect'] else aspect)
+        if settings['grayscale'] != "No":
+            imageKwargs.update(cmap="gray", norm=matplotlib.colors.NoNorm())
+        axis.imshow(image, **imageKwargs)
+        axis.set_ylabel(u'Position(\u03bcm)')
+        self._set_limits(axis, xRange, settings['positionRange'], xDefault, (0, maxTrueDist))
+        return
+
+    def _draw_trace(self, axis, h5file, filepath, settings, timeRange, highlightRange):
+        downsampleSettings = (int(settings['downsample']), settings['downsampleHz'])
+        forcePyramid = self._force_pyramid(filepath) if downsampleSettings[0] == 1 else None
+        def sliceReader(group, channel, timestamps):
+            return read_force_slice(h5file, group, channel, timestamps, downsampleSettings, self.forceSliceCache, forcePyramid)
+        
+        forceString = settings['forceChannel']
+        if settings['nonRGB'] == "Trap Pos.-Time":
+            trapChannel = self._channel(h5file, settings, 'trapPositionChannel', 2)
+            yData, xData, rawTimestamps = read_trap_position_trace(sliceReader, trapChannel, timeRange)
+            title = "Trap Position " + trapChannel + " (nm)"
+            if downsampleSettings[0] == 1:
+                title += " Downsampled to " + str(float(downsampleSettings[1])) + " Hz"
+            axis.set_ylabel('Trap Position(nm)')
+            yRange, yDefault = settings['trapPositionRange'], (0, np.max(yData))
+        else:
+            distanceChannel = self._channel(h5file, settings, 'distanceChannel', 1)
+            yData, xData, rawTimestamps = read_force_trace(sliceReader, forceString, distanceChannel, settings['nonRGB'] == "Force-Time", timeRange)
+            if settings['nonRGB'] == "Force-Time":
+                title = ('Bead ' + forceString[0]) if len(forceString) > 2 else (forceString + ' Channel')
+                if downsampleSettings[0] == 1:
+                    title += ' Downsampled to ' + str(downsampleSettings[1]) + ' Hz'
+            else:
+                title = ('Bead ' + forceString[0] + ' vs. Distance') if len(forceString) > 2 else ('Channel ' + forceString + ' vs. Distance')
+            axis.set_ylabel('Force(pN)')
+            yRange, yDefault = settings['forceRange'], (np.min(yData), np.max(yData))
+        
+        timeTrace = settings['nonRGB'] != "Force-Distance"
+        maxColumns = self.traceColumns if timeTrace else len(yData)
+        axis.plot(*minmax_decimate(xData, yData, 0, len(yData), maxColumns))
+        if highlightRange is not None:
+            firstIndex = np.searchsorted(rawTimestamps, highlightRange[0])
+            lastIndex = np.searchsorted(rawTimestamps, highlightRange[1], side='right')
+            axis.plot(*minmax_decimate(xData, yData, firstIndex, lastIndex, maxColumns))
+        if timeTrace:
+            axis.set_xlabel('Time(s)')
+            xRange, xDefault = settings['timeRange'], (0, np.max(xData))
+        else:
+            axis.set_xlabel(u'Distance(\u03bcm)')
+            xRange, xDefault = settings['distanceRange'], (np.min(xData), np.max(xData))
+        axis.set_title(title)
+        self._set_limits(axis, xRange, yRange, xDefault, yDefault)
+        return
+
+    def _draw_fd_curve(self, axis, h5file, fdName, settings):
+        forceString = settings['forceChannel']
+        distanceChannel = self._channel(h5file, settings, 'distanceChannel', 1)
+        fdPointer = h5file.fdcurves[fdName].with_channels(force=forceString if len(forceString) < 3 else forceString[0], distance=distanceChannel[-1])
+        forceData = fdPointer.f.data
+        if forceString == "2x":
+            forceData = -1*forceData
+        distData = fdPointer.d.data
+        axis.plot(distData, forceData)
+        axis.set_ylabel('Force(pN)')
+        axis.set_xlabel(u'Distance(\u03bcm)')
+        self._set_limits(axis, settings['distanceRange'], settings['forceRange'], (np.min(distData), np.max(distData)), (np.min(forceData), np.max(forceData)))
+        return
+
+#one plotter per batch worker process, so the caches are shared by every figure that process renders
+batchPlotter = None
+
+"""
+Renders and saves one figure with its _desc.txt metadata file (runs in a batch worker process)
+Returns the name of the saved figure
+"""
+def render_figure_job(filepath, componentString, settings, outputPrefix):
+    global batchPlotter
+    if batchPlotter is None:
+        batchPlotter = HeadlessPlotter()
+    figure = batchPlotter.render(filepath, componentString, settings)
+    figureName = outputPrefix + '.' + str(settings.get('imageFormat', "PNG")).lower()
+    figure.savefig(figureName, bbox_inches="tight")
+    write_figure_metadata(outputPrefix + '_desc.txt', batchPlotter.fileCache.get(filepath), filepath, componentString, {**default_plot_settings(), **settings})
+    return figureName
+
+"""
+Renders every component matching componentPattern (a glob such as "kymos-*" or "scans-*") of
+every .h5 file in folder to outputFolder on a process pool. Figures are named like the GUI save
+name: <file>_<component> with spaces and dashes replaced by underscores.
+Returns the number of figures that could not be rendered.
+"""
+def batch_render(folder, componentPattern, settings, outputFolder, maxWorkers=None, progress=print):
+    os.makedirs(outputFolder, exist_ok=True)
+    jobs = []
+    listingCache = H5FileCache(maxOpenFiles=1)
+    for filepath in sorted(glob.glob(os.path.join(folder, "*.h5"))):
+        try:
+            componentList = list_h5_components(listingCache.get(filepath))[0]
+        except Exception as e:
+            progress(f"Could not open {filepath}: {e}")
+            continue
+        for componentString in fnmatch.filter(componentList, componentPattern):
+            fileStem = os.path.splitext(os.path.basename(filepath))[0]
+            outputName = (fileStem + "_" + componentString).replace(" ","_").replace("-","_")
+            jobs.append((filepath, componentString, settings, os.path.join(outputFolder, outputName)))
+    listingCache.clear()
+    progress(f"Rendering {len(jobs)} figures")
+    
+    failures = 0
+    with ProcessPoolExecutor(max_workers=maxWorkers, mp_context=processContext) as executor:
+        futures = {executor.submit(render_figure_job, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                progress(f"Saved {future.result()}")
+            except Exception as e:
+                failures += 1
+                progress(f"Could not render {futures[future][1]} of {futures[future][0]}: {e}")
+    return failures
+
+def batch_render_main(argv):
+    parser = argparse.ArgumentParser(prog="CTrapVis.py", description="Render CTrapVis figures without opening the GUI")
+    parser.add_argument("--render", metavar="FOLDER", required=True, help="folder with the .h5 files")
+    parser.add_argument("--components", default="*", help='glob of the components to render, e.g. "kymos-*" (default: all)')
+    parser.add_argument("--settings", help='.json plot settings ("Save Plot Settings" in the GUI) - missing keys use the defaults')
+    parser.add_argument("--output", help="folder for the figures (default: the .h5 folder)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    arguments = parser.parse_args(argv)
+    
+    settings = {}
+    if arguments.settings is not None:
+        with open(arguments.settings) as settingsFile:
+            settings = json.load(settingsFile)
+    unknownKeys = set(settings) - set(default_plot_settings())
+    if len(unknownKeys) > 0:
+        print(f"Ignoring unknown settings: {', '.join(sorted(unknownKeys))}")
+        settings = {key: value for key, value in settings.items() if key not in unknownKeys}
+    outputFolder = arguments.output if arguments.output is not None else arguments.render
+    failures = batch_render(arguments.render, arguments.components, settings, outputFolder, arguments.workers)
+    return 1 if failures > 0 else 0
+
+"""
+One matplotlib Figure, Tk canvas and navigation toolbar created once per window and reused
+for every plot drawn in it, instead of a new frame/canvas/toolbar on every redraw.
+new_layout() clears the figure and adds new axes when the layout of the plot changes.
+When only the entries change, refresh() re-applies the axis limits registered with
+set_entry_limits() and runs the image updaters, which swap image data in place with
+set_data, so the axes and artists are kept. Artists drawn between begin_overlay() and
+end_overlay() (e.g. tracked lines) can be removed again with clear_overlay().
+Artists registered with set_blit_artists() (the frame of a scan stack and its highlighted
+force segment) are redrawn by blit() on top of a saved copy of the rest of the figure,
+so scrubbing/playing a stack does not redraw the axes, ticks and traces every frame.
+The saved background is thrown away whenever the canvas is drawn in full (zoom, resize).
+"""
+class PlotSurface():
+    def __init__(self, tkMaster, dpi=100):
+        self.frame = tk.ttk.Frame(tkMaster,relief=tk.FLAT)
+        self.figure = matplotlib.figure.Figure(dpi=dpi)
+        self.canvas = FigureCanvasTkAgg(self.figure,master=self.frame)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.frame)
+        self.toolbar.update()
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        self.layoutKey = None
+        self.axes = None
+        self._entryLimits = []
+        self._imageUpdaters = []
+        self._overlayAxis = None
+        self._overlayBase = set()
+        self._overlayArtists = []
+        self._blitArtists = []
+        self._blitBackground = None
+        self._capturingBackground = False
+        self.canvas.mpl_connect('draw_event', self._forget_blit_background)
+
+    def new_layout(self, nrows=1, constrained_layout=False, **subplotKwargs):
+        self.figure.clear()
+        if hasattr(self.figure, "set_layout_engine"):
+            self.figure.set_layout_engine("constrained" if constrained_layout else None)
+        else:
+            self.figure.set_constrained_layout(constrained_layout)
+        self.layoutKey = None #set by the caller once the plot is complete
+        self._entryLimits = []
+        self._imageUpdaters = []
+        self._overlayArtists = []
+        self._blitArtists = []
+        self._blitBackground = None
+        self.axes = self.figure.subplots(nrows=nrows, ncols=1, **subplotKwargs)
+        self.toolbar.update() #forget the zoom history of the previous plot
+        return self.figure, self.axes
+
+    def set_entry_limits(self, axis, xEntries, yEntries):
+        self._entryLimits.append((axis, xEntries, yEntries))
+        axis.set_xlim(float(xEntries[0].get()),float(xEntries[1].get()))
+        axis.set_ylim(float(yEntries[0].get()),float(yEntries[1].get()))
+        return
+
+    def add_image_updater(self, updater):
+        self._imageUpdaters.append(updater)
+        return
+
+    def refresh(self):
+        for updater in self._imageUpdaters:
+            updater()
+        for axis, xEntries, yEntries in self._entryLimits:
+            axis.set_xlim(float(xEntries[0].get()),float(xEntries[1].get()))
+            axis.set_ylim(float(yEntries[0].get()),float(yEntries[1].get()))
+        self.draw()
+        return
+
+    def set_blit_artists(self, artists):
+        self._blitArtists = [artist for artist in artists if artist is not None]
+        self._blitBackground = None
+        return
+
+    def _forget_blit_background(self, event):
+        if not self._capturingBackground:
+            self._blitBackground = None
+        return
+
+    def blit(self):
+        if len(self._blitArtists) == 0:
+            self.draw()
+            return
+        if self._blitBackground is None:
+            #draw everything else once and keep a copy of it
+            for artist in self._blitArtists:
+                artist.set_visible(False)
+            self._capturingBackground = True
+            self.canvas.draw()
+            self._capturingBackground = False
+            self._blitBackground = self.canvas.copy_from_bbox(self.figure.bbox)
+            for artist in self._blitArtists:
+                artist.set_visible(True)
+        else:
+            self.canvas.restore_region(self._blitBackground)
+        for artist in self._blitArtists:
+            artist.axes.draw_artist(artist)
+        self.canvas.blit(self.figure.bbox)
+        return
+
+    def begin_overlay(self, axis):
+        self._overlayAxis = axis
+        self._overlayBase = set(axis.get_children())
+        return
+
+    def end_overlay(self):
+        self._overlayArtists = [artist for artist in self._overlayAxis.get_children() if artist not in self._overlayBase]
+        return
+
+    def clear_overlay(self):
+        for artist in self._overlayArtists:
+            artist.remove()
+        self._overlayArtists = []
+        return
+
+    def draw(self):
+        self.canvas.draw_idle()
+        return
+
+
+"""
+Tracks the lines of one colour channel held in shared memory (runs in a tracking worker process).
+trackingMethod is 'Greedy' (lk.track_greedy) or anything else for lk.track_lines, trackingParameters
+are the keyword arguments of that function. Lines shorter than minLength are filtered out and with
+refineLineWidth the lines are refined with lk.refine_lines_centroid.
+The image is detached from the returned lines so only the coordinates go back through the pool,
+attach_channel_data binds them to the channel again in the GUI process.
+Long channels are tracked as time tiles with track_time_tile instead (see kymotracker_tiles.py).
+"""
+def track_channel_lines(sharedChannel, trackingMethod, trackingParameters, minLength, refineLineWidth=None, colorName=""):
+    sharedName, shape, dtype = sharedChannel
+    sharedMemory = shared_memory.SharedMemory(name=sharedName)
+    try:
+        channelData = np.ndarray(shape, dtype=dtype, buffer=sharedMemory.buf)
+        lines = filter_and_refine_lines(track_image(channelData, trackingMethod, trackingParameters), minLength, refineLineWidth, colorName)
+        detach_channel_data(lines)
+        del channelData
+        return lines
+    finally:
+        try:
+            sharedMemory.close()
+        except BufferError:
+            pass #a failed tracking run can still hold a view, the block is released with the worker
+
+"""
+Stitches the lines tracked per time tile of a channel held in shared memory (see stitch_tile_lines), then
+filters and refines them like track_channel_lines - run in a tracking worker process so the refinement of a
+long kymograph does not block the GUI. Returns the lines detached from the image.
+"""
+def stitch_and_refine_lines(sharedChannel, tileLines, tiles, lineWidth, minLength, refineLineWidth=None, colorName=""):
+    sharedName, shape, dtype = sharedChannel
+    sharedMemory = shared_memory.SharedMemory(name=sharedName)
+    try:
+        channelData = np.ndarray(shape, dtype=dtype, buffer=sharedMemory.buf)
+        lines = build_stitched_lines(stitch_tile_lines(tileLines, tiles, lineWidth), channelData)
+        lines = filter_and_refine_lines(lines, minLength, refineLineWidth, colorName)
+        detach_channel_data(lines)
+        del channelData
+        return lines
+    finally:
+        try:
+            sharedMemory.close()
+        except BufferError:
+            pass #a failed tracking run can still hold a view, the block is released with the worker
+
+"""
+Removes lines shorter than minLength and, with refineLineWidth, refines the rest with lk.refine_lines_centroid
+"""
+def filter_and_refine_lines(lines, minLength, refineLineWidth=None, colorName=""):
+    lines = lk.filter_lines(lines, minLength)
+    if refineLineWidth is not None:
+        try:
+            lines = lk.refine_lines_centroid(lines, line_width=refineLineWidth)
+        except:
+            print(f"No {colorName} lines were tracked")
+    return lines
+
+"""
+Bottom line of a custom kymotracker region from its clicks ([time, position] pairs): the first click
+sets the top of the region, the second starts the bottom line (horizontal before it) and every later
+click adds a straight segment, the last one extended to the end of the kymograph.
+Returns the top and bottom position of the region and the vertices of the bottom line from time 0
+to numTimePoints.
+"""
+def custom_area_boundary(listOfCoords, numTimePoints):
+    topPosition = listOfCoords[0][1]
+    bottomPoints = sorted((coords[0], coords[1]) for coords in listOfCoords[1:])
+    boundaryTimes = [0] + [time for time, position in bottomPoints]
+    boundaryPositions = [bottomPoints[0][1]] + [position for time, position in bottomPoints]
+    
+    lastSlope = 0
+    if len(bottomPoints) > 1 and bottomPoints[-1][0] != bottomPoints[-2][0]:
+        lastSlope = (bottomPoints[-1][1] - bottomPoints[-2][1]) / (bottomPoints[-1][0] - bottomPoints[-2][0])
+    boundaryTimes.append(max(numTimePoints, bottomPoints[-1][0]))
+    boundaryPositions.append(bottomPoints[-1][1] + (boundaryTimes[-1] - bottomPoints[-1][0]) * lastSlope)
+    bottomPosition = max(position for time, position in bottomPoints)
+    return topPosition, bottomPosition, np.asarray(boundaryTimes, dtype=float), np.asarray(boundaryPositions, dtype=float)
+
+"""
+Rasterizes a custom kymotracker region into a boolean mask of the rows from its top to its bottom
+position by all numTimePoints time points, True above the bottom line (see custom_area_boundary)
+"""
+def custom_area_mask(listOfCoords, numTimePoints):
+    topPosition, bottomPosition, boundaryTimes, boundaryPositions = custom_area_boundary(listOfCoords, numTimePoints)
+    boundary = np.floor(np.interp(np.arange(numTimePoints), boundaryTimes, boundaryPositions))
+    return np.arange(topPosition, bottomPosition)[:, np.newaxis] < boundary[np.newaxis, :]
+
+"""
+Fingerprint of a (filtered) image channel, used to key tracking results to the region they were tracked on
+"""
+def channel_digest(channelData):
+    channelData = np.ascontiguousarray(channelData)
+    return hashlib.sha1(channelData.view(np.uint8)).hexdigest() + str(channelData.shape) + channelData.dtype.str
+
+"""
+Parses the values of one parameter of a tracking sweep: a comma separated list ("2, 4, 8")
+or an inclusive range "start:stop:step" ("0.5:2:0.5"), converted with valueType
+"""
+def parse_sweep_values(text, valueType):
+    values = []
+    for part in text.split(','):
+        part = part.strip()
+        if part == "":
+            continue
+        if ':' in part:
+            start, stop, step = [float(value) for value in part.split(':')]
+            if step <= 0:
+                raise ValueError(f"The step of the range {part} has to be larger than 0")
+            #start + i*step rounded to 12 significant digits, so 0.1:0.3:0.1 gives 0.3 rather than 0.30000000000000004
+            numberOfValues = int(np.floor((stop - start) / step + 1e-9)) + 1
+            values.extend(valueType(float(f"{start + i * step:.12g}")) for i in range(max(numberOfValues, 0)))
+        else:
+            values.append(valueType(float(part)))
+    return list(OrderedDict.fromkeys(values)) #remove duplicates but keep the order
+
+"""
+Quality summary of one tracking result: the number of tracks, their mean duration in s (dt is the
+line time), the percentage of the time points of the region covered by at least one track and the
+mean summed photon count along the tracks (lineWidth pixels wide, like the intensity extraction)
+"""
+def summarize_tracked_lines(lines, channelData, lineWidth, dt):
+    lines = list(lines)
+    if len(lines) == 0:
+        return {'tracks': 0, 'meanLength': 0.0, 'coverage': 0.0, 'meanIntensity': 0.0}
+    durations = [(line.time_idx[-1] - line.time_idx[0]) * dt for line in lines]
+    coveredTimes = np.unique(np.concatenate([np.round(np.asarray(line.time_idx)).astype(int) for line in lines]))
+    try:
+        meanIntensity = float(np.mean([np.mean(line.sample_from_image(num_pixels=math.ceil(lineWidth))) for line in lines]))
+    except Exception:
+        meanIntensity = float('nan') #lines that are not bound to an image
+    return {'tracks': len(lines),
+            'meanLength': float(np.mean(durations)),
+            'coverage': 100 * len(coveredTimes) / channelData.shape[1],
+            'meanIntensity': meanIntensity}
+
+"""
+Long-format table of tracked lines with one row per tracked point: its track number (counted per
+color from 1), color, time and coordinate index in the kymograph (region offsets added), time in s
+and position in nm (dt is the line time in s, dx the pixel size in nm). linesByColor is a list of
+(color name, lines). With intensityPixels the photon counts summed over that many pixels around
+every point (line.sample_from_image) are added as well.
+Returns a NumPy structured array.
+"""
+def tracked_lines_table(linesByColor, offsetX, offsetY, dx, dt, intensityPixels=None):
+    fields = [('track', np.int32), ('color', 'U8'), ('time_index', np.float64), ('coordinate_index', np.float64),
+              ('time_s', np.float64), ('position_nm', np.float64)]
+    if intensityPixels is not None:
+        fields.append(('summed_photon_counts', np.float64))
+    trackNumbers, colors, timeIndices, coordinateIndices, intensities = [], [], [], [], []
+    for colorName, lines in linesByColor:
+        for trackNumber, line in enumerate(lines):
+            trackNumbers.append(trackNumber + 1)
+            colors.append(colorName)
+            timeIndices.append(np.asarray(line.time_idx, dtype=np.float64))
+            coordinateIndices.append(np.asarray(line.coordinate_idx, dtype=np.float64))
+            if intensityPixels is not None:
+                intensities.append(np.asarray(line.sample_from_image(num_pixels=intensityPixels), dtype=np.float64))
+    
+    lineLengths = [len(lineTimes) for lineTimes in timeIndices]
+    table = np.zeros(sum(lineLengths), dtype=fields)
+    if len(table) == 0:
+        return table
+    table['track'] = np.repeat(np.asarray(trackNumbers, dtype=np.int32), lineLengths)
+    table['color'] = np.repeat(np.asarray(colors, dtype='U8'), lineLengths)
+    table['time_index'] = np.concatenate(timeIndices) + offsetY
+    table['coordinate_index'] = np.concatenate(coordinateIndices) + offsetX
+    table['time_s'] = table['time_index'] * dt
+    table['position_nm'] = table['coordinate_index'] * dx
+    if intensityPixels is not None:
+        table['summed_photon_counts'] = np.concatenate(intensities)
+    return table
+
+"""
+Writes a tracked_lines_table to filenameBase + fileFormat:
+".xlsx" - one sheet per color ("Red Lines", ...)
+".csv" - all colors in one file
+".parquet" - all colors in one file (needs pyarrow)
+Returns the path of the written file.
+"""
+def export_tracked_lines(table, filenameBase, fileFormat=".xlsx"):
+    outputPath = filenameBase + fileFormat
+    if fileFormat == ".xlsx":
+        with pd.ExcelWriter(outputPath) as writer:
+            for colorName in OrderedDict.fromkeys(table['color']):
+                pd.DataFrame(table[table['color'] == colorName]).to_excel(writer,sheet_name=colorName + " Lines",index=False,header=True)
+    elif fileFormat == ".csv":
+        pd.DataFrame(table).to_csv(outputPath, sep=',', index=False, header=True)
+    elif fileFormat == ".parquet":
+        if pq is None:
+            raise ImportError("Parquet export needs the pyarrow module ('pip install pyarrow')")
+        pq.write_table(pa.table({name: table[name] for name in table.dtype.names}), outputPath)
+    else:
+        raise ValueError(f"Unknown tracked lines export format {fileFormat}")
+    return outputPath
+
+"""
+In-memory cache of tracking results keyed by the channel_digest of the (filtered) channel they were
+tracked on, the tracking method with all of its parameters, the minimum line length, the
+refinement line width and the time tiles it was tracked in (or "untiled"), so tracking the same region with the same settings again returns the
+lines without running pylake. The cached lines stay bound to their channel, so every channel is
+counted once next to the coordinates of all lines tracked on it, and the least recently used
+results are dropped beyond maxMemoryMB.
+"""
+class TrackingResultCache():
+    def __init__(self, maxMemoryMB=256):
+        self.maxMemory = maxMemoryMB * 1024**2
+        self.bytesInMemory = 0
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._channelUsers = {}
+
+    def key(self, channelDigest, trackingMethod, trackingParameters, minLength, refineLineWidth, tiles=None):
+        #tiled and whole-image tracking can give different lines, so the time tiles are part of the key
+        tiling = "untiled" if tiles is None or len(tiles) == 1 else tuple(tiles)
+        return (channelDigest, trackingMethod, tuple(sorted(trackingParameters.items())), minLength, refineLineWidth, tiling)
+
+    def get(self, key):
+        if key in self._results:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return self._results[key][0]
+        self.misses += 1
+        return None
+
+    def put(self, key, lines, channelData):
+        coordinateBytes = sum(np.asarray(line.time_idx).nbytes + np.asarray(line.coordinate_idx).nbytes for line in lines)
+        if coordinateBytes + channelData.nbytes > self.maxMemory:
+            return
+        if key in self._results:
+            self._drop(key)
+        channelDigest = key[0]
+        if channelDigest not in self._channelUsers:
+            self._channelUsers[channelDigest] = [channelData.nbytes, 0]
+            self.bytesInMemory += channelData.nbytes
+        self._channelUsers[channelDigest][1] += 1
+        self._results[key] = (lines, coordinateBytes)
+        self.bytesInMemory += coordinateBytes
+        while self.bytesInMemory > self.maxMemory:
+            self._drop(next(iter(self._results)))
+        return
+
+    def _drop(self, key):
+        coordinateBytes = self._results.pop(key)[1]
+        self.bytesInMemory -= coordinateBytes
+        channelUsers = self._channelUsers[key[0]]
+        channelUsers[1] -= 1
+        if channelUsers[1] == 0:
+            self.bytesInMemory -= channelUsers[0]
+            del self._channelUsers[key[0]]
+        return
+
+    def clear(self):
+        self._results.clear()
+        self._channelUsers.clear()
+        self.bytesInMemory = 0
+        return
+
+    def __repr__(self):
+        return (f"TrackingResultCache({len(self._results)} results, {self.bytesInMemory/1024**2:.1f}/{self.maxMemory/1024**2:.0f} MB, "
+                f"{self.hits} hits, {self.misses} misses)")
+
 
 class KymoTrackerGUI():
     def __init__(self,kt_master,filepath,typePointer,RGB_Data,mod_RGB_Data):
         self.kt_master = kt_master
         print("\nTo select a region to analyze, either drag a rectangle on the RGB image or hit the 'Define Region of Interest'\nand follow those instructions.\n")
-        kymoPointer = lk.File(filepath).kymos[typePointer]
+        kymoPointer = h5FileCache.get(filepath).kymos[typePointer]
         red_channel_data = RGB_Data[:,:,0]
         green_channel_data = RGB_Data[:,:,1]
         blue_channel_data = RGB_Data[:,:,2]
@@ -97,22 +2169,16 @@ class KymoTrackerGUI():
         dt = kymoPointer.line_time_seconds #scan time in s <-- this has been different in previous programs
         print(dt)
         
-        fig, ax = plt.subplots(1,1,constrained_layout=True)
-        fig.set_dpi(130)
+        #the figure/canvas/toolbar are reused by every tracking run in this window
+        ktPlotSurface = PlotSurface(kt_master,dpi=130)
+        ktPlotSurface.frame.grid(row=0,rowspan=10,column=0,columnspan=1,sticky="nw",padx=0,pady=0)
+        
+        fig, ax = ktPlotSurface.new_layout(constrained_layout=True)
         #,extent=[0, maxTrueTime, 0, maxTrueDist]
         ax.imshow(mod_RGB_Data, aspect="auto")
         ax.axis('off')
-        
-        frameForKTCanvas = tk.ttk.Frame(kt_master,relief=tk.FLAT)
-        frameForKTCanvas.grid(row=0,rowspan=10,column=0,columnspan=1,sticky="nw",padx=0,pady=0)
-            
-        canvas=FigureCanvasTkAgg(fig,master=frameForKTCanvas)
-        canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-        canvas.draw()
-        
-        toolbar = NavigationToolbar2Tk(canvas, frameForKTCanvas)
-        toolbar.update()
-        canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        ktPlotSurface.layoutKey = False #same layout as tracking without the separate plot option
+        ktPlotSurface.draw()
         """
         The next two functions are used in drawing the rectangle as you draw it on the plot
         """
@@ -134,114 +2200,200 @@ class KymoTrackerGUI():
             return
         
         """
-        This function does the work of actually tracking the line objects.
-        The offset terms are used to define the region of interest/plot the correct
-        position and time values.
+        Tracking runs on a process pool shared by every tracking run of this window. Each enabled colour
+        is sent to it as a shared memory copy of its filtered channel and the futures are polled from the
+        tkinter loop, so the tracked lines of a colour are stored and plotted as soon as it finishes.
+        A new tracking run supersedes a running one, whose results are ignored.
+        Kymographs longer than two tiles are split into overlapping time tiles (kymotracker_tiles.py)
+        that are tracked in parallel and stitched once the last tile of the colour is done.
+        Results are cached by region, color, parameters and time tiles, so a colour that was tracked with
+        the same settings before is plotted without tracking it again. The parameter sweep tracks whole
+        images, so its results are only reused for channels short enough not to be tiled.
         """
-        def call_track_lines(event):
-            global offset_x
-            global offset_y
+        trackingRun = {'id': 0, 'futures': {}, 'sharedMemory': [], 'executor': None, 'settings': None}
+        trackingResultCache = TrackingResultCache()
+        
+        def tracking_executor():
+            if trackingRun['executor'] is None:
+                trackingRun['executor'] = ProcessPoolExecutor(mp_context=processContext) #shared with the parameter sweep and the time tiles
+            return trackingRun['executor']
+        
+        """
+        The keyword of every pylake parameter of a tracking method with the entry it is read from and its type
+        """
+        def tracking_parameter_entries(trackingMethod):
+            if trackingMethod == "Greedy":
+                return [('line_width', "Line Width", entryLineWidthGreedy, int),
+                        ('pixel_threshold', "Pixel Threshold", entryPixelThresholdGreedy, int),
+                        ('window', "Window", entryWindow, int),
+                        ('sigma', "Sigma", entrySigma, float),
+                        ('vel', "Vel", entryVel, float),
+                        ('diffusion', "Diffusion", entryDiffusion, float),
+                        ('sigma_cutoff', "Sigma Cutoff", entrySigmaCutoff, float)]
+            return [('line_width', "Line Width", entryLineWidthLines, int),
+                    ('max_lines', "Max Number Lines", entryMaxLines, int),
+                    ('start_threshold', "Start Threshold", entryStartThreshold, float),
+                    ('continuation_threshold', "Continuation Threshold", entryContinuationThreshold, float),
+                    ('angle_weight', "Angle Weight", entryAngleWeight, float)]
+        
+        def read_tracking_parameters():
+            trackingMethod = comboboxMethod.get()
+            trackingParameters = {keyword: valueType(entry.get()) for keyword, label, entry, valueType in tracking_parameter_entries(trackingMethod)}
+            refineLineWidth = int(entryLineWidthLines.get()) if refineLinesOptCB.state() == ('selected',) else None
+            return trackingMethod, trackingParameters, int(entryLineLenGreedy.get()), refineLineWidth
+        
+        def release_tracking_memory():
+            for sharedMemory in trackingRun['sharedMemory']:
+                sharedMemory.close()
+                sharedMemory.unlink()
+            trackingRun['sharedMemory'] = []
+            return
+        
+        def cancel_tracking_jobs():
+            trackingRun['id'] += 1
+            for future in trackingRun['futures']:
+                future.cancel()
+            trackingRun['futures'] = {}
+            release_tracking_memory()
+            return
+        
+        def submit_tracking_jobs(colorsToTrack, trackingMethod, trackingParameters, minLength, refineLineWidth, axForTraces):
+            cancel_tracking_jobs()
+            for colorName, channelData in colorsToTrack:
+                #long kymographs are tracked as overlapping time tiles that are stitched once all of them are done
+                tiles = plan_tracking_tiles(channelData.shape[1], trackingMethod, trackingParameters)
+                resultKey = trackingResultCache.key(channel_digest(channelData), trackingMethod, trackingParameters, minLength, refineLineWidth, tiles)
+                cachedLines = trackingResultCache.get(resultKey)
+                if cachedLines is not None:
+                    store_tracked_lines(colorName, cachedLines)
+                    plot_tracked_lines(axForTraces, cachedLines, colorName, offset_x, offset_y)
+                    continue
+                sharedMemory, sharedChannel = share_channel_data(channelData)
+                trackingRun['sharedMemory'].append(sharedMemory)
+                colorJob = {'colorName': colorName, 'channelData': channelData, 'axForTraces': axForTraces, 'resultKey': resultKey,
+                            'sharedChannel': sharedChannel, 'minLength': minLength, 'refineLineWidth': refineLineWidth, 'failed': False}
+                if len(tiles) == 1:
+                    future = tracking_executor().submit(track_channel_lines, sharedChannel, trackingMethod, trackingParameters, minLength, refineLineWidth, colorName)
+                    trackingRun['futures'][future] = (colorJob, None)
+                    continue
+                colorJob.update({'tiles': tiles, 'tileLines': [None] * len(tiles), 'pendingTiles': len(tiles), 'lineWidth': trackingParameters.get('line_width', 1)})
+                for tileIndex, (tileStart, tileStop) in enumerate(tiles):
+                    future = tracking_executor().submit(track_time_tile, sharedChannel, tileStart, tileStop, trackingMethod, trackingParameters)
+                    trackingRun['futures'][future] = (colorJob, tileIndex)
+            if trackingRun['futures']:
+                kt_master.after(50, poll_tracking_jobs, trackingRun['id'])
+            return
+        
+        def store_tracked_lines(colorName, lines):
             global filtered_red_lines
             global filtered_green_lines
             global filtered_blue_lines
-            
-            filtered_red_lines = ""
-            filtered_green_lines = ""
-            filtered_blue_lines = ""
-            
-            """
-            Call lumicks.pylake tracking algorithm
-            """
-            def track_lines_one_color(one_channel_data,tracking_style):
-                if tracking_style == "Greedy":
-                    lines_tracked = lk.track_greedy(one_channel_data,
-                                                line_width=int(entryLineWidthGreedy.get()),
-                                                pixel_threshold=int(entryPixelThresholdGreedy.get()),
-                                                window = int(entryWindow.get()),
-                                                sigma = float(entrySigma.get()),
-                                                vel = float(entryVel.get()),
-                                                diffusion = float(entryDiffusion.get()),
-                                                sigma_cutoff = float(entrySigmaCutoff.get()))
-                else:
-                    lines_tracked = lk.track_lines(one_channel_data,    
-                                               line_width = int(entryLineWidthLines.get()),
-                                               max_lines = int(entryMaxLines.get()),
-                                               start_threshold = float(entryStartThreshold.get()),
-                                               continuation_threshold = float(entryContinuationThreshold.get()),
-                                               angle_weight = float(entryAngleWeight.get()))
-                
-                filtered_tracked_lines = lk.filter_lines(lines_tracked,int(entryLineLenGreedy.get()))
-                    
-                return filtered_tracked_lines
-            
-            """
-            If the user wants to use the custom area selection, the image data is filtered
-            through this function.
-            """
-            def filter_custom_area(colorArray,listOfCoords):
-                global custom_x_max
-                offset_x = listOfCoords[0][1]
-                offset_y = 0 #for the custom area method the window is defined through the whole kymograph
+            if colorName == "red":
+                filtered_red_lines = lines
+            elif colorName == "green":
+                filtered_green_lines = lines
+            else:
+                filtered_blue_lines = lines
+            return
+        
+        """
+        This function plots the tracked lines either on the image plot or on 
+        the additional plot.
+        """
+        def plot_tracked_lines(axForTraces,line_obj,string_for_color,offset_x,offset_y):
+            for line in line_obj:
+                time_vals = line.time_idx
+                time_vals = [y+offset_y for y in time_vals]
+                coordinate_vals = line.coordinate_idx
+                coordinate_vals = [x+offset_x for x in coordinate_vals]
                 
-                list_of_x_vals = [item[1] for item in listOfCoords[1:]]
-                custom_x_max = max(list_of_x_vals)
+                axForTraces.plot(time_vals,coordinate_vals,linewidth=1,color=string_for_color)
                 
-                previous_time_val = listOfCoords[1][0]
-                previous_position_val = listOfCoords[1][1]
-            
-                filtered_color_array = colorArray[offset_x:custom_x_max,:]
-                filtered_color_array[previous_position_val:,0:previous_time_val] = 0
+            return
+        
+        def poll_tracking_jobs(runId):
+            if runId != trackingRun['id']:
+                return #superseded by a newer tracking run
+            finishedFutures = [future for future in trackingRun['futures'] if future.done()]
+            for future in finishedFutures:
+                colorJob, tileIndex = trackingRun['futures'].pop(future)
+                colorName, channelData, axForTraces, resultKey = colorJob['colorName'], colorJob['channelData'], colorJob['axForTraces'], colorJob['resultKey']
+                try:
+                    trackedLines = future.result()
+                except Exception as e:
+                    if not colorJob['failed']:
+                        print(f"Tracking the {colorName} channel failed: {e}")
+                    colorJob['failed'] = True
+                    trackedLines = None
                 
-                for numSteps in range(2,len(listOfCoords)):
-                    current_time_val = math.ceil(listOfCoords[numSteps][0])
-                    current_position_val = math.floor(listOfCoords[numSteps][1])
-
-                    slope = (current_position_val - previous_position_val) / (current_time_val - previous_time_val)
-
-                    for i in range(previous_time_val,current_time_val):
-                        filtered_color_array[math.floor(previous_position_val+(i-previous_time_val)*slope):,i] = 0
-                        
-                    previous_time_val = current_time_val
-                    previous_position_val = current_position_val
-
-                return filtered_color_array, offset_x, offset_y
+                if tileIndex is None:
+                    if colorJob['failed']:
+                        continue
+                    lines = attach_channel_data(trackedLines, channelData)
+                else:
+                    colorJob['tileLines'][tileIndex] = trackedLines
+                    colorJob['pendingTiles'] -= 1
+                    if colorJob['pendingTiles'] > 0 or colorJob['failed']:
+                        continue
+                    #stitching and refining run on the pool as well, their result comes back like an untiled colour
+                    future = tracking_executor().submit(stitch_and_refine_lines, colorJob['sharedChannel'], colorJob['tileLines'], colorJob['tiles'],
+                                                        colorJob['lineWidth'], colorJob['minLength'], colorJob['refineLineWidth'], colorName)
+                    trackingRun['futures'][future] = (colorJob, None)
+                    continue
+                trackingResultCache.put(resultKey, lines, channelData)
+                store_tracked_lines(colorName, lines)
+                plot_tracked_lines(axForTraces, lines, colorName, offset_x, offset_y)
+            if finishedFutures:
+                ktPlotSurface.end_overlay()
+                ktPlotSurface.draw()
             
-            """
-            If the user wants to use the basic area selection, the image data is filtered
-            through this function.
-            """
-            def filter_basic_area(colorArray,basicAreaCoords):
-                offset_x = basicAreaCoords[1][0]
-                offset_y = basicAreaCoords[0][0]
-                
-                filtered_color_array = colorArray[offset_x:basicAreaCoords[1][1],offset_y:basicAreaCoords[0][1]]
-                return filtered_color_array, offset_x, offset_y
+            if trackingRun['futures']:
+                kt_master.after(50, poll_tracking_jobs, runId)
+            else:
+                release_tracking_memory()
+            return
+        
+        """
+        If the user wants to use the custom area selection, the image data is filtered
+        through this function. The region is rasterized into a mask once per set of clicks and
+        applied to all three colors at once, the photon counts themselves are never modified.
+        """
+        customAreaMask = {'pointers': None, 'mask': None}
+        
+        def filter_custom_area(listOfCoords):
+            global custom_x_max
+            pointersKey = tuple(tuple(coords) for coords in listOfCoords)
+            if customAreaMask['pointers'] != pointersKey:
+                customAreaMask['mask'] = custom_area_mask(listOfCoords, num_timestamps)
+                customAreaMask['pointers'] = pointersKey
             
-            """
-            This function plots the tracked lines either on the image plot or on 
-            the additional plot.
-            """
-            def plot_tracked_lines(line_obj,string_for_color,offset_x,offset_y):
-                for line in line_obj:
-                    time_vals = line.time_idx
-                    time_vals = [y+offset_y for y in time_vals]
-                    coordinate_vals = line.coordinate_idx
-                    coordinate_vals = [x+offset_x for x in coordinate_vals]
-                    
-                    axForTraces.plot(time_vals,coordinate_vals,linewidth=1,color=string_for_color)
-                    
-                return
+            offset_x = listOfCoords[0][1]
+            offset_y = 0 #for the custom area method the window is defined through the whole kymograph
+            custom_x_max = offset_x + customAreaMask['mask'].shape[0]
             
-            """
-            Filtering the area of analysis using either the custom defintion (requires you to enter
-            the TopLevel feature and click on the correct places and have the complexAreaOption selected)
-            or by using the last drawn rectangle in this window.
-            """
+            filtered_RGB_array = RGB_Data[offset_x:custom_x_max,:,:] * customAreaMask['mask'][:,:,np.newaxis]
+            return filtered_RGB_array[:,:,0], filtered_RGB_array[:,:,1], filtered_RGB_array[:,:,2], offset_x, offset_y
+        
+        """
+        If the user wants to use the basic area selection, the image data is filtered
+        through this function.
+        """
+        def filter_basic_area(colorArray,basicAreaCoords):
+            offset_x = basicAreaCoords[1][0]
+            offset_y = basicAreaCoords[0][0]
+            
+            filtered_color_array = colorArray[offset_x:basicAreaCoords[1][1],offset_y:basicAreaCoords[0][1]]
+            return filtered_color_array, offset_x, offset_y
+        
+        """
+        Filtering the area of analysis using either the custom defintion (requires you to enter
+        the TopLevel feature and click on the correct places and have the complexAreaOption selected)
+        or by using the last drawn rectangle in this window.
+        """
+        def select_tracking_region():
             if complexAreaOption.state() == ('selected',):
                 try:
-                    filtered_red_channel_data , offset_x, offset_y = filter_custom_area(red_channel_data,custom_area_pointers)
-                    filtered_green_channel_data , offset_x, offset_y = filter_custom_area(green_channel_data,custom_area_pointers)
-                    filtered_blue_channel_data , offset_x, offset_y = filter_custom_area(blue_channel_data,custom_area_pointers)
+                    filtered_red_channel_data, filtered_green_channel_data, filtered_blue_channel_data, offset_x, offset_y = filter_custom_area(custom_area_pointers)
                 except:
                     try:
                         print("\nCustom area has not been defined yet, defaulting to tracking the basic_area parameter.")
@@ -267,49 +2419,61 @@ class KymoTrackerGUI():
                         filtered_blue_channel_data = blue_channel_data
                         offset_x=0
                         offset_y=0
+            return filtered_red_channel_data, filtered_green_channel_data, filtered_blue_channel_data, offset_x, offset_y
+        
+        """
+        This function does the work of actually tracking the line objects.
+        The offset terms are used to define the region of interest/plot the correct
+        position and time values.
+        """
+        def call_track_lines(event, trackingSettings=None):
+            global offset_x
+            global offset_y
+            global filtered_red_lines
+            global filtered_green_lines
+            global filtered_blue_lines
             
-            #now generate the plot
-            if separatePlotOpt.state() == ('selected',):
-                kt_fig, (axRGB,axForTraces) = plt.subplots(nrows=2,ncols=1,constrained_layout=True,sharex=True,sharey=True)
-                axRGB.imshow(mod_RGB_Data, aspect="auto")
-                axRGB.axis('off')
-                axForTraces.axis('off')
-            else:
-                kt_fig, axForTraces = plt.subplots(nrows=1,ncols=1)
-                axForTraces.imshow(mod_RGB_Data, aspect="auto")
-                axForTraces.axis('off')
+            filtered_red_lines = ""
+            filtered_green_lines = ""
+            filtered_blue_lines = ""
             
-            kt_fig.set_dpi(130)
+            filtered_red_channel_data, filtered_green_channel_data, filtered_blue_channel_data, offset_x, offset_y = select_tracking_region()
             
-            tracking_method = comboboxMethod.get()
+            #now generate the plot - the figure is only rebuilt when the layout changes, otherwise the previous traces are removed
+            separatePlots = separatePlotOpt.state() == ('selected',)
+            if ktPlotSurface.layoutKey == separatePlots:
+                ktPlotSurface.clear_overlay()
+                kt_fig = ktPlotSurface.figure
+                if separatePlots:
+                    axRGB, axForTraces = ktPlotSurface.axes
+                else:
+                    axForTraces = ktPlotSurface.axes
+            else:
+                if separatePlots:
+                    kt_fig, (axRGB,axForTraces) = ktPlotSurface.new_layout(nrows=2,constrained_layout=True,sharex=True,sharey=True)
+                    axRGB.imshow(mod_RGB_Data, aspect="auto")
+                    axRGB.axis('off')
+                    axForTraces.axis('off')
+                    draw_temp_rectangle.RS = matplotlib.widgets.RectangleSelector(axRGB, get_rect_dimensions, drawtype='box',rectprops=rectproperties)
+                else:
+                    kt_fig, axForTraces = ktPlotSurface.new_layout()
+                    axForTraces.imshow(mod_RGB_Data, aspect="auto")
+                    axForTraces.axis('off')
+                    draw_temp_rectangle.RS = matplotlib.widgets.RectangleSelector(axForTraces, get_rect_dimensions, drawtype='box',rectprops=rectproperties)
+                ktPlotSurface.layoutKey = separatePlots
+            ktPlotSurface.begin_overlay(axForTraces)
             
-            if redLinesVar.state() == ('selected',):
-                filtered_red_lines = track_lines_one_color(filtered_red_channel_data, tracking_method)
-                if refineLinesOptCB.state() == ('selected',):
-                    try:
-                        filtered_red_lines = lk.refine_lines_centroid(filtered_red_lines,line_width=int(entryLineWidthLines.get()))
-                    except:
-                        print("No red lines were tracked")
-                        
-                plot_tracked_lines(filtered_red_lines,"red", offset_x, offset_y)
-                
-            if greenLinesVar.state() == ('selected',):
-                filtered_green_lines = track_lines_one_color(filtered_green_channel_data, tracking_method)
-                if refineLinesOptCB.state() == ('selected',):
-                    try:
-                        filtered_green_lines = lk.refine_lines_centroid(filtered_green_lines,line_width=int(entryLineWidthLines.get()))
-                    except:
-                        print("No green lines were tracked")
-                plot_tracked_lines(filtered_green_lines,"green", offset_x, offset_y)
-                
-            if blueLinesVar.state() == ('selected',):
-                filtered_blue_lines = track_lines_one_color(filtered_blue_channel_data, tracking_method)
-                if refineLinesOptCB.state() == ('selected',):
-                    try:
-                        filtered_blue_lines = lk.refine_lines_centroid(filtered_blue_lines,line_width=int(entryLineWidthLines.get()))
-                    except:
-                        print("No blue lines were tracked")
-                plot_tracked_lines(filtered_blue_lines,"blue", offset_x, offset_y)
+            #the enabled colours are tracked concurrently, each one is plotted as soon as it finishes
+            if trackingSettings is None:
+                trackingSettings = read_tracking_parameters()
+            trackingRun['settings'] = trackingSettings
+            trackingMethod, trackingParameters, minLength, refineLineWidth = trackingSettings
+            
+            colorsToTrack = [(colorName, channelData) for colorName, channelOpt, channelData in 
+                             [("red", redLinesVar, filtered_red_channel_data),
+                              ("green", greenLinesVar, filtered_green_channel_data),
+                              ("blue", blueLinesVar, filtered_blue_channel_data)] if channelOpt.state() == ('selected',)]
+            submit_tracking_jobs(colorsToTrack, trackingMethod, trackingParameters, minLength, refineLineWidth, axForTraces)
             
             #plot the areas
             if showRegionOpt.state() == ('selected',):
@@ -325,45 +2489,20 @@ class KymoTrackerGUI():
                         axForTraces.axhline(custom_x_max,color="gray",linewidth=1)
                     else:
                         axForTraces.plot([0 , red_channel_data.shape[1]],[ offset_x,offset_x ],color="gray",linewidth=1)
-                
-                        previous_time_val = custom_area_pointers[1][0]
-                        previous_position_val = custom_area_pointers[1][1]
-                         
-                        axForTraces.plot([0,previous_time_val],[previous_position_val,previous_position_val],color="gray",linewidth=1)
-                        
-                        for numSteps in range(2,len(custom_area_pointers)):
-                            current_time_val = math.ceil(custom_area_pointers[numSteps][0])
-                            current_position_val = math.floor(custom_area_pointers[numSteps][1])
-                            
-                            axForTraces.plot([previous_time_val,current_time_val],[previous_position_val,current_position_val],color="gray",linewidth=1)
-                            
-                            slope_for_last = (current_position_val - previous_position_val) / (current_time_val - previous_time_val)
-                            
-                            previous_time_val = current_time_val
-                            previous_position_val = current_position_val
-                        
-                        step_til_end = red_channel_data.shape[1]-previous_time_val
-                        axForTraces.plot([previous_time_val,red_channel_data.shape[1]] , [previous_position_val,previous_position_val+step_til_end*slope_for_last] ,color="gray",linewidth=1)
+                        boundaryTimes, boundaryPositions = custom_area_boundary(custom_area_pointers, red_channel_data.shape[1])[2:]
+                        axForTraces.plot(boundaryTimes,boundaryPositions,color="gray",linewidth=1)
                         
-            frameForKTCanvas = tk.ttk.Frame(kt_master,relief=tk.FLAT)
-            frameForKTCanvas.grid(row=0,rowspan=10,column=0,columnspan=1,sticky="nw",padx=0,pady=0)
-            
-            canvas=FigureCanvasTkAgg(kt_fig,master=frameForKTCanvas)
-            canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-            canvas.draw()
+            ktPlotSurface.end_overlay()
+            ktPlotSurface.draw()
+            return
         
-            toolbar = NavigationToolbar2Tk(canvas, frameForKTCanvas)
-            toolbar.update()
-            canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-            
-            #add the rectangle selector functionality again
-            if separatePlotOpt.state() == ('selected',):
-                draw_temp_rectangle.RS = matplotlib.widgets.RectangleSelector(axRGB, get_rect_dimensions, drawtype='box',rectprops=rectproperties)
-                kt_fig.canvas.mpl_connect('button_press_event', draw_temp_rectangle)
-            else:
-                draw_temp_rectangle.RS = matplotlib.widgets.RectangleSelector(axForTraces, get_rect_dimensions, drawtype='box',rectprops=rectproperties)
-                kt_fig.canvas.mpl_connect('button_press_event', draw_temp_rectangle)
-            
+        """
+        Redraws the last tracking run when a display option changes - its settings are reused and
+        the lines come from the result cache, so nothing is tracked again
+        """
+        def redraw_tracked_lines():
+            if trackingRun['settings'] is not None:
+                call_track_lines(None, trackingRun['settings'])
             return
         
         """
@@ -429,30 +2568,189 @@ class KymoTrackerGUI():
             return
         
         """
-        Accessory function for the copy_data and extract_data functions that 
-        inputs a line object and outputs it to the desired line properties packaged
-        in a dictionary.
+        The parameter sweep tracks one color of the current region of interest with every combination
+        of the values entered in its window on the tracking process pool and lists a quality summary
+        per setting. Clicking a row previews its tracks on the kymograph and "Use Selected Setting"
+        copies its values to the tracking entries. Results are kept for the whole KymoTracker window,
+        so extending a sweep only tracks the new combinations. The tracked lines are kept in the
+        tracking result cache, so running the tracker with a swept setting does not track it again.
         """
-        def append_data_to_dict(dict_obj,lines_obj,string_descriptor):
-            for count, line in enumerate(lines_obj):
-                #extract necessary data
-                time_vals = line.time_idx
-                coordinate_vals = line.coordinate_idx
-                
-                #add the correct offset value
-                time_vals = [y+offset_y for y in time_vals]
-                coordinate_vals = [x+offset_x for x in coordinate_vals]
+        sweepSummaries = {}
+        
+        def open_parameter_sweep(event):
+            trackingMethod = comboboxMethod.get()
+            parameterEntries = tracking_parameter_entries(trackingMethod) + [('min_length', "Min. Line Length", entryLineLenGreedy, int)]
+            keywords = [keyword for keyword, label, entry, valueType in parameterEntries]
+            sweep = {'id': 0, 'futures': {}, 'sharedMemory': None, 'rows': {}, 'region': None}
+            
+            def cancel_sweep_jobs():
+                sweep['id'] += 1
+                for future in sweep['futures']:
+                    future.cancel()
+                sweep['futures'] = {}
+                if sweep['sharedMemory'] is not None:
+                    sweep['sharedMemory'].close()
+                    sweep['sharedMemory'].unlink()
+                    sweep['sharedMemory'] = None
+                return
+            
+            def show_sweep_result(rowId):
+                values = sweep['rows'][rowId][1]
+                summary = sweepSummaries[sweep['rows'][rowId][0]]
+                sweepTable.item(rowId, values=values + (summary['tracks'], f"{summary['meanLength']:.2f}", f"{summary['coverage']:.1f}", f"{summary['meanIntensity']:.1f}"))
+                return
+            
+            def run_sweep(event):
+                try:
+                    valueLists = [parse_sweep_values(sweepEntry.get(), valueType) for sweepEntry, (keyword, label, entry, valueType) in zip(sweepEntries, parameterEntries)]
+                except ValueError:
+                    print("Sweep values have to be numbers separated by commas or start:stop:step ranges")
+                    return
+                cancel_sweep_jobs()
+                colorName = comboboxSweepColor.get()
+                regionChannels = select_tracking_region()
+                channelData = regionChannels[['red','green','blue'].index(colorName)]
+                sweep['region'] = (colorName, channelData, regionChannels[3], regionChannels[4])
+                digest = channel_digest(channelData)
+                refineLineWidth = read_tracking_parameters()[3]
                 
-                #scale data using the metadata for dx (in nm) dt (in s)
-                time_vals = [t*dt for t in time_vals]
-                coordinate_vals = [x*dx for x in coordinate_vals]
+                sweepTable.delete(*sweepTable.get_children())
+                sweep['rows'] = {}
+                submittedKeys = set()
+                for values in itertools.product(*valueLists):
+                    trackingParameters = dict(zip(keywords[:-1], values[:-1]))
+                    key = trackingResultCache.key(digest, trackingMethod, trackingParameters, values[-1], refineLineWidth)
+                    rowId = sweepTable.insert("", "end", values=values + ("...",) * 4)
+                    sweep['rows'][rowId] = (key, values)
+                    cachedLines = trackingResultCache.get(key)
+                    if cachedLines is not None:
+                        if key not in sweepSummaries:
+                            sweepSummaries[key] = summarize_tracked_lines(cachedLines, channelData, trackingParameters['line_width'], dt)
+                        show_sweep_result(rowId)
+                    elif key not in submittedKeys:
+                        if sweep['sharedMemory'] is None:
+                            sweep['sharedMemory'], sweepChannel = share_channel_data(channelData)
+                        future = tracking_executor().submit(track_channel_lines, sweepChannel, trackingMethod, trackingParameters, values[-1], refineLineWidth, colorName)
+                        sweep['futures'][future] = (key, values)
+                        submittedKeys.add(key)
+                print(f"Sweeping {len(sweep['rows'])} settings, {len(submittedKeys)} of them have to be tracked")
+                poll_sweep_jobs(sweep['id'])
+                return
+            
+            def poll_sweep_jobs(sweepId):
+                if sweepId != sweep['id']:
+                    return #superseded by a newer sweep or the window was closed
+                colorName, channelData, offsetX, offsetY = sweep['region']
+                for future in [future for future in sweep['futures'] if future.done()]:
+                    key, values = sweep['futures'].pop(future)
+                    try:
+                        lines = attach_channel_data(future.result(), channelData)
+                    except Exception as e:
+                        print(f"Tracking with {dict(zip(keywords, values))} failed: {e}")
+                        continue
+                    trackingResultCache.put(key, lines, channelData)
+                    sweepSummaries[key] = summarize_tracked_lines(lines, channelData, dict(zip(keywords, values))['line_width'], dt)
+                    for rowId, (rowKey, rowValues) in sweep['rows'].items():
+                        if rowKey == key:
+                            show_sweep_result(rowId)
                 
-                dict_obj[string_descriptor+" #" +str(count+1) +" Time(s)"] = time_vals
-                dict_obj[string_descriptor+" #" +str(count+1) +" Position(nm)"] = coordinate_vals
-                if extractIntensitiesOpt.state() == ("selected",):
-                    summed_intensity_values = line.sample_from_image(num_pixels = math.ceil(float(entryLineWidthGreedy.get())))
-                    dict_obj[string_descriptor+ " #" + str(count+1) + " Summed Photon Counts"] = np.asarray(summed_intensity_values)
-            return dict_obj
+                finishedRows = sum(1 for rowKey, rowValues in sweep['rows'].values() if rowKey in sweepSummaries)
+                sweepStatusLabel.config(text=f"{finishedRows} of {len(sweep['rows'])} settings tracked")
+                if sweep['futures']:
+                    sweepMaster.after(100, poll_sweep_jobs, sweepId)
+                else:
+                    cancel_sweep_jobs()
+                return
+            
+            def preview_sweep_setting(event):
+                selection = sweepTable.selection()
+                if len(selection) == 0:
+                    return
+                lines = trackingResultCache.get(sweep['rows'][selection[0]][0])
+                if lines is None:
+                    return #not tracked yet (or dropped from the cache, running the sweep again tracks it)
+                colorName, channelData, offsetX, offsetY = sweep['region']
+                axForTraces = ktPlotSurface.axes[1] if ktPlotSurface.layoutKey else ktPlotSurface.axes
+                ktPlotSurface.clear_overlay()
+                ktPlotSurface.begin_overlay(axForTraces)
+                plot_tracked_lines(axForTraces, lines, colorName, offsetX, offsetY)
+                ktPlotSurface.end_overlay()
+                ktPlotSurface.draw()
+                return
+            
+            def use_sweep_setting(event):
+                selection = sweepTable.selection()
+                if len(selection) == 0:
+                    return
+                if comboboxMethod.get() != trackingMethod:
+                    comboboxMethod.set(trackingMethod)
+                    swap_parameters(event)
+                for (keyword, label, entry, valueType), value in zip(parameterEntries, sweep['rows'][selection[0]][1]):
+                    entry.delete(0,tk.END)
+                    entry.insert(0,str(value))
+                return
+            
+            def close_sweep(event):
+                if event.widget is sweepMaster:
+                    cancel_sweep_jobs()
+                return
+            
+            sweepMaster = tk.Toplevel()
+            sweepMaster.title(f"Tracking parameter sweep for: {typePointer}")
+            
+            frameForSweepValues = tk.ttk.Frame(sweepMaster)
+            frameForSweepValues.grid(row=0,column=0,sticky="nw",padx=4,pady=4)
+            tk.ttk.Label(frameForSweepValues,text=f"{trackingMethod} values to sweep\n(2, 4, 8 or start:stop:step)",font=('Helvetica', 10, 'bold'),justify="left").grid(row=0,column=0,columnspan=2,sticky="w")
+            sweepEntries = []
+            for row, (keyword, label, entry, valueType) in enumerate(parameterEntries):
+                tk.ttk.Label(frameForSweepValues,text=label+": ").grid(row=row+1,column=0,sticky="w",pady=pad_vertical)
+                sweepEntry = tk.ttk.Entry(frameForSweepValues,width=20)
+                sweepEntry.grid(row=row+1,column=1,sticky="w",pady=pad_vertical)
+                sweepEntry.insert(0,entry.get())
+                sweepEntries.append(sweepEntry)
+            
+            tk.ttk.Label(frameForSweepValues,text="Color: ").grid(row=len(parameterEntries)+1,column=0,sticky="w",pady=pad_vertical)
+            comboboxSweepColor = tk.ttk.Combobox(frameForSweepValues,values=['red','green','blue'],width=10)
+            enabledColors = [colorName for colorName, channelOpt in [("red", redLinesVar), ("green", greenLinesVar), ("blue", blueLinesVar)] if channelOpt.state() == ('selected',)]
+            comboboxSweepColor.set(enabledColors[0] if enabledColors else 'red')
+            comboboxSweepColor.grid(row=len(parameterEntries)+1,column=1,sticky="w",pady=pad_vertical)
+            
+            runSweepButton = tk.ttk.Button(frameForSweepValues,text="Run Sweep",width=20)
+            runSweepButton.grid(row=len(parameterEntries)+2,column=0,columnspan=2,pady=3)
+            useSettingButton = tk.ttk.Button(frameForSweepValues,text="Use Selected Setting",width=20)
+            useSettingButton.grid(row=len(parameterEntries)+3,column=0,columnspan=2,pady=3)
+            sweepStatusLabel = tk.ttk.Label(frameForSweepValues,text="")
+            sweepStatusLabel.grid(row=len(parameterEntries)+4,column=0,columnspan=2,sticky="w")
+            
+            sweepColumns = [label for keyword, label, entry, valueType in parameterEntries] + ["Tracks", "Mean Length (s)", "Coverage (%)", "Mean Intensity"]
+            sweepTable = tk.ttk.Treeview(sweepMaster,columns=sweepColumns,show="headings",height=20,selectmode="browse")
+            for column in sweepColumns:
+                sweepTable.heading(column,text=column)
+                sweepTable.column(column,width=95,anchor="e")
+            sweepTable.grid(row=0,column=1,sticky="nsew",padx=4,pady=4)
+            sweepScrollbar = tk.ttk.Scrollbar(sweepMaster,orient="vertical",command=sweepTable.yview)
+            sweepScrollbar.grid(row=0,column=2,sticky="ns",pady=4)
+            sweepTable.configure(yscrollcommand=sweepScrollbar.set)
+            
+            runSweepButton.bind("<ButtonRelease-1>",run_sweep)
+            useSettingButton.bind("<ButtonRelease-1>",use_sweep_setting)
+            sweepTable.bind("<<TreeviewSelect>>",preview_sweep_setting)
+            sweepMaster.bind("<Return>",run_sweep)
+            sweepMaster.bind("<Escape>",lambda event: sweepMaster.destroy())
+            sweepMaster.bind("<Destroy>",close_sweep)
+            return
+        
+        """
+        Accessory function for the copy_kt_data and extract_data functions that 
+        puts every tracked line of every color into one long-format table
+        (see tracked_lines_table) using the metadata for dx (in nm) and dt (in s).
+        """
+        def tracked_lines_from_gui():
+            linesByColor = [(colorName, lines) for colorName, lines in [("Red", filtered_red_lines), ("Green", filtered_green_lines), ("Blue", filtered_blue_lines)] if lines != ""]
+            intensityPixels = None
+            if extractIntensitiesOpt.state() == ("selected",):
+                intensityPixels = math.ceil(float(entryLineWidthGreedy.get()))
+            return tracked_lines_table(linesByColor, offset_x, offset_y, dx, dt, intensityPixels)
         
         """
         This function lets the user copy the tracked lines data to the clipboard for use
@@ -461,51 +2759,20 @@ class KymoTrackerGUI():
         sheets in the excel library.
         """
         def copy_kt_data(event):
-            dict_for_copy = {}
-            if filtered_red_lines != "":
-                dict_for_copy = append_data_to_dict(dict_for_copy, filtered_red_lines, "Red Line")
-            if filtered_green_lines != "":
-                dict_for_copy = append_data_to_dict(dict_for_copy, filtered_green_lines, "Green Line")
-            if filtered_blue_lines != "":
-                dict_for_copy = append_data_to_dict(dict_for_copy, filtered_blue_lines, "Blue Line")
-            
-            pd_data_frame_dict = pd.DataFrame.from_dict(dict_for_copy,orient='index')
-            pd_data_frame_dict = pd_data_frame_dict.transpose()
-            pd_data_frame_dict.to_clipboard(sep='\t',index=False)
+            pd.DataFrame(tracked_lines_from_gui()).to_clipboard(sep='\t',index=False)
             return
         
         """
-        This function lets the user extract the tracked lines data to a .xlsx file.
-        The major difference between this and the extract button is that the copy 
-        function does not separate the color of the lines into different sheets in
-        the .xlsx document.
+        This function lets the user extract the tracked lines data to a .xlsx (one sheet per color),
+        .csv or .parquet file, chosen with the export format option.
         """
         def extract_data(event):
-            writer = pd.ExcelWriter(filepath[:-3].replace(" ","_")+"_tracked_lines.xlsx")
-            
-            if filtered_red_lines != "":
-                dict_for_red_extract = {}
-                dict_for_red_extract = append_data_to_dict(dict_for_red_extract, filtered_red_lines, "Red Line")
-                
-                pd_data_frame_dict = pd.DataFrame.from_dict(dict_for_red_extract,orient='index')
-                pd_data_frame_dict = pd_data_frame_dict.transpose()
-                pd_data_frame_dict.to_excel(writer,sheet_name="Red Lines",index=False,header=True)
-            if filtered_green_lines != "":
-                dict_for_green_extract = {}
-                dict_for_green_extract = append_data_to_dict(dict_for_green_extract, filtered_green_lines, "Green Line")
-            
-                pd_data_frame_dict = pd.DataFrame.from_dict(dict_for_green_extract,orient='index')
-                pd_data_frame_dict = pd_data_frame_dict.transpose()
-                pd_data_frame_dict.to_excel(writer,sheet_name="Green Lines",index=False,header=True)
-            if filtered_blue_lines != "":
-                dict_for_blue_extract = {}
-                dict_for_blue_extract = append_data_to_dict(dict_for_blue_extract, filtered_blue_lines, "Blue Line")
-                
-                pd_data_frame_dict = pd.DataFrame.from_dict(dict_for_blue_extract,orient='index')
-                pd_data_frame_dict = pd_data_frame_dict.transpose()
-                pd_data_frame_dict.to_excel(writer,sheet_name="Blue Lines",index=False,header=True)
-                
-            writer.save()
+            filenameBase = filepath[:-3].replace(" ","_")+"_tracked_lines"
+            try:
+                export_tracked_lines(tracked_lines_from_gui(), filenameBase, trackExportFormatOpt.get())
+            except ImportError as e:
+                print(e)
+                return
             print('Extraction completed!')
             return
         
@@ -534,6 +2801,15 @@ class KymoTrackerGUI():
             kt_master.destroy()
             return
         
+        def shutdown_tracking_pool(event):
+            if event.widget is not kt_master:
+                return
+            cancel_tracking_jobs()
+            if trackingRun['executor'] is not None:
+                trackingRun['executor'].shutdown(wait=False)
+                trackingRun['executor'] = None
+            return
+        
         # define method option frames
         frameForMethodOption = tk.ttk.Frame(kt_master)
         frameForMethodOption.grid(row=0,column=1,columnspan=3)
@@ -695,10 +2971,18 @@ class KymoTrackerGUI():
         redefineComplexAreaButton.pack(side="top",padx=4,pady=3)
         runKymotrackerButton = tk.ttk.Button(ktButtonFrame,text="Run KymoTracker",width=25)
         runKymotrackerButton.pack(side="top",padx=4,pady=3)
-        extractDataAndQuitButton = tk.ttk.Button(ktButtonFrame,text="Extract Data to .xlsx",width=25)
+        extractDataAndQuitButton = tk.ttk.Button(ktButtonFrame,text="Extract Data",width=25)
         extractDataAndQuitButton.pack(side="top",padx=5,pady=3)
+        frameForExportFormat = tk.ttk.Frame(ktButtonFrame)
+        frameForExportFormat.pack(side="top",padx=5,pady=3)
+        tk.ttk.Label(frameForExportFormat,text="Export Format: ").pack(side="left")
+        trackExportFormatOpt = tk.ttk.Combobox(frameForExportFormat,values=['.xlsx','.csv','.parquet'],width=8)
+        trackExportFormatOpt.set('.xlsx')
+        trackExportFormatOpt.pack(side="left")
+        parameterSweepButton = tk.ttk.Button(ktButtonFrame,text="Parameter Sweep",width=25)
+        parameterSweepButton.pack(side="top",padx=5,pady=3)
         tk.ttk.Label(ktButtonFrame,text="Keyboard Shortcuts",justify="left",font=('Helvetica', 10,'bold')).pack(side="top",anchor="nw",pady=2)
-        tk.ttk.Label(ktButtonFrame,text="Enter - Run KymoTracker\nCtrl+C - Copy Data to Clipboard\nCtrl+D - Define Custom Area of Analysis\nCtrl+E - Extract Data to .xlsx\nEsc - Quit KymoTracker GUI",justify="left",font=('Helvetica', 8)).pack(side="top",anchor="nw",pady=4)
+        tk.ttk.Label(ktButtonFrame,text="Enter - Run KymoTracker\nCtrl+C - Copy Data to Clipboard\nCtrl+D - Define Custom Area of Analysis\nCtrl+E - Extract Data\nEsc - Quit KymoTracker GUI",justify="left",font=('Helvetica', 8)).pack(side="top",anchor="nw",pady=4)
         
         # bind buttons and functions
         rectproperties = dict(facecolor='cyan', edgecolor = 'blue',alpha=0.2, fill=True)
@@ -707,9 +2991,13 @@ class KymoTrackerGUI():
         runKymotrackerButton.bind("<ButtonRelease-1>",call_track_lines)
         redefineComplexAreaButton.bind("<ButtonRelease-1>",define_area_of_analysis)
         extractDataAndQuitButton.bind("<ButtonRelease-1>",extract_data)
+        parameterSweepButton.bind("<ButtonRelease-1>",open_parameter_sweep)
+        separatePlotOpt.configure(command=redraw_tracked_lines)
+        showRegionOpt.configure(command=redraw_tracked_lines)
         
         #bind keyboard shortcuts
         kt_master.bind("<Escape>",quitKymotracker)
+        kt_master.bind("<Destroy>",shutdown_tracking_pool)
         kt_master.bind("<Return>",call_track_lines)
         kt_master.bind("<Control-c>",copy_kt_data)
         kt_master.bind("<Control-C>",copy_kt_data)
@@ -733,277 +3021,408 @@ class CTrapGUI():
         self.__versionDate__ = "3/1/2021"
         self.__cite__ = "Watters, J.W. (2020) C-Trap .h5 Visualization GUI. Retrieved from https://harbor.lumicks.com/"
 
-        def extract_trap_position_data(h5file,timestampsForIndexing=('',''),timestampsForScanIndexing=('',''),multiScanShading=0):
-            amtToDS = float(entryDownSample.get())
-            forceString = forceChannelPulldown.get()
-            downsampleOpt = checkValueDownsampleOpt.get()
+        """
+        Returns the ForcePyramid of a file if its sidecar index has been built and is up to date, otherwise None
+        """
+        def get_force_pyramid(h5file):
+            try:
+                filepath = os.path.abspath(h5file.h5.filename)
+            except AttributeError:
+                return None
+            #keyed by the size and modification time as well, so a re-exported file does not use the index of the old one
+            pyramidKey = (filepath,os.path.getsize(filepath),os.path.getmtime(filepath))
+            with forcePyramidLock:
+                if pyramidKey in forcePyramids:
+                    return forcePyramids[pyramidKey]
+                release_force_pyramids(filepath)
+                if filepath in rebuildingForceIndexes or not ForcePyramid.is_current(filepath):
+                    return None #a sidecar that is about to be replaced is not opened again
+                try:
+                    forcePyramids[pyramidKey] = ForcePyramid(filepath)
+                except OSError as e:
+                    print(f"Could not open the force index of {filepath}: {e}")
+                    return None
+                return forcePyramids[pyramidKey]
+        
+        #closes the open force indexes of a file - must be called while holding forcePyramidLock
+        def release_force_pyramids(filepath):
+            for pyramidKey in [key for key in forcePyramids if key[0] == filepath]:
+                forcePyramids.pop(pyramidKey).close()
+            return
+        
+        """
+        Build Force Index button bound event to write the multi-rate force index of the current file
+        Runs in the background - downsampled views and exports use the index once it is written
+        """
+        def buildForceIndex(event):
+            filepath = os.path.abspath(directoryPulldown.get())
+            if not os.path.exists(filepath):
+                print("Select a file before building its force index")
+                return
             
-            #get sample rate to determine the amount to downsample
-            sample_rate = h5file['Force HF']['Force 1x'].sample_rate
+            #the old index keeps answering until the new one is written, then it is closed so the sidecar can be replaced
+            def release_old_index():
+                with forcePyramidLock:
+                    rebuildingForceIndexes.add(filepath)
+                    release_force_pyramids(filepath)
+                return
             
-            trapOpt = whichTrapPosValue.get()
+            def build_index():
+                try:
+                    ForcePyramid.build(h5FileCache.get(filepath),filepath,releaseSidecar=release_old_index)
+                except (OSError, KeyError) as e:
+                    print(f"Could not build the force index of {filepath}: {e}")
+                    return
+                finally:
+                    with forcePyramidLock:
+                        rebuildingForceIndexes.discard(filepath)
+                forceSliceCache.clear()
+                return
+            threading.Thread(target=build_index,daemon=True).start()
+            return
+        
+        #the "Both" options ('1-Both') are the magnitude of the X and Y forces on the bead, read as channel 'Force 1'
+        """
+        Returns the first and last timestamp of a kymo or scan (all frames of a multi-frame scan)
+        Kept per file and component since reconstructing the timestamps takes as long as the image
+        """
+        def component_time_range(h5file,componentString):
+            filepath = os.path.abspath(h5file.h5.filename)
+            timeRangeKey = (filepath,os.path.getmtime(filepath),componentString)
+            if timeRangeKey not in componentTimeRanges:
+                timeRange, lineTime = read_component_time_range(h5file,componentString)
+                componentTimeRanges[timeRangeKey] = timeRange
+                componentTimeRanges[timeRangeKey + ("lineTime",)] = lineTime
+            return componentTimeRanges[timeRangeKey]
+        
+        def kymo_line_time(h5file,kymoString):
+            filepath = os.path.abspath(h5file.h5.filename)
+            component_time_range(h5file,kymoString)
+            return componentTimeRanges[(filepath,os.path.getmtime(filepath),kymoString,"lineTime")]
+        
+        #first and last timestamp (ns) of every frame of a multi-frame scan - used to highlight the trace of the shown frame
+        def scan_frame_times(h5file,scanString):
+            filepath = os.path.abspath(h5file.h5.filename)
+            frameTimesKey = (filepath,os.path.getmtime(filepath),scanString,"frameTimes")
+            if frameTimesKey not in componentTimeRanges:
+                timestampArray = h5file.scans["-".join(scanString.split('-')[1:])].timestamps
+                frameTimestamps = np.asarray(timestampArray).reshape(len(timestampArray),-1).astype(np.int64)
+                componentTimeRanges[frameTimesKey] = np.stack([frameTimestamps[:,0],np.max(frameTimestamps,axis=1)],axis=1)
+            return componentTimeRanges[frameTimesKey]
+        
+        """
+        The options that pick what data is plotted (file, component, plot type and channels) come from
+        the snapshot of the draw being built (see snapshot_draw_request) while generateFigure runs, so
+        changing a pulldown while a draw is loading does not mix the old data with the new options.
+        Outside of a draw they are read from the widgets.
+        """
+        def selected(key):
+            if key in drawSelection:
+                return drawSelection[key]
+            return snapshot_draw_request()[key]
+        
+        """
+        Returns the cached data and timestamps of a channel between two timestamps
+        High frequency channels (force and trap position) are downsampled to the entry value if that option is checked
+        """
+        def get_force_slice(h5file,group,channel,timestamps,downsampleSettings=None):
+            if downsampleSettings is None:
+                downsampleSettings = selected('downsample')
+            #slices read by the draw worker are used as they are, even when too large for the slice cache
+            preparedSlice = drawSelection.get('slices',{}).get(prepared_slice_key(h5file,group,channel,timestamps,downsampleSettings))
+            if preparedSlice is not None:
+                return preparedSlice
+            forcePyramid = None
+            if group not in ("Force LF","Distance") and downsampleSettings[0] == 1:
+                forcePyramid = get_force_pyramid(h5file)
+            return read_force_slice(h5file,group,channel,timestamps,downsampleSettings,forceSliceCache,forcePyramid)
+        
+        def prepared_slice_key(h5file,group,channel,timestamps,downsampleSettings):
+            return (os.path.abspath(h5file.h5.filename),group,channel,int(timestamps[0]),int(timestamps[1]),tuple(downsampleSettings))
+        
+        #returnTimestamps=1 also returns the raw timestamps (ns) of every point, used to find the part of the trace of each scan frame
+        def extract_trap_position_data(h5file,timestampsForIndexing=('',''),returnTimestamps=0):
+            downsampleOpt, amtToDS = selected('downsample')
+            amtToDS = float(amtToDS)
+            trapOpt = selected('trapPos')
             
             descriptorString = "Trap Position " + trapOpt + " (nm)"
             if downsampleOpt == 1:
                 descriptorString += " Downsampled to " + str(amtToDS) + " Hz"
             
-            if multiScanShading == 0: #option being zero means that the user does not want the individual scan image highlighted
-                if downsampleOpt == 1:    
-                    yData = h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                    xData = (h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                    yMin = np.amin(yData)
-                    yData = (yData - yMin) * 1000
-                    
-                    maxTime = (int(timestampsForIndexing[1]) - int(timestampsForIndexing[0])) / 1e9
-                    xMin = np.min(xData)
-                    xMax = np.max(xData)
-                    xData = np.interp(xData, (xMin,xMax), (0, maxTime))
-                else:
-                    yData = h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                    yMin = np.amin(yData)
-                    yData = (yData - yMin) * 1000
-                    
-                    xData = (h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].timestamps)
-                    maxTime = (int(timestampsForIndexing[1]) - int(timestampsForIndexing[0])) / 1e9
-                    xMin = np.min(xData)
-                    xMax = np.max(xData)
-                    xData = np.interp(xData, (xMin,xMax), (0, maxTime))
-                return yData, xData, descriptorString
-            else:
-                if downsampleOpt == 1:
-                    yDataFull = h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                    xDataFull = (h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                    yMin = np.amin(yData)
-                    yData = (yData - yMin) * 1000
-                    
-                    xMin = np.min(xDataFull)
-                    xMax = np.max(xDataFull)
-                    xDataFull = np.interp(xDataFull, (xMin,xMax), (0, maxTime))                            
-                    
-                    #index into the Force file for the partial data to highlight
-                    scanY = h5file["Trap position"][trapOpt][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                    scanY = (scanY - yMin) * 1000
-                    scanX = (h5file["Trap position"][trapOpt][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                    scanX = (scanX - int(timestampsForIndexing[0])) / 1e9
-                else:
-                    yDataFull = h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                    yMin = np.amin(yData)
-                    yData = (yData - yMin) * 1000
-                    
-                    xDataFull = (h5file["Trap position"][trapOpt][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                    xMin = np.min(xDataFull)
-                    xMax = np.max(xDataFull)
-                    xDataFull = np.interp(xDataFull, (xMin,xMax), (0, maxTime))                            
-                    
-                    #index into the Force file for the partial data to highlight
-                    scanY = h5file["Trap position"][trapOpt][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                    scanY = (scanY - yMin) * 1000
-                    scanX = (h5file["Trap position"][trapOpt][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                    scanX = (scanX - int(timestampsForIndexing[0])) / 1e9
-                return yDataFull, xDataFull, scanY, scanX, descriptorString
+            sliceReader = lambda group,channel,timestamps: get_force_slice(h5file,group,channel,timestamps)
+            yData, xData, rawTimestamps = read_trap_position_trace(sliceReader,trapOpt,timestampsForIndexing)
+            if returnTimestamps == 1:
+                return yData, xData, descriptorString, rawTimestamps
+            return yData, xData, descriptorString
 
         """
-        Function that when called takes all of the force option/plotting options from the interface
-        and extracts the correct force and time/distance values from the .h5 file
-        Used a different function for FD curves to limit confusion
+        Function that when called takes all of the force option/plotting options from the interface
+        and extracts the correct force and time/distance values from the .h5 file
+        Used a different function for FD curves to limit confusion
+        """
+        def extract_force_data(h5file,timestampsForIndexing=('',''),returnTimestamps=0):
+            forceTimeOpt = selected('nonRGB') == "Force-Time"
+            
+            """
+            The forceTimeOpt logical gate is to determine Force vs Time or Force vs. Distance.
+            If the downsample option is checked then the downsampled data will be extracted instead of the HF data.
+            For the FD option --> only low frequency force data is acquired.
+            returnTimestamps=1 also returns the raw timestamps (ns) of the force points.
+            """
+            sliceReader = lambda group,channel,timestamps: get_force_slice(h5file,group,channel,timestamps)
+            yData, xData, rawTimestamps = read_force_trace(sliceReader,selected('forceString'),selected('distance'),forceTimeOpt,timestampsForIndexing)
+            if returnTimestamps == 1:
+                return yData, xData, rawTimestamps
+            return yData, xData
+        
+        
+        #code to modify RGB values - returns a uint8 image built from the cached lookup tables
+        #countScale converts summed photon counts (kymograph pyramid levels) back to counts per line
+        def modify_rgb_image(RGB_code,countScale=1.0,multipliers=None):
+            return rgbCompositor.composite(RGB_code,**composite_settings(RGB_code,countScale,multipliers))
+        
+        #keyword arguments of RGBCompositor.composite for the current multiplier/brightness/gamma/grayscale entries
+        def composite_settings(RGB_code,countScale=1.0,multipliers=None):
+            return plot_composite_settings(RGB_code,plot_settings_from_widgets(),countScale,multipliers)
+        
+        #every option of the plot as a plot settings dict (see default_plot_settings) - axis entries still at '-' are None
+        def plot_settings_from_widgets():
+            def entry_range(minEntry,maxEntry):
+                try:
+                    return [float(minEntry.get()),float(maxEntry.get())]
+                except ValueError:
+                    return None
+            
+            return {'plotting': plottingOpt.get(),
+                    'nonRGB': comboboxForNonRGB.get(),
+                    'forceChannel': forceChannelPulldown.get(),
+                    'distanceChannel': whichDistanceValue.get(),
+                    'trapPositionChannel': whichTrapPosValue.get(),
+                    'downsample': checkValueDownsampleOpt.get(),
+                    'downsampleHz': entryDownSample.get(),
+                    'red': entryRed.get(),
+                    'green': entryGreen.get(),
+                    'blue': entryBlue.get(),
+                    'brightness': entryBrightness.get(),
+                    'gamma': entryGamma.get(),
+                    'autoScalePercentile': entryAutoScale.get().strip(),
+                    'grayscale': selected('grayscale'),
+                    'autoAspect': selected('autoAspect'),
+                    'frame': int(float(scaleForStack.get())),
+                    'highlightScan': multiScanPlotOpt.get(),
+                    'title': entryPlotTitle.get(),
+                    'imageFormat': imageFormatOption.get(),
+                    'dpi': plotSurface.figure.get_dpi(),
+                    'timeRange': entry_range(entryTimeMin,entryTimeMax),
+                    'distanceRange': entry_range(entryDistMin,entryDistMax),
+                    'positionRange': entry_range(entryYRGBMin,entryYRGBMax),
+                    'scanWidthRange': entry_range(entryScanWidthMin,entryScanWidthMax),
+                    'forceRange': entry_range(entryYForceMin,entryYForceMax),
+                    'trapPositionRange': entry_range(entryTrapPosMin,entryTrapPosMax)}
+        
+        """
+        modify_rgb_image for memory-mapped photon counts: the modified image is written in
+        blocks of lines to a uint8 .npy file next to the memory-mapped one, so the whole
+        kymograph is never in memory. The auto-scale multipliers are taken from the whole
+        image so every block is scaled the same. Arrays in memory go straight to modify_rgb_image.
+        Every call writes its own file (two KymoTracker windows on the same kymograph never share
+        one) - the caller removes it with remove_display_file once the window is closed.
+        """
+        def modify_rgb_image_in_chunks(RGB_code,linesPerChunk=2000):
+            if not isinstance(RGB_code, np.memmap):
+                return modify_rgb_image(RGB_code)
+            
+            #.tmp files are left alone by the clean up of the photon count cache
+            displayPath = os.path.join(os.path.dirname(RGB_code.filename),"display_" + os.path.basename(RGB_code.filename)[:-4] + f".{uuid.uuid4().hex}.tmp.npy")
+            outputShape = RGB_code.shape if selected('grayscale') == "No" else RGB_code.shape[:-1]
+            mod_RGB = np.lib.format.open_memmap(displayPath, mode='w+', dtype=np.uint8, shape=outputShape)
+            multipliers = None
+            if entryAutoScale.get().strip() != "":
+                multipliers = rgbCompositor.percentile_multipliers(RGB_code,float(entryAutoScale.get()))
+            for firstLine in range(0,RGB_code.shape[1],linesPerChunk):
+                mod_RGB[:,firstLine:firstLine+linesPerChunk] = modify_rgb_image(RGB_code[:,firstLine:firstLine+linesPerChunk],multipliers=multipliers)
+            mod_RGB.flush()
+            return mod_RGB
+        
+        #files that could not be removed yet (still mapped on Windows) are tried again when the GUI is closed
+        pendingDisplayFiles = []
+        def remove_display_file(displayPath):
+            try:
+                os.remove(displayPath)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                pendingDisplayFiles.append(displayPath)
+            return
+        
+        """
+        Plots a time trace (Force-Time or Trap Position) as its min/max envelope at the resolution of the axis
+        and recomputes the envelope for the visible range whenever the time axis is zoomed or panned,
+        so the full high-frequency data never has to be handed to matplotlib
+        """
+        def plot_time_trace(axis,timeData,yData,**plotKwargs):
+            axisPixelWidth = max(int(axis.bbox.width),100)
+            xDecimated, yDecimated = minmax_decimate(timeData,yData,0,len(yData),axisPixelWidth)
+            traceLine, = axis.plot(xDecimated,yDecimated,**plotKwargs)
+            if len(xDecimated) == len(yData):
+                return traceLine #short enough to draw in full
+            
+            def update_time_trace(axes):
+                viewMin, viewMax = sorted(axes.get_xlim())
+                #keep half a view on either side so panning does not show an empty edge before the update
+                margin = (viewMax - viewMin) / 2
+                firstIndex = np.searchsorted(timeData,viewMin - margin) - 1
+                lastIndex = np.searchsorted(timeData,viewMax + margin) + 1
+                axisPixelWidth = max(int(axes.bbox.width),100)
+                traceLine.set_data(*minmax_decimate(timeData,yData,firstIndex,lastIndex,axisPixelWidth))
+                return
+            
+            axis.callbacks.connect('xlim_changed',update_time_trace)
+            return traceLine
+        
+        """
+        Stack viewer for multi-frame scans: the frames shown by the "Scan Image Frame" slider and
+        the Play button come from stackFrameBuffer, which composites them ahead of time on a
+        background thread, and are swapped into the plotted image with set_data. The force/trap
+        position trace of the whole stack is read once (with the raw timestamps of its points) and
+        the highlighted range of a frame is found with np.searchsorted between the first and last
+        pixel timestamp of that frame in scanPointer.timestamps, so moving to another frame only
+        blits the image and the highlight and never reads the file or redraws the axes.
+        """
+        def restart_stack_buffer(frameNumber):
+            stackFrameBuffer.restart(saved_color_data,composite_settings(saved_color_data),position=frameNumber-1)
+            return stackFrameBuffer.get(frameNumber-1)
+        
+        #highlightTrace is (raw timestamps, x data, y data) of the plotted trace
+        def start_stack_viewer(frameTimes,scanImage=None,highlightLine=None,highlightTrace=None):
+            global stackViewer
+            stackViewer = {'axes': plotSurface.axes, 'image': scanImage, 'highlight': highlightLine, 'trace': highlightTrace, 'frameTimes': frameTimes, 'frame': None}
+            plotSurface.set_blit_artists([scanImage,highlightLine])
+            plotSurface.add_image_updater(refresh_stack_viewer)
+            show_stack_frame(int(scaleForStack.get()),drawNow=False)
+            return
+        
+        def stack_viewer_active():
+            return stackViewer is not None and stackViewer['axes'] is plotSurface.axes
+        
+        #multiplier/brightness/gamma changes: composite the buffer again with the new settings
+        def refresh_stack_viewer():
+            if stackViewer['image'] is not None:
+                restart_stack_buffer(int(scaleForStack.get()))
+            stackViewer['frame'] = None
+            show_stack_frame(int(scaleForStack.get()),drawNow=False)
+            return
+        
+        def show_stack_frame(frameNumber,drawNow=True):
+            if not stack_viewer_active() or frameNumber == stackViewer['frame']:
+                return
+            frameTimes = stackViewer['frameTimes']
+            frameIndex = min(max(frameNumber,1),len(frameTimes)) - 1
+            if stackViewer['image'] is not None:
+                stackViewer['image'].set_data(stackFrameBuffer.get(frameIndex))
+            if stackViewer['highlight'] is not None:
+                rawTimestamps, xData, yData = stackViewer['trace']
+                firstIndex = np.searchsorted(rawTimestamps,frameTimes[frameIndex,0])
+                lastIndex = np.searchsorted(rawTimestamps,frameTimes[frameIndex,1],side='right')
+                axisPixelWidth = max(int(stackViewer['highlight'].axes.bbox.width),100)
+                stackViewer['highlight'].set_data(*minmax_decimate(xData,yData,firstIndex,lastIndex,axisPixelWidth))
+            stackViewer['frame'] = frameNumber
+            if drawNow:
+                plotSurface.blit()
+            return
+        
+        #Play button - steps the slider through the stack at the entered frames per second and starts over at the end
+        def toggleStackPlayback(event):
+            if stackPlayback['running']:
+                stop_stack_playback()
+                return
+            if not stack_viewer_active():
+                print("Draw a scan with more than one frame before pressing Play")
+                return
+            stackPlayback['running'] = True
+            playStackButton.config(text="Pause")
+            advance_stack_playback()
+            return
+        
+        def stop_stack_playback():
+            stackPlayback['running'] = False
+            if stackPlayback['job'] is not None:
+                master.after_cancel(stackPlayback['job'])
+                stackPlayback['job'] = None
+            playStackButton.config(text="Play")
+            return
+        
+        def advance_stack_playback():
+            stackPlayback['job'] = None
+            if not stackPlayback['running'] or not stack_viewer_active():
+                stop_stack_playback()
+                return
+            startTime = time.perf_counter()
+            nextFrame = int(float(scaleForStack.get())) % len(stackViewer['frameTimes']) + 1
+            scaleForStack.set(nextFrame)
+            print_scale_output(None)
+            try:
+                framesPerSecond = max(float(entryStackFPS.get()),0.1)
+            except ValueError:
+                framesPerSecond = defaultDict['stackPlaybackFPS']
+            #the time spent drawing this frame comes off the wait for the next one
+            elapsedMs = (time.perf_counter() - startTime) * 1000
+            stackPlayback['job'] = master.after(max(int(1000/framesPerSecond - elapsedMs),1),advance_stack_playback)
+            return
+        
+        """
+        Kymographs are drawn from their time-binned pyramid (KymoPyramid) so that about one
+        line per screen pixel is handed to imshow. The window covers the visible time range
+        plus half of it on either side; when a toolbar zoom/pan moves the view outside of that
+        window, or zooms far enough that another level fits better, the image data and extent
+        are swapped in place for the new window.
         """
-        def extract_force_data(h5file,timestampsForIndexing=('',''),timestampsForScanIndexing=('',''),multiScanShading=0):
-            amtToDS = float(entryDownSample.get())
-            forceString = forceChannelPulldown.get()
-            distanceVarString = whichDistanceValue.get()
-            downsampleOpt = checkValueDownsampleOpt.get()
-            stringForceChannel = 'Force ' + forceString
-            
-            #get sample rate to determine the amount to downsample
-            sample_rate = h5file['Force HF']['Force 1x'].sample_rate
-            
-            if multiScanShading == 0:
-                """
-                The combobox logical gate is to determine Force vs Time or Force vs. Distance.
-                The len > 3 logical gate is to see if the user wants the weighted average of the X and Y forces on the bead or a singular channel.
-                If downsampleOpt = 1 then the downsampled data will be extracted instead of the HF data.
-                For the FD option --> only low frequency force data is acquired.
-                """
-                if comboboxForNonRGB.get() == "Force-Time":
-                    #force time data collection
-                    if len(forceString) < 3:
-                        #one channel option
-                        if downsampleOpt == 1:
-                            yData = h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            xData = (h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                            maxTime = (int(timestampsForIndexing[1]) - int(timestampsForIndexing[0])) / 1e9
-                            xMin = np.min(xData)
-                            xMax = np.max(xData)
-                            xData = np.interp(xData, (xMin,xMax), (0, maxTime))
-                        else:
-                            yData = h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                            xData = (h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].timestamps)
-                            maxTime = (int(timestampsForIndexing[1]) - int(timestampsForIndexing[0])) / 1e9
-                            xMin = np.min(xData)
-                            xMax = np.max(xData)
-                            xData = np.interp(xData, (xMin,xMax), (0, maxTime))
-                    else:
-                        #average of channels for one of the beads
-                        if downsampleOpt == 1:
-                            xComponent = h5file["Force HF"]["Force " + forceString[0] +"x"][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            yComponent = h5file["Force HF"]["Force " + forceString[0] +"y"][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            yData = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                            xData = h5file["Force HF"]["Force 1x"][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps
-                            maxTime = (int(timestampsForIndexing[1]) - int(timestampsForIndexing[0])) / 1e9
-                            xMin = np.min(xData)
-                            xMax = np.max(xData)
-                            xData = np.interp(xData, (xMin,xMax), (0, maxTime))
-                        else:
-                            xComponent = h5file["Force HF"]["Force " + forceString[0] +"x"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                            yComponent = h5file["Force HF"]["Force " + forceString[0] +"y"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                            yData = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                            xData = h5file["Force HF"]["Force 1x"][timestampsForIndexing[0] : timestampsForIndexing[1]].timestamps
-                            maxTime = (int(timestampsForIndexing[1]) - int(timestampsForIndexing[0])) / 1e9
-                            xMin = np.min(xData)
-                            xMax = np.max(xData)
-                            xData = np.interp(xData, (xMin,xMax), (0, maxTime))
-                            #assert 316 == 1
-                else: #fd option
-                    if len(forceString) < 3:
-                        #get force data for a specific channel
-                        yData = h5file["Force LF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        #get distance data that corresponds to the distance
-                        xData = h5file["Distance"][distanceVarString][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                    else:
-                        #get distance data
-                        xComponent = h5file["Force LF"]["Force " + forceString[0] +"x"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        yComponent = h5file["Force LF"]["Force " + forceString[0] +"y"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        yData = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                        #get force data that corresponds to the distance
-                        xData = h5file["Distance"][distanceVarString][timestampsForIndexing[0] : timestampsForIndexing[1]].data                
-                
-                if forceString == '2x':
-                    yData = yData * -1
-                return yData, xData
-            
-            #logical gate for multiple scan images - to highlight what force regime you are in
-            if multiScanShading != 0:
-                maxTime = (int(timestampsForIndexing[1]) - int(timestampsForIndexing[0])) / 1e9
-                #same FT vs FD gate
-                if comboboxForNonRGB.get() == "Force-Time":
-                    #force time data collection
-                    if len(forceString) < 3:
-                        #one channel option
-                        if downsampleOpt == 1:
-                            #generate full data
-                            yDataFull = h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            xDataFull = (h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                            xMin = np.min(xDataFull)
-                            xMax = np.max(xDataFull)
-                            xDataFull = np.interp(xDataFull, (xMin,xMax), (0, maxTime))                            
-                            
-                            #index into the Force file for the partial data to highlight
-                            scanY = h5file["Force HF"][stringForceChannel][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            scanX = (h5file["Force HF"][stringForceChannel][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps)
-                            xMin = np.min(scanX)
-                            scanX = (scanX - int(timestampsForIndexing[0])) / 1e9
-                        else:
-                            yDataFull = h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                            xDataFull = (h5file["Force HF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].timestamps)
-                            xMin = np.min(xDataFull)
-                            xMax = np.max(xDataFull)
-                            xDataFull = np.interp(xDataFull, (xMin,xMax), (0, maxTime))                            
-                            
-                            #index into the Force file for the partial data to highlight
-                            scanY = h5file["Force HF"][stringForceChannel][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].data
-                            scanX = (h5file["Force HF"][stringForceChannel][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].timestamps)
-                            scanX = (scanX - int(timestampsForIndexing[0])) / 1e9
-                    else:
-                        #average of channels for one of the beads
-                        if downsampleOpt == 1:
-                            xComponent = h5file["Force HF"]["Force " + forceString[0] +"x"][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            yComponent = h5file["Force HF"]["Force " + forceString[0] +"y"][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            yDataFull = np.sqrt(np.square(xComponent) + np.square(yComponent))
-
-                            xDataFull = h5file["Force HF"]["Force 1x"][timestampsForIndexing[0] : timestampsForIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).timestamps
-                            xMin = np.min(xDataFull)
-                            xMax = np.max(xDataFull)
-                            xDataFull = np.interp(xDataFull, (xMin,xMax), (0, maxTime))
-
-                            #partial index
-                            xComponent = h5file["Force HF"]["Force " + forceString[0] +"x"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            yComponent = h5file["Force HF"]["Force " + forceString[0]+"y"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS)).data
-                            scanY = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                            scanX = h5file["Force HF"]["Force " + forceString[0] +"y"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].downsampled_by(int(sample_rate/amtToDS))
-                            scanX = scanX.timestamps
-                            xMin = np.min(scanX)
-                            scanX = (scanX - int(timestampsForIndexing[0])) / 1e9
-                        else:
-                            xComponent = h5file["Force HF"]["Force " + forceString[0] +"x"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                            yComponent = h5file["Force HF"]["Force " + forceString[0] +"y"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                            yDataFull = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                            xDataFull = h5file["Force HF"]["Force 1x"][timestampsForIndexing[0] : timestampsForIndexing[1]].timestamps
-                            xMin = np.min(xDataFull)
-                            xMax = np.max(xDataFull)
-                            xDataFull = np.interp(xDataFull, (xMin,xMax), (0, maxTime))
-                            
-                            #partial index
-                            xComponent = h5file["Force HF"]["Force " + forceString[0] +"x"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].data
-                            yComponent = h5file["Force HF"]["Force " + forceString[0] +"y"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].data
-                            scanY = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                            scanX = h5file["Force HF"]["Force 1x"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].timestamps
-                            xMin = np.min(scanX)
-                            scanX = (scanX - int(timestampsForIndexing[0])) / 1e9
-                            
-                else: #fd option
-                    if len(forceString) < 3:
-                        #get force data for a specific channel
-                        yDataFull = h5file["Force LF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        #get distance data that corresponds to the distance
-                        xDataFull = h5file["Distance"][distanceVarString][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        
-                        #get partial data
-                        scanY = h5file["Force LF"][stringForceChannel][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        scanX = h5file["Distance"][distanceVarString][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                    else:
-                        #get force data
-                        xComponent = h5file["Force LF"]["Force " + forceString[0] +"x"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        yComponent = h5file["Force LF"]["Force " + forceString[0] +"y"][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        yDataFull = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                        #get distance data that corresponds to the force
-                        xDataFull = h5file["Distance"][distanceVarString][timestampsForIndexing[0] : timestampsForIndexing[1]].data
-                        
-                        #get partial data
-                        xComponent = h5file["Force LF"]["Force " + forceString[0] +"x"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].data
-                        yComponent = h5file["Force LF"]["Force " + forceString[0] +"y"][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].data
-                        scanY = np.sqrt(np.square(xComponent) + np.square(yComponent))
-                        scanX = h5file["Distance"][distanceVarString][timestampsForScanIndexing[0] : timestampsForScanIndexing[1]].data
-                
-                if forceString == '2x':
-                    yDataFull = yDataFull * -1
-                    try:
-                        scanY = scanY * -1
-                    except:
-                        pass
-                    
-                return yDataFull, xDataFull, scanY, scanX
+        def get_kymo_pyramid(RGB_unaltered):
+            global kymoPyramid
+            if kymoPyramid is None or kymoPyramid.colorData is not RGB_unaltered:
+                kymoPyramid = KymoPyramid(RGB_unaltered,maxLevelMB=defaultDict['pyramidMemoryMB'])
+            return kymoPyramid
         
+        def visible_kymo_window(RGB_unaltered,dt,timeRange,axisPixelWidth):
+            viewLines = (timeRange[1] - timeRange[0]) / dt
+            firstLine = timeRange[0] / dt - viewLines / 2
+            lastLine = timeRange[1] / dt + viewLines / 2
+            window, firstLine, lastLine, factor = get_kymo_pyramid(RGB_unaltered).get_window(firstLine,lastLine,2*axisPixelWidth)
+            return window, [firstLine*dt, lastLine*dt], factor
         
-        #code to modify RGB values
-        def modify_rgb_image(RGB_code):
-            bightnessAddition = int(entryBrightness.get())
+        def link_kymo_zoom(ax,kymoImage,RGB_unaltered,dt,windowTimes,factor):
+            shownWindow = {'times': windowTimes, 'factor': factor, 'updating': False}
             
-            grayscaleOption = grayscaleOpt.get()
-            
-            if grayscaleOption == "No":
-                mod_RGB = RGB_code[:,:,:] * [float(entryRed.get()), float(entryGreen.get()), float(entryBlue.get())]
-                if bightnessAddition != 0:
-                    mod_RGB = (mod_RGB + bightnessAddition)
-            else:
-                if grayscaleOption == "R":
-                     mod_RGB = RGB_code[:,:,0] * float(entryRed.get())
-                elif grayscaleOption == "G":
-                    mod_RGB = RGB_code[:,:,1] * float(entryGreen.get())
-                else:
-                    mod_RGB = RGB_code[:,:,2] * float(entryBlue.get())
+            def swap_kymo_window(axes,forceUpdate=False):
+                if shownWindow['updating']:
+                    return
+                viewMin, viewMax = sorted(axes.get_xlim())
+                axisPixelWidth = max(int(axes.bbox.width),100)
+                idealFactor = 1
+                while (viewMax - viewMin) / dt / idealFactor > 2*axisPixelWidth:
+                    idealFactor *= 2
                 
-            mod_RGB = mod_RGB.astype(int)
-            return mod_RGB
+                totalTime = RGB_unaltered.shape[1] * dt
+                insideWindow = shownWindow['times'][0] <= max(viewMin,0) and min(viewMax,totalTime) <= shownWindow['times'][1]
+                if insideWindow and shownWindow['factor'] == idealFactor and not forceUpdate:
+                    return
+                
+                window, newTimes, newFactor = visible_kymo_window(RGB_unaltered,dt,(viewMin,viewMax),axisPixelWidth)
+                shownWindow['updating'] = True
+                kymoImage.set_data(modify_rgb_image(window,countScale=1/newFactor))
+                kymoImage.set_extent([newTimes[0], newTimes[1]] + list(kymoImage.get_extent()[2:]))
+                axes.set_xlim(viewMin,viewMax)
+                shownWindow['updating'] = False
+                shownWindow['times'] = newTimes
+                shownWindow['factor'] = newFactor
+                axes.figure.canvas.draw_idle()
+                return
+            
+            ax.callbacks.connect('xlim_changed',swap_kymo_window)
+            #multiplier/brightness changes redraw the shown window in place
+            plotSurface.add_image_updater(lambda: swap_kymo_window(ax,forceUpdate=True))
+            return
         
         """
         Code to reset the boundary entry values and to remove previous labels describing the maximums
@@ -1072,15 +3491,14 @@ class CTrapGUI():
             global labelScanWidthMax
             global labelTrapPosMax
                 
-            kymoString = typePulldown.get()
+            kymoString = selected('component')
             splitKymoString = kymoString.split('-')
             kymoNumber = "-".join(splitKymoString[1:])
             kymoPointer = h5file.kymos[kymoNumber]
             
             reset_axis_items(resetBoundsOpt)
             
-            minTimeIndex = kymoPointer.timestamps[0,0].astype(np.int64)
-            maxTimeIndex = np.max(kymoPointer.timestamps).astype(np.int64)
+            minTimeIndex, maxTimeIndex = component_time_range(h5file,kymoString)
             
             RGB_unaltered = saved_color_data
             
@@ -1088,23 +3506,22 @@ class CTrapGUI():
                 return RGB_unaltered
             
             if extract_other_data_only != "":
-                if comboboxForNonRGB.get() == "Force-Time" or comboboxForNonRGB.get() == "Force-Distance":
+                if selected('nonRGB') == "Force-Time" or selected('nonRGB') == "Force-Distance":
                     yData, xData = extract_force_data(h5file,timestampsForIndexing=(minTimeIndex, maxTimeIndex))
-                    descriptor = "Force " + forceChannelPulldown.get() + " (pN)"
-                    if checkValueDownsampleOpt.get() == 1:
-                        descriptor += " Downsampled to " + str(float(entryDownSample.get())) + " Hz"
+                    descriptor = "Force " + selected('forceString') + " (pN)"
+                    if selected('downsample')[0] == 1:
+                        descriptor += " Downsampled to " + str(float(selected('downsample')[1])) + " Hz"
                 else:
                     yData, xData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeIndex,maxTimeIndex))
                 return xData, yData, descriptor
             
-            if plottingOpt.get() == "Both":
-                fig, (ax1, ax2) = plt.subplots(2,constrained_layout=True)
+            if selected('plotting') == "Both":
+                fig, (ax1, ax2) = plotSurface.new_layout(2,constrained_layout=True)
                 
                 dx = kymoPointer.pixelsize_um[0] * 1000 #pixel size in nm
-                dt = (kymoPointer.timestamps[0,1]-kymoPointer.timestamps[0,0]) / 1000000000 #scan time in s
-                RGB_altered = modify_rgb_image(RGB_unaltered)
+                dt = kymo_line_time(h5file,kymoString) #scan time in s
                 
-                maxTime = len(kymoPointer.timestamps[0,:])
+                maxTime = RGB_unaltered.shape[1]
                 numberPixels = len(RGB_unaltered)
                 maxTrueTime = maxTime*dt
                 maxTrueDist = dx*numberPixels/1000 #convert to uM
@@ -1120,161 +3537,159 @@ class CTrapGUI():
                     labelYRGBMax = tk.ttk.Label(frameForAxis,text=str(round(maxTrueDist,2)))
                     labelYRGBMax.grid(row=3,column=3)
                     
-                if aspectOptionVar.get():
-                    default_kwargs = dict(extent=[0, maxTrueTime, 0, maxTrueDist], aspect="auto")
+                #only about one line per screen pixel of the visible time range is read and modified
+                RGB_window, windowTimes, windowFactor = visible_kymo_window(RGB_unaltered,dt,(float(entryTimeMin.get()),float(entryTimeMax.get())),max(int(ax1.bbox.width),100))
+                RGB_altered = modify_rgb_image(RGB_window,countScale=1/windowFactor)
+                
+                if selected('autoAspect'):
+                    default_kwargs = dict(extent=[windowTimes[0], windowTimes[1], 0, maxTrueDist], aspect="auto")
                 else:
-                    default_kwargs = dict(extent=[0, maxTrueTime, 0, maxTrueDist], aspect=(RGB_altered.shape[0] / RGB_altered.shape[1]) * (maxTrueTime / maxTrueDist))
+                    default_kwargs = dict(extent=[windowTimes[0], windowTimes[1], 0, maxTrueDist], aspect=(numberPixels / maxTime) * (maxTrueTime / maxTrueDist))
                 
                 
-                if grayscaleOpt.get() == "No":
-                    ax1.imshow(RGB_altered, **{**default_kwargs})
+                if selected('grayscale') == "No":
+                    kymoImage = ax1.imshow(RGB_altered, **{**default_kwargs})
                 else:
-                    ax1.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                    kymoImage = ax1.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
 
                 ax1.set_ylabel(u'Position(\u03bcm)')
                 ax1.set_xlabel('Time(s)')
-                ax1.set_xlim([float(entryTimeMin.get()),float(entryTimeMax.get())])
-                ax1.set_ylim([float(entryYRGBMin.get()),float(entryYRGBMax.get())])
+                plotSurface.set_entry_limits(ax1,(entryTimeMin,entryTimeMax),(entryYRGBMin,entryYRGBMax))
+                link_kymo_zoom(ax1,kymoImage,RGB_unaltered,dt,windowTimes,windowFactor)
                     
-                if comboboxForNonRGB.get() == "Force-Distance":
+                if selected('nonRGB') == "Force-Distance":
                     forceData, distData = extract_force_data(h5file,timestampsForIndexing=(minTimeIndex,maxTimeIndex))
                     ax2.plot(distData,forceData)
                         
                     if entryDistMax.get() == '-':
                         entryDistMin.delete(0, "end")
-                        entryDistMin.insert(0,str(round(min(distData),2)))
+                        entryDistMin.insert(0,str(round(np.min(distData),2)))
                         entryDistMax.delete(0, "end")
-                        entryDistMax.insert(0,str(round(max(distData),2)))
-                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(max(distData),2)))
+                        entryDistMax.insert(0,str(round(np.max(distData),2)))
+                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(distData),2)))
                         labelDistMax.grid(row=2,column=3)
                         
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax2.set_xlim(float(entryDistMin.get()),float(entryDistMax.get()))
-                    ax2.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryDistMin,entryDistMax),(entryYForceMin,entryYForceMax))
                     ax2.set_ylabel('Force(pN)')
                     ax2.set_xlabel(u'Distance(\u03bcm)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
                 
-                    if len(forceChannelPulldown.get()) > 2:
+                    if len(selected('forceString')) > 2:
                         bead_ID = forceString[0]
                         combinedString = 'Bead ' + bead_ID + ' vs. Distance'
                     else:
                         combinedString = 'Channel ' + forceString + ' vs. Distance'
                         ax2.set_title(combinedString)
-                elif comboboxForNonRGB.get() == "Trap Pos.-Time":
+                elif selected('nonRGB') == "Trap Pos.-Time":
                     trapPosData, timeData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeIndex,maxTimeIndex))
-                    ax2.plot(timeData,trapPosData)
+                    plot_time_trace(ax2,timeData,trapPosData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMin.delete(0, "end")
                         entryTimeMin.insert(0,"0")
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                     if entryTrapPosMax.get() == '-':
                         entryTrapPosMin.delete(0, "end")
                         entryTrapPosMin.insert(0,"0")
                         entryTrapPosMax.delete(0, "end")
-                        entryTrapPosMax.insert(0,str(round(max(trapPosData),1)))
-                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(max(trapPosData),1)))
+                        entryTrapPosMax.insert(0,str(round(np.max(trapPosData),1)))
+                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(trapPosData),1)))
                         labelTrapPosMax.grid(row=6,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryTrapPosMin.get()),float(entryTrapPosMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryTimeMin,entryTimeMax),(entryTrapPosMin,entryTrapPosMax))
                     ax2.set_ylabel('Trap Position(nm)')
                     ax2.set_xlabel('Time(s)')
                     ax2.set_title(descriptor)
                 else:
                     forceData, timeData = extract_force_data(h5file,timestampsForIndexing=(minTimeIndex,maxTimeIndex))
-                    ax2.plot(timeData,forceData)
+                    plot_time_trace(ax2,timeData,forceData)
 
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryTimeMin,entryTimeMax),(entryYForceMin,entryYForceMax))
                     ax2.set_ylabel('Force(pN)')
                     ax2.set_xlabel('Time(s)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
                         
-                    if len(forceChannelPulldown.get()) > 2:
+                    if len(selected('forceString')) > 2:
                         bead_ID = forceString[0]
-                        if checkValueDownsampleOpt.get() == 1:
-                            combinedString = 'Bead ' + bead_ID + ' Downsampled to ' + entryDownSample.get() + ' Hz'
+                        if selected('downsample')[0] == 1:
+                            combinedString = 'Bead ' + bead_ID + ' Downsampled to ' + selected('downsample')[1] + ' Hz'
                         else:
                             combinedString = 'Bead ' + bead_ID
                     else:
-                        if checkValueDownsampleOpt.get() == 1:
-                            combinedString = forceString + ' Channel Downsampled to ' + entryDownSample.get() + ' Hz'
+                        if selected('downsample')[0] == 1:
+                            combinedString = forceString + ' Channel Downsampled to ' + selected('downsample')[1] + ' Hz'
                         else:
                             combinedString = forceString + ' Channel'
                     ax2.set_title(combinedString)
 
-            elif plottingOpt.get() == "Non-RGB Only":
-                fig, ax = plt.subplots(constrained_layout=True)
+            elif selected('plotting') == "Non-RGB Only":
+                fig, ax = plotSurface.new_layout(constrained_layout=True)
                 
-                if comboboxForNonRGB.get() == "Force-Time":
+                if selected('nonRGB') == "Force-Time":
                     
-                    minTimeIndex = kymoPointer.timestamps[0,0].astype(np.int64)
-                    maxTimeIndex = np.max(kymoPointer.timestamps).astype(np.int64)
+                    minTimeIndex, maxTimeIndex = component_time_range(h5file,kymoString)
                     forceData, timeData = extract_force_data(h5file,timestampsForIndexing= (minTimeIndex,maxTimeIndex))
-                    ax.plot(timeData,forceData)
+                    plot_time_trace(ax,timeData,forceData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                         
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax,(entryTimeMin,entryTimeMax),(entryYForceMin,entryYForceMax))
                     ax.set_ylabel('Force(pN)')
                     ax.set_xlabel('Time(s)')
                     
-                elif comboboxForNonRGB.get() == "Trap Pos.-Time":
+                elif selected('nonRGB') == "Trap Pos.-Time":
                     trapPosData, timeData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeIndex,maxTimeIndex))
-                    ax.plot(timeData,trapPosData)
+                    plot_time_trace(ax,timeData,trapPosData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMin.delete(0, "end")
                         entryTimeMin.insert(0,"0")
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                     if entryTrapPosMax.get() == '-':
                         entryTrapPosMin.delete(0, "end")
                         entryTrapPosMin.insert(0,"0")
                         entryTrapPosMax.delete(0, "end")
-                        entryTrapPosMax.insert(0,str(round(max(trapPosData),1)))
-                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(max(trapPosData),1)))
+                        entryTrapPosMax.insert(0,str(round(np.max(trapPosData),1)))
+                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(trapPosData),1)))
                         labelTrapPosMax.grid(row=6,column=3)
                         
-                    ax.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax.set_ylim(float(entryTrapPosMin.get()),float(entryTrapPosMax.get()))
+                    plotSurface.set_entry_limits(ax,(entryTimeMin,entryTimeMax),(entryTrapPosMin,entryTrapPosMax))
                     ax.set_ylabel('Trap Position(nm)')
                     ax.set_xlabel('Time(s)')
                 else:
@@ -1283,29 +3698,27 @@ class CTrapGUI():
                         
                     if entryDistMax.get() == '-':
                         entryDistMin.delete(0, "end")
-                        entryDistMin.insert(0,str(round(min(distData),2)))
+                        entryDistMin.insert(0,str(round(np.min(distData),2)))
                         entryDistMax.delete(0, "end")
-                        entryDistMax.insert(0,str(round(max(distData),2)))
-                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(max(distData),2)))
+                        entryDistMax.insert(0,str(round(np.max(distData),2)))
+                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(distData),2)))
                         labelDistMax.grid(row=2,column=3)
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax.set_xlim(float(entryDistMin.get()),float(entryDistMax.get()))
-                    ax.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax,(entryDistMin,entryDistMax),(entryYForceMin,entryYForceMax))
                     ax.set_ylabel('Force(pN)')
                     ax.set_xlabel(u'Distance(\u03bcm)')
             
             else:
                 dx = kymoPointer.pixelsize_um[0] * 1000 #pixel size in nm
-                dt = (kymoPointer.timestamps[0,1]-kymoPointer.timestamps[0,0]) / 1000000000 #scan time in s
-                RGB_altered = modify_rgb_image(RGB_unaltered)
-                maxTime = len(kymoPointer.timestamps[0,:])
+                dt = kymo_line_time(h5file,kymoString) #scan time in s
+                maxTime = RGB_unaltered.shape[1]
                 numberPixels = len(RGB_unaltered)
                 maxTrueTime = maxTime*dt
                 maxTrueDist = dx*numberPixels/1000 #convert to uM
@@ -1321,27 +3734,31 @@ class CTrapGUI():
                     labelYRGBMax = tk.ttk.Label(frameForAxis,text=str(round(maxTrueDist,2)))
                     labelYRGBMax.grid(row=3,column=3)
                     
-                fig, ax = plt.subplots()
+                fig, ax = plotSurface.new_layout()
+                
+                #only about one line per screen pixel of the visible time range is read and modified
+                RGB_window, windowTimes, windowFactor = visible_kymo_window(RGB_unaltered,dt,(float(entryTimeMin.get()),float(entryTimeMax.get())),max(int(ax.bbox.width),100))
+                RGB_altered = modify_rgb_image(RGB_window,countScale=1/windowFactor)
                 
-                if aspectOptionVar.get():
-                    default_kwargs = dict(extent=[0, maxTrueTime, 0, maxTrueDist], aspect="auto")
+                if selected('autoAspect'):
+                    default_kwargs = dict(extent=[windowTimes[0], windowTimes[1], 0, maxTrueDist], aspect="auto")
                 else:
-                    default_kwargs = dict(extent=[0, maxTrueTime, 0, maxTrueDist], aspect=(RGB_altered.shape[0] / RGB_altered.shape[1]) * (maxTrueTime / maxTrueDist))
-                if grayscaleOpt.get() == "No":
-                    ax.imshow(RGB_altered, **{**default_kwargs})
+                    default_kwargs = dict(extent=[windowTimes[0], windowTimes[1], 0, maxTrueDist], aspect=(numberPixels / maxTime) * (maxTrueTime / maxTrueDist))
+                if selected('grayscale') == "No":
+                    kymoImage = ax.imshow(RGB_altered, **{**default_kwargs})
                 else:
-                    ax.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                    kymoImage = ax.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
                     
                 ax.set_ylabel(u'Position(\u03bcm)')
                 ax.set_xlabel('Time(s)')
-                ax.set_xlim([float(entryTimeMin.get()),float(entryTimeMax.get())])
-                ax.set_ylim([float(entryYRGBMin.get()),float(entryYRGBMax.get())])
+                plotSurface.set_entry_limits(ax,(entryTimeMin,entryTimeMax),(entryYRGBMin,entryYRGBMax))
+                link_kymo_zoom(ax,kymoImage,RGB_unaltered,dt,windowTimes,windowFactor)
             return fig
             
         """
         This function is an offshoot of the extractAndPlotScans if the RGB data is 3 dimensional (a stack)
-        The multiScanShading option tells the program whether or not to highlight the force data from the different scan image (vs. the stack)
-        Currently multiScanShading option has not been tested for Force-Distance curves
+        The "Highlight Scan Range?" option adds a trace over the force data recorded during the shown frame (vs. the stack),
+        which the stack viewer moves to the current frame without reading the file again
         """
         def extractAndPlotMultipleScans(h5file,scanPointer,resetBoundsOpt,extract_photons_only="",extract_other_data_only=""):
             global labelTimeMax
@@ -1351,7 +3768,7 @@ class CTrapGUI():
             global labelScanWidthMax
             global labelTrapPosMax
             
-            scanString = typePulldown.get()
+            scanString = selected('component')
             splitScanString = scanString.split('-')
             scanNumber = "-".join(splitScanString[1:])
             scanPointer = h5file.scans[scanNumber]
@@ -1363,35 +3780,32 @@ class CTrapGUI():
                 scaleForStack.config(from_=1, to=scanNumber)
                 scaleForStack.set(1)
                     
-            #scanPointerFrame = scanPointer(frame=2)
-            timestampArray = scanPointer.timestamps
-            scanTimeStamp = (timestampArray[int(scaleForStack.get())-1,:,:]) 
             stackRGB = saved_color_data[int(scaleForStack.get())-1,:,:,:]
             if extract_photons_only != "":
                 return stackRGB
             
-            minTimeScanObj = np.min(timestampArray[0,0,0]).astype(np.int64)
-            maxTimeScanObj = np.amax(timestampArray[int(scanPointer.num_frames)-1,:,:]).astype(np.int64)
-            minTimeScan = scanTimeStamp[0,0].astype(np.int64)
-            maxTimeScan = np.max(scanTimeStamp[:,:]).astype(np.int64)
+            minTimeScanObj, maxTimeScanObj = component_time_range(h5file,scanString)
+            frameTimes = drawSelection['frameTimes'] if 'frameTimes' in drawSelection else scan_frame_times(h5file,scanString)
             
             if extract_other_data_only != "":
-                if comboboxForNonRGB.get() == "Force-Time" or comboboxForNonRGB.get() == "Force-Distance":
+                if selected('nonRGB') == "Force-Time" or selected('nonRGB') == "Force-Distance":
                     yData, xData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj, maxTimeScanObj))
-                    descriptor = "Force " + forceChannelPulldown.get() + " (pN)"
-                    if checkValueDownsampleOpt.get() == 1:
-                        descriptor += " Downsampled to " + str(float(entryDownSample.get())) + " Hz"
+                    descriptor = "Force " + selected('forceString') + " (pN)"
+                    if selected('downsample')[0] == 1:
+                        descriptor += " Downsampled to " + str(float(selected('downsample')[1])) + " Hz"
                 else:
                     yData, xData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
                 return xData, yData, descriptor
             
-            if plottingOpt.get() == "Both":
-                fig, (ax1, ax2) = plt.subplots(2,constrained_layout=True)
+            if selected('plotting') == "Both":
+                fig, (ax1, ax2) = plotSurface.new_layout(2,constrained_layout=True)
                 RGB_unaltered = stackRGB
                 dx = scanPointer.pixelsize_um[0] * 1000 #pixel size in nm
                 totalScanWidth = scanPointer.scan_width_um[0]
-                dt = (scanPointer.timestamps[0,0,1]-scanPointer.timestamps[0,0,0]) / 1000000000 #scan time in s
-                RGB_altered = modify_rgb_image(RGB_unaltered)
+                #dt = (scanPointer.timestamps[0,0,1]-scanPointer.timestamps[0,0,0]) / 1000000000 #scan time in s
+                RGB_altered = restart_stack_buffer(int(scaleForStack.get()))
+                highlightLine = None
+                highlightTrace = None
                     
                 #maxTime = len(timestampArray[0,:])
                 numberPixels = len(RGB_unaltered)
@@ -1410,230 +3824,213 @@ class CTrapGUI():
                     labelYRGBMax = tk.ttk.Label(frameForAxis,text=str(round(maxTrueDist,3)))
                     labelYRGBMax.grid(row=3,column=3)
                 
-                if aspectOptionVar.get():
+                if selected('autoAspect'):
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect="auto")
                 else:
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect=(RGB_altered.shape[0] / RGB_altered.shape[1]) * (totalScanWidth / maxTrueDist))
                     
-                if grayscaleOpt.get() == "No":
-                    ax1.imshow(RGB_altered, **{**default_kwargs})
+                if selected('grayscale') == "No":
+                    scanImage = ax1.imshow(RGB_altered, **{**default_kwargs})
                 else:
-                    ax1.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                    scanImage = ax1.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
                     
                 ax1.set_ylabel(u'Position(\u03bcm)')
                 ax1.set_xlabel(u'Width(\u03bcm)')
-                ax1.set_xlim([float(entryScanWidthMin.get()),float(entryScanWidthMax.get())])
-                ax1.set_ylim([float(entryYRGBMin.get()),float(entryYRGBMax.get())])
+                plotSurface.set_entry_limits(ax1,(entryScanWidthMin,entryScanWidthMax),(entryYRGBMin,entryYRGBMax))
                     
-                if comboboxForNonRGB.get() == "Force-Time":
-                    if multiScanPlotOpt.get() == 1:
-                        forceData, timeData, scanForceData, scanTimeData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj), timestampsForScanIndexing=(minTimeScan, maxTimeScan),multiScanShading=1)
-                        
-                        ax2.plot(timeData,forceData)
-                        ax2.plot(scanTimeData, scanForceData)
-                    else:
-                        forceData, timeData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                        ax2.plot(timeData,forceData)
+                if selected('nonRGB') == "Force-Time":
+                    forceData, timeData, forceTimestamps = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),returnTimestamps=1)
+                    plot_time_trace(ax2,timeData,forceData)
+                    if selected('highlightScan') == 1:
+                        highlightLine, = ax2.plot([],[]) #moved to the current frame by the stack viewer
+                        highlightTrace = (forceTimestamps,timeData,forceData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMin.delete(0,"end")
                         entryTimeMin.insert(0,'0')
                         entryTimeMax.delete(0,"end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                             
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0,"end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryTimeMin,entryTimeMax),(entryYForceMin,entryYForceMax))
                     ax2.set_ylabel('Force(pN)')
                     ax2.set_xlabel('Time(s)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
                         
-                    if len(forceChannelPulldown.get()) > 2:
+                    if len(selected('forceString')) > 2:
                         bead_ID = forceString[0]
-                        if checkValueDownsampleOpt.get() == 1:
-                            combinedString = 'Bead ' + bead_ID + ' Downsampled to ' + entryDownSample.get() + ' Hz'
+                        if selected('downsample')[0] == 1:
+                            combinedString = 'Bead ' + bead_ID + ' Downsampled to ' + selected('downsample')[1] + ' Hz'
                         else:
                             combinedString = 'Bead ' + bead_ID
                     else:
-                        if checkValueDownsampleOpt.get() == 1:
-                            combinedString = forceString + ' Channel Downsampled to ' + entryDownSample.get() + ' Hz'
+                        if selected('downsample')[0] == 1:
+                            combinedString = forceString + ' Channel Downsampled to ' + selected('downsample')[1] + ' Hz'
                         else:
                             combinedString = forceString + ' Channel'
                     ax2.set_title(combinedString)
                     
-                elif comboboxForNonRGB.get() == "Trap Pos.-Time":
-                    if multiScanPlotOpt.get() == 1:
-                        trapPosData, timeData, partialTrapPos, partialTimeData,descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),timestampsForScanIndexing=(minTimeScan, maxTimeScan),multiScanShading=1)
-                        ax2.plot(timeData,trapPosData)
-                        ax2.plot(partialTimeData, partialTrapPos)
-                    else:
-                        trapPosData, timeData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                        ax2.plot(timeData,trapPosData)
+                elif selected('nonRGB') == "Trap Pos.-Time":
+                    trapPosData, timeData, descriptor, trapTimestamps = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),returnTimestamps=1)
+                    plot_time_trace(ax2,timeData,trapPosData)
+                    if selected('highlightScan') == 1:
+                        highlightLine, = ax2.plot([],[])
+                        highlightTrace = (trapTimestamps,timeData,trapPosData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMin.delete(0, "end")
                         entryTimeMin.insert(0,"0")
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                     if entryTrapPosMax.get() == '-':
                         entryTrapPosMin.delete(0, "end")
                         entryTrapPosMin.insert(0,"0")
                         entryTrapPosMax.delete(0, "end")
-                        entryTrapPosMax.insert(0,str(round(max(trapPosData),1)))
-                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(max(trapPosData),1)))
+                        entryTrapPosMax.insert(0,str(round(np.max(trapPosData),1)))
+                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(trapPosData),1)))
                         labelTrapPosMax.grid(row=6,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryTrapPosMin.get()),float(entryTrapPosMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryTimeMin,entryTimeMax),(entryTrapPosMin,entryTrapPosMax))
                     ax2.set_ylabel('Trap Position(nm)')
                     ax2.set_xlabel('Time(s)') 
                     ax2.set_title(descriptor)
                 else:
-                    if multiScanPlotOpt.get() == 1:
-                        forceData, distData, scanForceData, scanDistData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),timestampsForScanIndexing=(minTimeScan, maxTimeScan),multiScanShading=1)
-                        ax2.plot(distData,forceData)
-                        ax2.plot(scanDistData, scanForceData)
-                    else:
-                        forceData, distData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                        ax2.plot(distData,forceData)
+                    forceData, distData, forceTimestamps = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),returnTimestamps=1)
+                    ax2.plot(distData,forceData)
+                    if selected('highlightScan') == 1:
+                        highlightLine, = ax2.plot([],[])
+                        highlightTrace = (forceTimestamps,distData,forceData)
                         
                     if entryDistMax.get() == '-':
                         entryDistMin.delete(0, "end")
-                        entryDistMin.insert(0,str(round(min(distData),2)))
+                        entryDistMin.insert(0,str(round(np.min(distData),2)))
                         entryDistMax.delete(0, "end")
-                        entryDistMax.insert(0,str(round(max(distData),2)))
-                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(max(distData),2)))
+                        entryDistMax.insert(0,str(round(np.max(distData),2)))
+                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(distData),2)))
                         labelDistMax.grid(row=2,column=3)
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax2.set_xlim(float(entryDistMin.get()),float(entryDistMax.get()))
-                    ax2.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryDistMin,entryDistMax),(entryYForceMin,entryYForceMax))
                     ax2.set_ylabel('Force(pN)')
                     ax2.set_xlabel(u'Distance(\u03bcm)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
                         
-                    if len(forceChannelPulldown.get()) > 2:
+                    if len(selected('forceString')) > 2:
                         bead_ID = forceString[0]
                         combinedString = 'Bead ' + bead_ID + ' vs. Distance'
                     else:
                         combinedString = 'Channel ' + forceString + ' vs. Distance'
                     ax2.set_title(combinedString)
+                start_stack_viewer(frameTimes,scanImage,highlightLine,highlightTrace)
 
                         
-            elif plottingOpt.get() == "Non-RGB Only":
-                fig, ax = plt.subplots(constrained_layout=True)
-                if comboboxForNonRGB.get() == "Force-Time":
-                    if multiScanPlotOpt.get() == 1:
-                        forceData, timeData, scanForceData, scanTimeData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj), timestampsForScanIndexing=(minTimeScan, maxTimeScan),multiScanShading=1)
-                    
-                        ax.plot(timeData,forceData)
-                        ax.plot(scanTimeData, scanForceData)
-                    else:
-                        forceData, timeData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                        ax.plot(timeData,forceData)
+            elif selected('plotting') == "Non-RGB Only":
+                fig, ax = plotSurface.new_layout(constrained_layout=True)
+                highlightLine = None
+                highlightTrace = None
+                if selected('nonRGB') == "Force-Time":
+                    forceData, timeData, forceTimestamps = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),returnTimestamps=1)
+                    plot_time_trace(ax,timeData,forceData)
+                    if selected('highlightScan') == 1:
+                        highlightLine, = ax.plot([],[])
+                        highlightTrace = (forceTimestamps,timeData,forceData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                         
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=4)
                         
-                    ax.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax,(entryTimeMin,entryTimeMax),(entryYForceMin,entryYForceMax))
                     ax.set_ylabel('Force(pN)')
                     ax.set_xlabel('Time(s)')
                 
-                elif comboboxForNonRGB.get() == "Trap Pos.-Time":
-                    if multiScanPlotOpt.get() == 1:
-                        trapPosData, timeData, partialTrapPos, partialTimeData,descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),timestampsForScanIndexing=(minTimeScan, maxTimeScan),multiScanShading=1)
-                        ax2.plot(timeData,trapPosData)
-                        ax2.plot(partialTimeData, partialTrapPos)
-                    else:
-                        trapPosData, timeData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                        ax2.plot(timeData,trapPosData)
+                elif selected('nonRGB') == "Trap Pos.-Time":
+                    trapPosData, timeData, descriptor, trapTimestamps = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),returnTimestamps=1)
+                    plot_time_trace(ax,timeData,trapPosData)
+                    if selected('highlightScan') == 1:
+                        highlightLine, = ax.plot([],[])
+                        highlightTrace = (trapTimestamps,timeData,trapPosData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMin.delete(0, "end")
                         entryTimeMin.insert(0,"0")
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                     if entryTrapPosMax.get() == '-':
                         entryTrapPosMin.delete(0, "end")
                         entryTrapPosMin.insert(0,"0")
                         entryTrapPosMax.delete(0, "end")
-                        entryTrapPosMax.insert(0,str(round(max(trapPosData),1)))
-                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(max(trapPosData),1)))
+                        entryTrapPosMax.insert(0,str(round(np.max(trapPosData),1)))
+                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(trapPosData),1)))
                         labelTrapPosMax.grid(row=6,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryTrapPosMin.get()),float(entryTrapPosMax.get()))
-                    ax2.set_ylabel('Trap Position(nm)')
-                    ax2.set_xlabel('Time(s)')
+                    plotSurface.set_entry_limits(ax,(entryTimeMin,entryTimeMax),(entryTrapPosMin,entryTrapPosMax))
+                    ax.set_ylabel('Trap Position(nm)')
+                    ax.set_xlabel('Time(s)')
                 else:
-                    if multiScanPlotOpt.get() == 1:
-                        forceData, distData, scanForceData, scanDistData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),timestampsForScanIndexing=(minTimeScan, maxTimeScan),multiScanShading=1)
-                        ax.plot(distData,forceData)
-                        ax.plot(scanDistData, scanForceData)
-                    else:
-                        forceData, distData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                        ax.plot(distData,forceData)
+                    forceData, distData, forceTimestamps = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj),returnTimestamps=1)
+                    ax.plot(distData,forceData)
+                    if selected('highlightScan') == 1:
+                        highlightLine, = ax.plot([],[])
+                        highlightTrace = (forceTimestamps,distData,forceData)
                         
                     if entryDistMax.get() == '-':
                         entryDistMin.delete(0, "end")
-                        entryDistMin.insert(0,str(round(min(distData),2)))
+                        entryDistMin.insert(0,str(round(np.min(distData),2)))
                         entryDistMax.delete(0, "end")
-                        entryDistMax.insert(0,str(round(max(distData),2)))
-                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(max(distData),2)))
+                        entryDistMax.insert(0,str(round(np.max(distData),2)))
+                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(distData),2)))
                         labelDistMax.grid(row=2,column=3)
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax.set_xlim(float(entryDistMin.get()),float(entryDistMax.get()))
-                    ax.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax,(entryDistMin,entryDistMax),(entryYForceMin,entryYForceMax))
                     ax.set_ylabel('Force(pN)')
                     ax.set_xlabel(u'Distance(\u03bcm)')
+                start_stack_viewer(frameTimes,None,highlightLine,highlightTrace)
 
             else:
                 RGB_unaltered = stackRGB
                 dx = scanPointer.pixelsize_um[0] * 1000 #pixel size in nm
-                dt = (scanPointer.timestamps[0,1]-scanPointer.timestamps[0,0]) / 1000000000 #scan time in s
+                #dt = (scanPointer.timestamps[0,1]-scanPointer.timestamps[0,0]) / 1000000000 #scan time in s
                 totalScanWidth = scanPointer.scan_width_um[0]
 
-                RGB_altered = modify_rgb_image(RGB_unaltered)
+                RGB_altered = restart_stack_buffer(int(scaleForStack.get()))
                 #maxTime = len(scanPointer.timestamps[0,:])
                 numberPixels = len(RGB_unaltered)
                 #maxTrueTime = maxTime*dt
@@ -1650,28 +4047,28 @@ class CTrapGUI():
                     labelYRGBMax = tk.ttk.Label(frameForAxis,text=str(round(maxTrueDist,3)))
                     labelYRGBMax.grid(row=3,column=3)
                     
-                fig, ax = plt.subplots()
+                fig, ax = plotSurface.new_layout()
                 
-                if aspectOptionVar.get():
+                if selected('autoAspect'):
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect="auto")
                 else:
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect=(RGB_altered.shape[0] / RGB_altered.shape[1]) * (totalScanWidth / maxTrueDist))
                 
-                if grayscaleOpt.get() == "No":
-                    ax.imshow(RGB_altered, **{**default_kwargs})
+                if selected('grayscale') == "No":
+                    scanImage = ax.imshow(RGB_altered, **{**default_kwargs})
                 else:
-                    ax.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                    scanImage = ax.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
                     
                 ax.set_ylabel(u'Position(\u03bcm)')
                 ax.set_xlabel(u'Width(\u03bcm)')
-                ax.set_xlim([float(entryScanWidthMin.get()),float(entryScanWidthMax.get())])
-                ax.set_ylim([float(entryYRGBMin.get()),float(entryYRGBMax.get())])      
+                plotSurface.set_entry_limits(ax,(entryScanWidthMin,entryScanWidthMax),(entryYRGBMin,entryYRGBMax))
+                start_stack_viewer(frameTimes,scanImage)
             return fig
             
             
         #Function to extract data type that is specific to the Scan data type
         def extractAndPlotScan(h5file,resetBoundsOpt,extract_photons_only="",extract_other_data_only=""):              
-            scanString = typePulldown.get()
+            scanString = selected('component')
             splitScanString = scanString.split('-')
             scanNumber = "-".join(splitScanString[1:])
             scanPointer = h5file.scans[scanNumber]
@@ -1697,25 +4094,24 @@ class CTrapGUI():
             global labelScanWidthMax
             global labelTrapPosMax
             
-            minTimeScanObj = np.min(scanPointer.timestamps[0,:]).astype(np.int64)
-            maxTimeScanObj = np.max(scanPointer.timestamps[0,:]).astype(np.int64)
+            minTimeScanObj, maxTimeScanObj = component_time_range(h5file,scanString)
             
             RGB_unaltered = saved_color_data
             if extract_photons_only != "":
                 return RGB_unaltered
             
             if extract_other_data_only != "":
-                if comboboxForNonRGB.get() == "Force-Time" or comboboxForNonRGB.get() == "Force-Distance":
+                if selected('nonRGB') == "Force-Time" or selected('nonRGB') == "Force-Distance":
                     yData, xData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj, maxTimeScanObj))
-                    descriptor = "Force " + forceChannelPulldown.get() + " (pN)"
-                    if checkValueDownsampleOpt.get() == 1:
-                        descriptor += " Downsampled to " + str(float(entryDownSample.get())) + " Hz"
+                    descriptor = "Force " + selected('forceString') + " (pN)"
+                    if selected('downsample')[0] == 1:
+                        descriptor += " Downsampled to " + str(float(selected('downsample')[1])) + " Hz"
                 else:
                     yData, xData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
                 return xData, yData, descriptor
             
-            if plottingOpt.get() == "Both":
-                fig, (ax1, ax2) = plt.subplots(2,constrained_layout=True)
+            if selected('plotting') == "Both":
+                fig, (ax1, ax2) = plotSurface.new_layout(2,constrained_layout=True)
                 
                 dx = scanPointer.pixelsize_um[0] * 1000 #pixel size in nm
                 #dt = (scanPointer.timestamps[0,1]-scanPointer.timestamps[0,0]) / 1000000000 #scan time in s
@@ -1737,80 +4133,78 @@ class CTrapGUI():
                     labelYRGBMax = tk.ttk.Label(frameForAxis,text=str(round(maxTrueDist,3)))
                     labelYRGBMax.grid(row=3,column=3)
                 
-                if aspectOptionVar.get():
+                if selected('autoAspect'):
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect="auto")
                 else:
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect=(RGB_altered.shape[0] / RGB_altered.shape[1]) * (totalScanWidth / maxTrueDist))
                 
-                if grayscaleOpt.get() == "No":
-                    ax1.imshow(RGB_altered, **{**default_kwargs})
+                if selected('grayscale') == "No":
+                    scanImage = ax1.imshow(RGB_altered, **{**default_kwargs})
                 else:
-                    ax1.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                    scanImage = ax1.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                plotSurface.add_image_updater(lambda: scanImage.set_data(modify_rgb_image(saved_color_data)))
                     
                 ax1.set_ylabel(u'Position(\u03bcm)')
                 ax1.set_xlabel(u'Width(\u03bcm)')
-                ax1.set_xlim([float(entryScanWidthMin.get()),float(entryScanWidthMax.get())])
-                ax1.set_ylim([float(entryYRGBMin.get()),float(entryYRGBMax.get())])
+                plotSurface.set_entry_limits(ax1,(entryScanWidthMin,entryScanWidthMax),(entryYRGBMin,entryYRGBMax))
                     
-                if comboboxForNonRGB.get() == "Force-Time":
+                if selected('nonRGB') == "Force-Time":
                     forceData, timeData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj, maxTimeScanObj))
-                    ax2.plot(timeData,forceData)
+                    plot_time_trace(ax2,timeData,forceData)
                     
                     if entryTimeMax.get() == '-':
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryTimeMin,entryTimeMax),(entryYForceMin,entryYForceMax))
                     ax2.set_ylabel('Force(pN)')
                     ax2.set_xlabel('Time(s)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
                     
-                    if len(forceChannelPulldown.get()) > 2:
+                    if len(selected('forceString')) > 2:
                         bead_ID = forceString[0]
-                        if checkValueDownsampleOpt.get() == 1:
-                            combinedString = 'Bead ' + bead_ID + ' Downsampled to ' + entryDownSample.get() + ' Hz'
+                        if selected('downsample')[0] == 1:
+                            combinedString = 'Bead ' + bead_ID + ' Downsampled to ' + selected('downsample')[1] + ' Hz'
                         else:
                             combinedString = 'Bead ' + bead_ID
                     else:
-                        if checkValueDownsampleOpt.get() == 1:
-                            combinedString = forceString + ' Channel Downsampled to ' + entryDownSample.get() + ' Hz'
+                        if selected('downsample')[0] == 1:
+                            combinedString = forceString + ' Channel Downsampled to ' + selected('downsample')[1] + ' Hz'
                         else:
                             combinedString = forceString + ' Channel'
                     
                     ax2.set_title(combinedString)
                     
-                elif comboboxForNonRGB.get() == "Trap Pos.-Time":
+                elif selected('nonRGB') == "Trap Pos.-Time":
                     trapPosData, timeData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                    ax2.plot(timeData,trapPosData)
+                    plot_time_trace(ax2,timeData,trapPosData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMin.delete(0, "end")
                         entryTimeMin.insert(0,"0")
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                     if entryTrapPosMax.get() == '-':
                         entryTrapPosMin.delete(0, "end")
                         entryTrapPosMin.insert(0,"0")
                         entryTrapPosMax.delete(0, "end")
-                        entryTrapPosMax.insert(0,str(round(max(trapPosData),1)))
-                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(max(trapPosData),1)))
+                        entryTrapPosMax.insert(0,str(round(np.max(trapPosData),1)))
+                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(trapPosData),1)))
                         labelTrapPosMax.grid(row=6,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryTrapPosMin.get()),float(entryTrapPosMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryTimeMin,entryTimeMax),(entryTrapPosMin,entryTrapPosMax))
                     ax2.set_ylabel('Trap Position(nm)')
                     ax2.set_xlabel('Time(s)')
                     ax2.set_title(descriptor)
@@ -1820,81 +4214,78 @@ class CTrapGUI():
                             
                     if entryDistMax.get() == '-':
                         entryDistMin.delete(0, "end")
-                        entryDistMin.insert(0,str(round(min(distData),2)))
+                        entryDistMin.insert(0,str(round(np.min(distData),2)))
                         entryDistMax.delete(0, "end")
-                        entryDistMax.insert(0,str(round(max(distData),2)))
-                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(max(distData),2)))
+                        entryDistMax.insert(0,str(round(np.max(distData),2)))
+                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(distData),2)))
                         labelDistMax.grid(row=2,column=3)
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax2.set_xlim(float(entryDistMin.get()),float(entryDistMax.get()))
-                    ax2.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryDistMin,entryDistMax),(entryYForceMin,entryYForceMax))
                     ax2.set_ylabel('Force(pN)')
                     ax2.set_xlabel(u'Distance(\u03bcm)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
                     
-                    if len(forceChannelPulldown.get()) > 2:
+                    if len(selected('forceString')) > 2:
                         bead_ID = forceString[0]
                         combinedString = 'Bead ' + bead_ID + ' vs. Distance'
                     else:
                         combinedString = 'Channel ' + forceString + ' vs. Distance'
                     ax2.set_title(combinedString)
 
-            elif plottingOpt.get() == "Non-RGB Only":
-                fig, ax = plt.subplots(constrained_layout=True)
-                if comboboxForNonRGB.get() == "Force-Time":
+            elif selected('plotting') == "Non-RGB Only":
+                fig, ax = plotSurface.new_layout(constrained_layout=True)
+                if selected('nonRGB') == "Force-Time":
                     forceData, timeData = extract_force_data(h5file,timestampsForIndexing=(minTimeScanObj, maxTimeScanObj))
-                    ax.plot(timeData,forceData)
+                    plot_time_trace(ax,timeData,forceData)
                     
                     if entryTimeMax.get() == '-':
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                         
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0, "end")
-                        entryYForceMin.insert(0,str(round(min(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=4)
                         
-                    ax.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax,(entryTimeMin,entryTimeMax),(entryYForceMin,entryYForceMax))
                     ax.set_ylabel('Force(pN)')
                     ax.set_xlabel('Time(s)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
                     
-                elif comboboxForNonRGB.get() == "Trap Pos.-Time":
+                elif selected('nonRGB') == "Trap Pos.-Time":
                     trapPosData, timeData, descriptor = extract_trap_position_data(h5file,timestampsForIndexing=(minTimeScanObj,maxTimeScanObj))
-                    ax2.plot(timeData,trapPosData)
+                    plot_time_trace(ax2,timeData,trapPosData)
                         
                     if entryTimeMax.get() == '-':
                         entryTimeMin.delete(0, "end")
                         entryTimeMin.insert(0,"0")
                         entryTimeMax.delete(0, "end")
-                        entryTimeMax.insert(0,str(round(max(timeData),2)))
-                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(max(timeData),2)))
+                        entryTimeMax.insert(0,str(round(np.max(timeData),2)))
+                        labelTimeMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(timeData),2)))
                         labelTimeMax.grid(row=1,column=3)
                     if entryTrapPosMax.get() == '-':
                         entryTrapPosMin.delete(0, "end")
                         entryTrapPosMin.insert(0,"0")
                         entryTrapPosMax.delete(0, "end")
-                        entryTrapPosMax.insert(0,str(round(max(trapPosData),1)))
-                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(max(trapPosData),1)))
+                        entryTrapPosMax.insert(0,str(round(np.max(trapPosData),1)))
+                        labelTrapPosMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(trapPosData),1)))
                         labelTrapPosMax.grid(row=6,column=3)
                         
-                    ax2.set_xlim(float(entryTimeMin.get()),float(entryTimeMax.get()))
-                    ax2.set_ylim(float(entryTrapPosMin.get()),float(entryTrapPosMax.get()))
+                    plotSurface.set_entry_limits(ax2,(entryTimeMin,entryTimeMax),(entryTrapPosMin,entryTrapPosMax))
                     ax2.set_ylabel('Trap Position(nm)')
                     ax2.set_xlabel('Time(s)')
                     
@@ -1904,25 +4295,24 @@ class CTrapGUI():
                     
                     if entryDistMax.get() == '-':
                         entryDistMin.delete(0, "end")
-                        entryDistMin.insert(0,str(round(min(distData),2)))
+                        entryDistMin.insert(0,str(round(np.min(distData),2)))
                         entryDistMax.delete(0, "end")
-                        entryDistMax.insert(0,str(round(max(distData),2)))
-                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(max(distData),2)))
+                        entryDistMax.insert(0,str(round(np.max(distData),2)))
+                        labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(distData),2)))
                         labelDistMax.grid(row=2,column=3)
                     if entryYForceMax.get() == '-':
                         entryYForceMin.delete(0,"end")
-                        entryYForceMin.insert(0,str(round(max(forceData),2)))
+                        entryYForceMin.insert(0,str(round(np.max(forceData),2)))
                         entryYForceMax.delete(0, "end")
-                        entryYForceMax.insert(0,str(round(max(forceData),2)))
-                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                        entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                        labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                         labelYForceMax.grid(row=4,column=3)
                         
-                    ax.set_xlim(float(entryDistMin.get()),float(entryDistMax.get()))
-                    ax.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                    plotSurface.set_entry_limits(ax,(entryDistMin,entryDistMax),(entryYForceMin,entryYForceMax))
                     ax.set_ylabel('Force(pN)')
                     ax.set_xlabel(u'Distance(\u03bcm)')
                         
-                    forceString = forceChannelPulldown.get()
+                    forceString = selected('forceString')
             else:                
                 dx = scanPointer.pixelsize_um[0] * 1000 #pixel size in nm
                 #dt = (scanPointer.timestamps[0,1]-scanPointer.timestamps[0,0]) / 1000000000 #scan time in s
@@ -1947,22 +4337,22 @@ class CTrapGUI():
                     labelYRGBMax.grid(row=3,column=3)
                     
                     
-                fig, ax = plt.subplots()
+                fig, ax = plotSurface.new_layout()
                 
-                if aspectOptionVar.get():
+                if selected('autoAspect'):
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect="auto")
                 else:
                     default_kwargs = dict(extent=[0, totalScanWidth, 0, maxTrueDist], aspect=(RGB_altered.shape[0] / RGB_altered.shape[1]) * (totalScanWidth / maxTrueDist))
                 
-                if grayscaleOpt.get() == "No":
-                    ax.imshow(RGB_altered, **{**default_kwargs})
+                if selected('grayscale') == "No":
+                    scanImage = ax.imshow(RGB_altered, **{**default_kwargs})
                 else:
-                    ax.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                    scanImage = ax.imshow(RGB_altered, **{**default_kwargs},cmap="gray",norm=matplotlib.colors.NoNorm())
+                plotSurface.add_image_updater(lambda: scanImage.set_data(modify_rgb_image(saved_color_data)))
 
                 ax.set_ylabel(u'Position(\u03bcm)')
                 ax.set_xlabel(u'Width(\u03bcm)')
-                ax.set_xlim([float(entryScanWidthMin.get()),float(entryScanWidthMax.get())])
-                ax.set_ylim([float(entryYRGBMin.get()),float(entryYRGBMax.get())])
+                plotSurface.set_entry_limits(ax,(entryScanWidthMin,entryScanWidthMax),(entryYRGBMin,entryYRGBMax))
             return fig
 
             
@@ -1974,19 +4364,19 @@ class CTrapGUI():
             global labelScanWidthMax
             global labelTrapPosMax
             
-            fdString = typePulldown.get()
+            fdString = selected('component')
             splitFDString = fdString.split('-')
             fdNumber = splitFDString[-1]
             fdPointer = h5file.fdcurves[fdNumber]
                 
             reset_axis_items(resetBoundsOpt)
                 
-            if plottingOpt.get() == "Non-RGB Only" or plottingOpt.get() == "Both":
-                if plottingOpt.get() == "Both" or plottingOpt.get() == "RGB Only":
+            if selected('plotting') == "Non-RGB Only" or selected('plotting') == "Both":
+                if selected('plotting') == "Both" or selected('plotting') == "RGB Only":
                     print('FD Curves are only currently supported for Force-Distance plotting only\nIf RGB Data is in the file select the kymo/scan object associated with it to get Force and/or RGB Images')                         
                     
-                forceString = forceChannelPulldown.get()
-                distanceVarString = whichDistanceValue.get()
+                forceString = selected('forceString')
+                distanceVarString = selected('distance')
                 if len(forceString) < 3:
                     modifiedFDPointer = fdPointer.with_channels(force=forceString,distance=distanceVarString[-1])
                     forceData = modifiedFDPointer.f.data
@@ -2001,32 +4391,31 @@ class CTrapGUI():
                 if extract_other_data_only != "":
                     return distData,forceData, forceString
                 
-                fig, ax = plt.subplots(constrained_layout=True)
+                fig, ax = plotSurface.new_layout(constrained_layout=True)
                 ax.plot(distData,forceData)
                     
                 if entryDistMax.get() == '-':
                     entryDistMin.delete(0, "end")
-                    entryDistMin.insert(0,str(round(min(distData),2)))
+                    entryDistMin.insert(0,str(round(np.min(distData),2)))
                     entryDistMax.delete(0, "end")
-                    entryDistMax.insert(0,str(round(max(distData),2)))
-                    labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(max(distData),2)))
+                    entryDistMax.insert(0,str(round(np.max(distData),2)))
+                    labelDistMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(distData),2)))
                     labelDistMax.grid(row=2,column=3)
                         
                 if entryYForceMax.get() == '-':
                     entryYForceMin.delete(0, "end")
-                    entryYForceMin.insert(0,str(round(min(forceData),2)))
+                    entryYForceMin.insert(0,str(round(np.min(forceData),2)))
                     entryYForceMax.delete(0, "end")
-                    entryYForceMax.insert(0,str(round(max(forceData),2)))
-                    labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(max(forceData),2)))
+                    entryYForceMax.insert(0,str(round(np.max(forceData),2)))
+                    labelYForceMax = tk.ttk.Label(frameForAxis,text=str(round(np.max(forceData),2)))
                     labelYForceMax.grid(row=4,column=3)
                         
-                ax.set_xlim(float(entryDistMin.get()),float(entryDistMax.get()))
-                ax.set_ylim(float(entryYForceMin.get()),float(entryYForceMax.get()))
+                plotSurface.set_entry_limits(ax,(entryDistMin,entryDistMax),(entryYForceMin,entryYForceMax))
                 ax.set_ylabel('Force(pN)')
                 ax.set_xlabel(u'Distance(\u03bcm)')
             else:
                 print('FD Curves are only supported for Force-Distance plotting only\nIf RGB Data is in the file select the kymo/scan object associated with it to get Force-Time or RGB Images')
-                fig, ax = plt.subplots(constrained_layout=True)
+                fig, ax = plotSurface.new_layout(constrained_layout=True)
             return fig
         
         """
@@ -2037,7 +4426,15 @@ class CTrapGUI():
             extractAndPlotKymo, extractAndPlotScan (and its subset extractAndPlotStack),
             and extractAndPlotFD.
         """
-        def generateFigure(extract_photon_count_options="",extract_other_data=""):
+        def generateFigure(extract_photon_count_options="",extract_other_data="",preparedDraw=None):
+            #preparedDraw is the snapshot and data of a Draw Plot from prepare_plot_data - other callers plot the current widget options
+            drawSelection.update(preparedDraw if preparedDraw is not None else snapshot_draw_request())
+            try:
+                return build_figure(extract_photon_count_options,extract_other_data)
+            finally:
+                drawSelection.clear()
+        
+        def build_figure(extract_photon_count_options,extract_other_data):
             #remove previous metadata and add metadata description from the .h5 file
             def writeMetadata(file):
                 global metadataLabel
@@ -2048,15 +4445,19 @@ class CTrapGUI():
                 except:
                     pass
                 
-                metadataText = file.description
+                metadataText = None
+                if folderIndex is not None:
+                    metadataText = folderIndex.get_description(selected('filepath'))
+                if metadataText is None:
+                    metadataText = file.description
                 metadataLabel = tk.ttk.Label(frameForMetadata,text=metadataText,justify=tk.LEFT)
                 metadataLabel.grid(row=1,column=0,rowspan=1,columnspan=1,sticky='w',padx=2)
                 return
             
             #logic to determine if it is the first time this is being plotted
-            figureDrawRequest = [directoryPulldown.get(),typePulldown.get(),forceChannelPulldown.get(),whichDistanceValue.get(),comboboxForNonRGB.get(),checkValueDownsampleOpt.get(),whichTrapPosValue.get()]
+            figureDrawRequest = [selected('filepath'),selected('component'),selected('forceString'),selected('distance'),selected('nonRGB'),selected('downsample')[0],selected('trapPos')]
             
-            currentFile = lk.File(figureDrawRequest[0])
+            currentFile = h5FileCache.get(figureDrawRequest[0])
             
             #if resetPlotOpt = 0 then the maximums will not be reset
             resetPlotOpt = 0
@@ -2085,7 +4486,14 @@ class CTrapGUI():
                 resetPlotOpt = 1
                 writeMetadata(currentFile)
             
-            fileComponent = typePulldown.get()
+            #when only entries (multipliers, brightness, ranges, frame) changed the shown plot is updated in place
+            layoutKey = (selected('plotting'),selected('grayscale'),selected('autoAspect'),selected('downsample')[1],selected('highlightScan'),id(saved_color_data))
+            if resetPlotOpt == 0 and layoutKey == plotSurface.layoutKey and extract_photon_count_options == "" and extract_other_data == "":
+                plotSurface.figure.suptitle(entryPlotTitle.get(), fontsize=16,va='top')
+                plotSurface.refresh()
+                return plotSurface.figure
+            
+            fileComponent = selected('component')
             splitFileType= fileComponent.split('-')
             filetype = splitFileType[0]
             
@@ -2120,77 +4528,76 @@ class CTrapGUI():
             
             #Make title of the graph
             figureReturned.suptitle(entryPlotTitle.get(), fontsize=16,va='top')
-            #figureReturned.set_size_inches(8,6.4)
-            figureReturned.set_dpi(110)
-            #make frame, canvas and toolbar objects for the figure
-            frameForCanvas = tk.ttk.Frame(master,relief=tk.FLAT)
-            frameForCanvas.grid(row=0,rowspan=20,column=0,columnspan=2,sticky="nw",padx=0,pady=0)
-            
-            canvas=FigureCanvasTkAgg(figureReturned,master=frameForCanvas)
-            canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-            canvas.draw()
-            
-            toolbar = NavigationToolbar2Tk(canvas, frameForCanvas)
-            toolbar.update()
-            canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+            plotSurface.layoutKey = layoutKey
+            plotSurface.draw()
             return figureReturned
         
         #Combobox bound function that lists the different .h5 files in that folder, 
         #different file components, and different distance options
-        def changeFileComponents(event):
-            file = lk.File(directoryPulldown.get())
-            listOfFileTypes = []
-            
-            for key in file.kymos.keys():
-                listOfFileTypes.append('kymos-'+key)
-            
-            for key in file.scans.keys():
-                listOfFileTypes.append('scans-'+key)
+        """
+        Fill the File Components, Distance and Trap position pulldowns for the selected file.
+        The lists come from the folder index, or from the prefetcher when the file was a
+        neighbour of the previous one, before falling back to reading the file itself.
+        """
+        def fill_file_components(filepath):
+            prefetchedComponents = None
+            if folderIndex is not None:
+                prefetchedComponents = folderIndex.get_components(filepath)
+            if prefetchedComponents is None:
+                prefetchedComponents = h5Prefetcher.get_components(filepath)
+            if prefetchedComponents is None:
+                prefetchedComponents = list_h5_components(h5FileCache.get(filepath))
+            listOfFileTypes, listOfDistOptions, listOfTrapPos = prefetchedComponents
             
-            for key in file.fdcurves.keys():
-                listOfFileTypes.append('fdcurves-'+key)
-
             typePulldown['values']= listOfFileTypes
             typePulldown.current('0')
             
             #now pull in the distance options and write it to the corresponding combobox pulldown
-            try:
-                listOfDistOptions = []
-                for i in file['Distance']:
-                    listOfDistOptions.append(i)
+            if len(listOfDistOptions) > 0:
                 whichDistanceValue['values'] = listOfDistOptions
                 whichDistanceValue.current('0')
-            except:
+            else:
                 whichDistanceValue['values'] = []
                 whichDistanceValue.set('')
-                pass
             
-            try:
-                listOfTrapPos = []
-                for i in file['Trap position']:
-                    listOfTrapPos.append(i)
+            if len(listOfTrapPos) > 0:
                 whichTrapPosValue['values'] = listOfTrapPos
                 whichTrapPosValue.current('0')
-            except:
+            else:
                 whichTrapPosValue['values'] = []
                 whichTrapPosValue.set('')
-                pass
-
-            # load color data
-            global saved_color_data
-            splitTypePulldown = (typePulldown.get()).split('-')[0]
+            return listOfFileTypes
+        
+        #start reading the files on either side of the selected one in the background
+        def prefetch_neighbour_files():
+            if len(directoryPulldown['values']) > 0 and directoryPulldown.current() >= 0:
+                h5Prefetcher.schedule(directoryPulldown['values'],directoryPulldown.current())
+            return
+        
+        def changeFileComponents(event):
+            fill_file_components(directoryPulldown.get())
             
-            if splitTypePulldown == "fdcurves":
-                saved_color_data = 0   
-            elif splitTypePulldown == "kymos":
-                saved_color_data = file.kymos["-".join(typePulldown.get().split('-')[1:])].rgb_image
-            else:
-                saved_color_data = file.scans["-".join(typePulldown.get().split('-')[1:])].rgb_image
-                
-            fileNameToSave = typePulldown.get()
-            entrySaveFile.delete(0, "end")
-            entrySaveFile.insert(0,fileNameToSave)
+            # load color data
             preload_RGB_and_changeSaveName(1)
+            prefetch_neighbour_files()
+            return
+        
+        #Page Down/Page Up shortcut to step through the files in the directory
+        def step_through_files(step):
+            numberOfFiles = len(directoryPulldown['values'])
+            newIndex = directoryPulldown.current() + step
+            if numberOfFiles == 0 or newIndex < 0 or newIndex >= numberOfFiles:
+                return
+            directoryPulldown.current(newIndex)
+            changeFileComponents(1)
+            return
+        
+        def next_file(event):
+            step_through_files(1)
+            return
+        
+        def previous_file(event):
+            step_through_files(-1)
             return
         
         #function to reset file comboboxes upon selecting a new folder        
@@ -2199,6 +4606,17 @@ class CTrapGUI():
         
             os.chdir(pointerToDir)
             h5FileList= glob.glob("*.h5")
+            
+            #load (or start) the structure index of this folder and refresh any new/changed files in the background
+            global folderIndex
+            if folderIndex is not None:
+                folderIndex.stop_refresh()
+            try:
+                folderIndex = H5FolderIndex(pointerToDir)
+                folderIndex.refresh_in_background(h5FileList)
+            except sqlite3.Error as e:
+                print(f"Could not use a folder index in {pointerToDir}: {e}")
+                folderIndex = None
             if len(h5FileList) > 0:
                 h5FileListTuple = tuple(h5FileList)
                 directoryPulldown['values'] = h5FileListTuple
@@ -2220,54 +4638,15 @@ class CTrapGUI():
                 
             
             #same commands as the changeFileComponents() function
-            file = lk.File(directoryPulldown.get())
-            listOfFileTypes = []
-            
-            for key in file.kymos.keys():
-                listOfFileTypes.append('kymos-'+key)
-            
-            for key in file.scans.keys():
-                listOfFileTypes.append('scans-'+key)
-            
-            for key in file.fdcurves.keys():
-                listOfFileTypes.append('fdcurves-'+key)
+            listOfFileTypes = fill_file_components(directoryPulldown.get())
             
             typePulldown['width'] = len(max(listOfFileTypes,key=len)) + 5
-            typePulldown['values']= listOfFileTypes
-            typePulldown.current('0')
-            
             entrySaveFile['width'] = len(max(listOfFileTypes,key=len)) + 8
             entryPlotTitle['width'] =  len(max(listOfFileTypes,key=len)) + 8
             
-            fileNameToSave = typePulldown.get()
-            entrySaveFile.delete(0, "end")
-            entrySaveFile.insert(0,fileNameToSave)
-            
-            #now pull in the distance options
-            try:
-                listOfDistOptions = []
-                for i in file['Distance']:
-                    listOfDistOptions.append(i)
-                whichDistanceValue['values'] = listOfDistOptions
-                whichDistanceValue.current('0')
-            except:
-                whichDistanceValue['values'] = []
-                whichDistanceValue.set('')
-                pass
-            #now pull in the trap position options
-            try:
-                listOfTrapPos = []
-                for i in file['Trap position']:
-                    listOfTrapPos.append(i)
-                whichTrapPosValue['values'] = listOfTrapPos
-                whichTrapPosValue.current('0')
-            except:
-                whichTrapPosValue['values'] = []
-                whichTrapPosValue.set('')
-                pass
-            
             # load color data
             preload_RGB_and_changeSaveName(1)
+            prefetch_neighbour_files()
             return
         
         #define RGB Constants - change these values based on your normal images
@@ -2277,12 +4656,168 @@ class CTrapGUI():
             defaultDict['red']= 10
             defaultDict['green']= 10
             defaultDict['blue']= 10
+            defaultDict['maxOpenH5Files'] = 4 #number of .h5 files kept open by the file cache
+            defaultDict['prefetchMemoryBudgetMB'] = 512 #memory allowed for photon counts decoded ahead of time
+            defaultDict['photonCacheMemoryMB'] = 1024 #decoded photon counts kept in memory
+            defaultDict['photonCacheDiskMB'] = 8192 #decoded photon counts kept in the .ctrapvis_cache folder of each directory
+            defaultDict['gamma'] = 1.0
+            defaultDict['autoScalePercentile'] = '' #e.g. 99.5 scales every channel so that percentile is at full brightness
+            defaultDict['memoryMapImages'] = False #start with the Memory-Map Images option checked
+            defaultDict['pyramidMemoryMB'] = 256 #largest time-binned level of a kymograph kept for drawing
+            defaultDict['forceCacheMemoryMB'] = 512 #force/distance/trap position slices kept in memory between redraws
+            defaultDict['stackBufferMemoryMB'] = 256 #composited frames of a scan stack kept ready for the slider/Play button
+            defaultDict['stackPlaybackFPS'] = 10
+            return
+        
+        """
+        Draw Plot runs in two steps so the window stays responsive while a large file loads:
+        prepare_plot_data() reads everything the plot needs (file, photon counts, timestamps, the
+        kymograph pyramid, the frame times of a stack and the force slices) on the draw worker thread
+        from a snapshot of the settings, without touching tk, and posts progress/results on drawQueue.
+        poll_draw_queue() runs on the tk thread, updates the status bar and, once the data is ready,
+        builds the figure from the returned arrays and the snapshot only (generateFigure(preparedDraw=...)).
+        A new Draw Plot (or Enter) while a draw is running supersedes it - the old job stops at its next
+        step and its results are ignored.
+        """
+        def snapshot_draw_request():
+            return {'filepath': directoryPulldown.get(),
+                    'component': typePulldown.get(),
+                    'plotting': plottingOpt.get(),
+                    'nonRGB': comboboxForNonRGB.get(),
+                    'forceString': forceChannelPulldown.get(),
+                    'forceChannel': force_channel_name(forceChannelPulldown.get()),
+                    'distance': whichDistanceValue.get(),
+                    'trapPos': whichTrapPosValue.get(),
+                    'downsample': (checkValueDownsampleOpt.get(),entryDownSample.get()),
+                    'highlightScan': multiScanPlotOpt.get(),
+                    'grayscale': grayscaleOpt.get(),
+                    'autoAspect': bool(aspectOptionVar.get()),
+                    'colorKey': (directoryPulldown.get(),typePulldown.get(),memoryMapOpt.get())}
+        
+        #currentColorData/currentPyramid are the shown photon counts and kymograph pyramid when the draw was submitted
+        def prepare_plot_data(request,jobId,cancelEvent,currentColorData,currentPyramid):
+            def report(text,fraction):
+                drawQueue.put((jobId,"progress",text,fraction))
+                return not cancelEvent.is_set()
+            
+            try:
+                filepath = request['filepath']
+                componentString = request['component']
+                componentType = componentString.split('-')[0]
+                if not report("Opening file",0.1):
+                    return
+                h5file = h5FileCache.get(filepath)
+                
+                preparedDraw = dict(request,colorData=None,kymoPyramid=None,slices={})
+                colorData = currentColorData
+                if componentType != "fdcurves" and currentColorData is None:
+                    if not report("Decoding photon counts",0.3):
+                        return
+                    colorData = photonCountCache.get(h5file,filepath,componentString,memoryMap=request['colorKey'][2])
+                    preparedDraw['colorData'] = colorData
+                
+                if componentType == "kymos" and request['plotting'] != "Non-RGB Only":
+                    if currentPyramid is None or currentPyramid.colorData is not colorData:
+                        if not report("Binning the kymograph",0.4):
+                            return
+                        currentPyramid = KymoPyramid(colorData,maxLevelMB=defaultDict['pyramidMemoryMB'])
+                    preparedDraw['kymoPyramid'] = currentPyramid
+                
+                if componentType != "fdcurves":
+                    if not report("Reading timestamps",0.5):
+                        return
+                    component_time_range(h5file,componentString) #also keeps the line time of a kymo
+                    if componentType == "scans" and isinstance(colorData,np.ndarray) and colorData.ndim > 3:
+                        preparedDraw['frameTimes'] = scan_frame_times(h5file,componentString)
+                
+                if componentType != "fdcurves" and request['plotting'] != "RGB Only":
+                    timeRange = component_time_range(h5file,componentString)
+                    if not report("Reading force data",0.7):
+                        return
+                    if request['nonRGB'] == "Trap Pos.-Time":
+                        sliceRequests = [("Trap position",request['trapPos'])]
+                    elif request['nonRGB'] == "Force-Time":
+                        sliceRequests = [("Force HF",request['forceChannel'])]
+                    else:
+                        sliceRequests = [("Force LF",request['forceChannel']),("Distance",request['distance'])]
+                    for group, channel in sliceRequests:
+                        preparedDraw['slices'][prepared_slice_key(h5file,group,channel,timeRange,request['downsample'])] = get_force_slice(h5file,group,channel,timeRange,request['downsample'])
+                drawQueue.put((jobId,"done",preparedDraw))
+            except Exception as e:
+                drawQueue.put((jobId,"error",e))
+            return
+        
+        def poll_draw_queue():
+            global figureToSave
+            global saved_color_data
+            global savedColorKey
+            global kymoPyramid
+            drawJob['poll'] = None
+            while True:
+                try:
+                    message = drawQueue.get_nowait()
+                except queue.Empty:
+                    break
+                if message[0] != drawJob['id'] or not drawJob['active']:
+                    continue #left over from a superseded or cancelled draw
+                if message[1] == "progress":
+                    drawStatusLabel.config(text=message[2] + "...")
+                    drawProgress['value'] = message[3]
+                elif message[1] == "error":
+                    finish_draw(f"Draw failed: {message[2]}")
+                    print(f"Could not draw the plot: {message[2]}")
+                else:
+                    preparedDraw = message[2]
+                    if preparedDraw['colorData'] is not None:
+                        saved_color_data = preparedDraw['colorData']
+                        savedColorKey = preparedDraw['colorKey']
+                    if preparedDraw['kymoPyramid'] is not None:
+                        kymoPyramid = preparedDraw['kymoPyramid']
+                    drawStatusLabel.config(text="Drawing...")
+                    drawProgress['value'] = 0.9
+                    master.update_idletasks()
+                    try:
+                        figureToSave = generateFigure(preparedDraw=preparedDraw)
+                        finish_draw("")
+                    except Exception as e:
+                        finish_draw(f"Draw failed: {e}")
+                        print(f"Could not draw the plot: {e}")
+            if drawJob['active']:
+                drawJob['poll'] = master.after(50,poll_draw_queue)
+            return
+        
+        def finish_draw(statusText):
+            drawJob['active'] = False
+            drawProgress['value'] = 0
+            drawStatusLabel.config(text=statusText)
+            cancelDrawButton.state(['disabled'])
             return
         
         #updatePlot button bound event to generate the figure
         def buildPlot(event):
-            global figureToSave
-            figureToSave = generateFigure()
+            #supersede a draw that is still running
+            if drawJob['cancel'] is not None:
+                drawJob['cancel'].set()
+            previousRunning = drawJob['active']
+            drawJob['id'] += 1
+            drawJob['cancel'] = threading.Event()
+            drawJob['request'] = snapshot_draw_request()
+            drawJob['active'] = True
+            drawStatusLabel.config(text="Waiting for the previous draw..." if previousRunning else "Loading...")
+            drawProgress['value'] = 0
+            cancelDrawButton.state(['!disabled'])
+            currentColorData = saved_color_data if drawJob['request']['colorKey'] == savedColorKey else None
+            drawExecutor.submit(prepare_plot_data,drawJob['request'],drawJob['id'],drawJob['cancel'],currentColorData,kymoPyramid)
+            #a cancelled draw can still have its poll scheduled - only one poll loop runs at a time
+            if drawJob['poll'] is None:
+                drawJob['poll'] = master.after(50,poll_draw_queue)
+            return
+        
+        #cancelDrawButton bound event - the worker stops at its next step and nothing is drawn
+        def cancelDraw(event):
+            if drawJob['active']:
+                drawJob['cancel'].set()
+                finish_draw("Draw cancelled")
             return
         
         #saveImageButton bound event to generate a figure, refresh the image,
@@ -2292,40 +4827,19 @@ class CTrapGUI():
             
             imageStringPrefix = ((entrySaveFile.get()).replace(" ","_")).replace("-","_")
             imageSuffix = imageFormatOption.get()
-            plt.savefig(imageStringPrefix + '.' +imageSuffix,bbox_inches="tight")
-            
-            #split metadata from the h5 file
-            fileName = lk.File(directoryPulldown.get())
-            
-            metaData = fileName.description
+            figureToSave.savefig(imageStringPrefix + '.' +imageSuffix,bbox_inches="tight")
             
             #open,write, and save metadata File
             metaDataFileString = imageStringPrefix.replace(' ','_')+ '_desc' +'.txt'
-            metaDataFile = open(metaDataFileString,'w')
-            metaDataFile.write(f'Metadata for image analysis of {directoryPulldown.get()} --- {typePulldown.get()}\n')
-            
-            metaDataFile.write(metaData)
-            
-            metaDataFile.write('------------------------------------------\n')
-            metaDataFile.write(f'Image Scaling Factors\nR\t{entryRed.get()}\nG\t{entryGreen.get()}\nB\t{entryBlue.get()}\n')
-            metaDataFile.write(f'Brightness Shift: {entryBrightness.get()}\n')
-            
-            arrayForKymoOrScan = (typePulldown.get()).split('-')
-            
-            if  arrayForKymoOrScan[0] == "scans":
-                scanNumber = arrayForKymoOrScan[-1]
-                scanPointer = fileName.scans[scanNumber]
-                
-                if scanPointer.num_frames == 1:
-                    timestampArray = scanPointer.timestamps
-                    
-                    metaDataFile.write(f"First Timestamp Value: {timestampArray[0,0]/1e9} seconds\n")
-                    metaDataFile.write(f"Image Acquisition Time: {(np.max(timestampArray[:,:]) - timestampArray[0,0])/1e9} seconds\n")
-                else:
-                    timestampArray = scanPointer.timestamps
-                    metaDataFile.write(f"First Timestamp Value: {timestampArray[0,0,0]/1e12} seconds\n")
-                    metaDataFile.write(f"Image Acquisition Time: {(np.max(timestampArray[0,:,:]) - timestampArray[0,0,0])/1e9} seconds\n")
-
+            write_figure_metadata(metaDataFileString,h5FileCache.get(directoryPulldown.get()),directoryPulldown.get(),typePulldown.get(),plot_settings_from_widgets())
+            return
+        
+        #savePlotSettingsButton bound event - writes the plot options as a .json file for the command line batch mode (--render)
+        def savePlotSettings(event):
+            settingsFileString = ((entrySaveFile.get()).replace(" ","_")).replace("-","_") + '_settings.json'
+            with open(settingsFileString,'w') as settingsFile:
+                json.dump(plot_settings_from_widgets(),settingsFile,indent=4)
+            print(f"Plot settings saved to {settingsFileString}")
             return
         
         """
@@ -2342,7 +4856,7 @@ class CTrapGUI():
             def save_exp_desc(exp_desc,filename_without_extension):
                 imageStringPrefix = filename_without_extension
                 
-                fileName = lk.File(directoryPulldown.get())
+                fileName = h5FileCache.get(directoryPulldown.get())
                 
                 metaDataFileString = imageStringPrefix.replace(' ','_')+ '_desc' +'.txt'
                 metaDataFile = open(metaDataFileString,'w')
@@ -2369,80 +4883,68 @@ class CTrapGUI():
                         metaDataFile.write(f"First Timestamp Value: {timestampArray[0,0,0]/1e9} seconds\n")
                         metaDataFile.write(f"Image Acquisition Time: {(np.max(timestampArray[0,:,:]) - timestampArray[0,0,0])/1e9} seconds\n")
             
-            # save scans without labeled axes. Important for conserving pixel num etc
-            def save_image_for_CTrapViewer(image_num, image_type):
-                if image_type == 'kymo':
-                    # Add dx and dt to filename for CTrapViewer purposes
-                    dx = tempfile.kymos[s].pixelsize_um[0] * 1000 #pixel size in nm
-                    #dt = tempfile.kymos[s].json['scan volume']['scan axes'][0]['scan time (ms)'] #scan time in ms
-                    # Note: the above dt extraction is incorrect if you manually add a wait time between line scans
-                    dt = (tempfile.kymos[s].timestamps[0,1]-tempfile.kymos[s].timestamps[0,0])/1e6 #scan time in ms
-                    # save kymograph without labeled axes. Important for conserving pixel num etc
-                    filename_png = filename_without_extension + "_dx_" + str(dx) + "nm_dt_" + str(dt) + "ms" + ".png"
-                    modified_RGB = modify_rgb_image(tempfile.kymos[s].rgb_image)
-                    maxTime = len(tempfile.kymos[s].timestamps[0,:])
-                    numberPixels = len(modified_RGB)
-                    maxTrueTime = maxTime*dt /1000
-                    maxTrueDist = dx*numberPixels/1000 
-                    default_kwargs = dict(extent=[0, maxTrueTime, 0, maxTrueDist], aspect=(modified_RGB.shape[0] / modified_RGB.shape[1]) * (maxTrueTime / maxTrueDist))
-                    fig, ax = plt.subplots()
-                    ax.imshow(modified_RGB,**{**default_kwargs})
-                    ax.axis('off')
-                    plt.savefig(filename_png,bbox_inches="tight",pad_inches=0)
-                    plt.close()
-                elif image_type == 'scan':
-                    # Add dx and dt to filename for CTrapViewer purposes
-                    dx = tempfile.scans[t].pixelsize_um[0] * 1000 #pixel size in nm
-                    if tempfile.scans[t].num_frames == 1: #single 2D scan
-                        dt = (tempfile.scans[t].timestamps[0,1]-tempfile.scans[t].timestamps[0,0])/1e6 #line time in ms
-                        image_slice = tempfile.scans[t].rgb_image
-                        image_slice_mod = modify_rgb_image(image_slice)
-                        heightScan = image_slice.shape[1] * dx / 1e3
-                        totalScanWidth =  tempfile.scans[t].scan_width_um[0]
-                        default_kwargs = dict(extent=[0, totalScanWidth, 0, heightScan], aspect=(image_slice_mod.shape[0] / image_slice_mod.shape[1]) * (totalScanWidth/ heightScan))
-                            
-                        filename_png = filename_without_extension + " dx " + str(dx) + "nm dt " + str(dt) + "ms" + ".png"
-                        fig, ax = plt.subplots(constrained_layout=True)
-                        ax.imshow(image_slice_mod, **{**default_kwargs})
-                        plt.axis('off')
-                        plt.savefig(filename_png,bbox_inches="tight", pad_inches = 0)
-                        
-                    elif tempfile.scans[t].num_frames > 1: #image stack
-                        dt = (tempfile.scans[t].timestamps[0,1,0]-tempfile.scans[t].timestamps[0,0,0])/1e6 #line time in ms
-
-                        for i in range(tempfile.scans[t].num_frames):
-                            frame_num = i + 1
-                            filename_png = filename_without_extension + " dx " + str(dx) + "nm dt " + str(dt) + "ms f" + str(frame_num) + ".png"
-                            image_slice = tempfile.scans[t].rgb_image[i,:,:,:]
-                            heightScan = image_slice.shape[1] * dx / 1e3
-                            image_slice_int = modify_rgb_image(image_slice) #convert to uint8 for saving as .png <- JWW changed this, might need to change back
-                            totalScanWidth =  tempfile.scans[t].scan_width_um[0]
-                            
-                            #listOfInterpols = ['none', 'nearest', 'bilinear', 'bicubic', 'spline16', 'spline36', 'hanning', 'hamming', 'hermite', 'kaiser', 'quadric','catrom', 'gaussian', 'bessel', 'mitchell', 'sinc', 'lanczos']
-                            default_kwargs = dict(extent=[0, totalScanWidth, 0, heightScan], aspect=(image_slice_int.shape[0] / image_slice_int.shape[1]) * (totalScanWidth/ heightScan),interpolation="nearest")
-                            
-                            fig, ax = plt.subplots(constrained_layout=True)
-                            ax.imshow(image_slice_int, **{**default_kwargs})
-                            ax.axis('off')
-                            #filename_png = item + filename_without_extension + " dx " + str(dx) + "nm dt " + str(dt) + "ms f" + str(frame_num) + ".png"
-                            plt.savefig(filename_png,bbox_inches = 'tight', pad_inches = 0)
-          
-            tempfile = lk.File(temp_file_name) # load h5 file
+            # save kymos/scans without labeled axes - one image pixel per photon-count pixel
+            tempfile = h5FileCache.get(temp_file_name) # load h5 file
             filename_without_extension = tempfile.h5.filename.replace(".h5", "")  # "file.h5" -> "file"
             exp_desc = tempfile.description        
             save_exp_desc(exp_desc, filename_without_extension) # save .txt with experimental description
-                
-            # loop to extract each kymo 
+            imageSuffix = ".tif" if imageFormatOption.get() == "TIFF" else ".png"
+            
+            #every image is a block of frames with its file names for the process pool - the photon counts are
+            #never decoded here: the workers read their frames (and the auto-scale subsample) themselves
+            absolutePath = os.path.abspath(temp_file_name)
+            autoScalePercentile = float(entryAutoScale.get()) if entryAutoScale.get().strip() != "" else None
+            imageBatches = []
             for s in list(tempfile.kymos): 
-                image_type = 'kymo'                                 
-                # save kymograph as png for viewing in CTrapViewer
-                save_image_for_CTrapViewer(s, image_type)
-               
-            # loop to extract each 2D scan 
+                # Add dx and dt to filename for CTrapViewer purposes
+                dx = tempfile.kymos[s].pixelsize_um[0] * 1000 #pixel size in nm
+                # Note: the dt from the scan volume json is incorrect if you manually add a wait time between line scans
+                dt = round(kymo_line_time(tempfile,"kymos-" + s) * 1000,6) #scan time in ms
+                filename_image = filename_without_extension + "_dx_" + str(dx) + "nm_dt_" + str(dt) + "ms" + imageSuffix
+                imageBatches.append((absolutePath,"kymos-" + s,None,[filename_image]))
+            
             for t in list(tempfile.scans): 
-                image_type = 'scan'            
-                # save kymograph as png for viewing in CTrapViewer
-                save_image_for_CTrapViewer(t, image_type)
+                dx = tempfile.scans[t].pixelsize_um[0] * 1000 #pixel size in nm
+                timestampArray = tempfile.scans[t].timestamps
+                numberOfFrames = tempfile.scans[t].num_frames
+                if numberOfFrames == 1: #single 2D scan
+                    dt = (timestampArray[0,1]-timestampArray[0,0])/1e6 #line time in ms
+                    imageBatches.append((absolutePath,"scans-" + t,None,[filename_without_extension + " dx " + str(dx) + "nm dt " + str(dt) + "ms" + imageSuffix]))
+                else: #image stack - split over the workers
+                    dt = (timestampArray[0,1,0]-timestampArray[0,0,0])/1e6 #line time in ms
+                    filenames = [filename_without_extension + " dx " + str(dx) + "nm dt " + str(dt) + "ms f" + str(i + 1) + imageSuffix for i in range(numberOfFrames)]
+                    framesPerBatch = max(1, -(-numberOfFrames // (4 * (os.cpu_count() or 1))))
+                    for firstFrame in range(0, numberOfFrames, framesPerBatch):
+                        imageBatches.append((absolutePath,"scans-" + t,(firstFrame,firstFrame + framesPerBatch),filenames[firstFrame:firstFrame + framesPerBatch]))
+            
+            componentStrings = list(OrderedDict.fromkeys(batch[1] for batch in imageBatches))
+            with ProcessPoolExecutor(mp_context=processContext) as imagePool:
+                #one job per component first, so a stack is decoded once and auto-scaled over all of its frames
+                componentMultipliers = dict(zip(componentStrings,imagePool.map(prepare_export_component,[absolutePath]*len(componentStrings),componentStrings,[autoScalePercentile]*len(componentStrings))))
+                componentSettings = {componentString: composite_settings(None,multipliers=componentMultipliers[componentString]) for componentString in componentStrings}
+                imageBatches = [batch + (componentSettings[batch[1]],) for batch in imageBatches]
+                writtenImages = sum(imagePool.map(write_component_frames,*zip(*imageBatches))) if imageBatches else 0
+            print(f"{writtenImages} images saved for {os.path.basename(temp_file_name)}")
+            return
+        
+        """
+        Writes the selected kymo/scan (every frame of a stack) to one OME-TIFF named after the "File Name to Save" entry,
+        as raw photon counts or with the current multipliers/brightness/gamma applied (uint8)
+        """
+        def extractImageOMETiff(event):
+            if typePulldown.get().split('-')[0] == "fdcurves":
+                print("No photon count data is collected in fdcurve objects")
+                return
+            compositeSettings = None
+            if not omeRawCountsOpt.get():
+                compositeSettings = composite_settings(saved_color_data) #auto-scaling is taken over the whole stack
+            filename = ((entrySaveFile.get()).replace(" ","_")).replace("-","_") + ".ome.tif"
+            try:
+                write_ome_tiff(filename,saved_color_data,photon_count_metadata(),compositeSettings)
+            except (OSError, ValueError) as e:
+                print(f"Could not write {filename}: {e}")
+                return
+            print(f"Stack saved to {filename}")
             return
         
         """
@@ -2456,7 +4958,7 @@ class CTrapGUI():
             def save_exp_desc(exp_desc,filename_without_extension):
                 imageStringPrefix = filename_without_extension
                 
-                fileName = lk.File(directoryPulldown.get())
+                fileName = h5FileCache.get(directoryPulldown.get())
                 
                 metaDataFileString = imageStringPrefix.replace(' ','_')+ '_desc' +'.txt'
                 metaDataFile = open(metaDataFileString,'w')
@@ -2559,7 +5061,7 @@ class CTrapGUI():
                             plt.close()
             
             temp_file_name = directoryPulldown.get()
-            tempfile = lk.File(temp_file_name) # load h5 file
+            tempfile = h5FileCache.get(temp_file_name) # load h5 file
             filename_without_extension = (tempfile.h5.filename.replace(".h5", "")).replace(" ","_")  # "file.h5" -> "file"
             exp_desc = tempfile.description        
             save_exp_desc(exp_desc, filename_without_extension) # save .txt with experimental description
@@ -2583,55 +5085,42 @@ class CTrapGUI():
         This task is computationally expensive if you want the HF data - be wary of this
         """
         def extractForceMethod(event):
-            def extractForceCommand(settings_list):
+            def extractForceCommand(settings_list,fileFormat):
                 # Extract force data
                 filename = directoryPulldown.get()
-                temp_file = lk.File(filename)
+                temp_file = h5FileCache.get(filename)
                 filename_no_extension = filename.replace(".h5",'')
-                force1xHF = temp_file['Force HF']['Force 1x']
-                force1yHF = temp_file['Force HF']['Force 1y']
-                force2xHF = temp_file['Force HF']['Force 2x']
-                force2yHF = temp_file['Force HF']['Force 2y']
-                sample_rate = force1xHF.sample_rate # Hz
+                sample_rate = temp_file['Force HF']['Force 1x'].sample_rate # Hz
                 downsampled_rate = float(entryDownSample.get())
                 
-                force1x_downsamp = force1xHF.downsampled_by(int(sample_rate/downsampled_rate))
-                force1y_downsamp = force1yHF.downsampled_by(int(sample_rate/downsampled_rate))
-                force2x_downsamp = force2xHF.downsampled_by(int(sample_rate/downsampled_rate))
-                force2y_downsamp = force2yHF.downsampled_by(int(sample_rate/downsampled_rate))
-                pooled_force_data = [force1xHF, force1yHF, force2xHF, force2yHF, force1x_downsamp,
-                                     force1y_downsamp, force2x_downsamp, force2y_downsamp]
-                
-                #extract HF and downsampled time stamps
-                time = force1xHF.timestamps/1e9 # time traces (seconds)
-                time = time - time[0]
-                time_downsamp = force1x_downsamp.timestamps/1e9
-                time_downsamp = time_downsamp - time_downsamp[0]
-
-                #indices for what force channels to take                
-                force_ind = [i for i, v in enumerate(settings_list) if v[:][1] == True]
-                if len(force_ind) > 0:
-                    all_column_names, force_bool = zip(*settings_list) #split pairs
-                    column_names =  []
-                    forces_to_save = []
-                if any(force_bool[0:3]): # if any HF data is to be saved
-                    forces_to_save.append(time)
-                    column_names.append('Time (s)')
-                    for i in range(4):
-                        if force_bool[i] == True:
-                            forces_to_save.append(pooled_force_data[i].data)
-                            column_names.append(all_column_names[i])
-                if any(force_bool[4:7]): # if any downsampled data is to be saved
-                    forces_to_save.append(time_downsamp)
-                    column_names.append('Time downsamp (s)')               
-                    for j in range(4,8):
-                        if force_bool[j] == True:
-                            forces_to_save.append(pooled_force_data[j].data)
-                            column_names.append(all_column_names[j]) 
-                else:
+                #indices for what force channels to take
+                all_column_names, force_bool = zip(*settings_list) #split pairs
+                channel_names = ['Force 1x', 'Force 1y', 'Force 2x', 'Force 2y']
+                if not any(force_bool):
                     print('No data channels were selected')
                     return
                 
+                #HF channels are streamed from the file by the exporter
+                hf_channels = [(all_column_names[i], channel_names[i]) for i in range(4) if force_bool[i] == True]
+                
+                #downsampled channels come from the force index when it has been built
+                downsampled_columns = []
+                if any(force_bool[4:8]): # if any downsampled data is to be saved
+                    forcePyramid = get_force_pyramid(temp_file)
+                    for j in range(4,8):
+                        if force_bool[j] != True:
+                            continue
+                        indexedSlice = None
+                        if forcePyramid is not None:
+                            indexedSlice = forcePyramid.block_means('Force HF',channel_names[j-4],'','',int(sample_rate/downsampled_rate))
+                        if indexedSlice is None:
+                            channel_downsamp = temp_file['Force HF'][channel_names[j-4]].downsampled_by(int(sample_rate/downsampled_rate))
+                            indexedSlice = (channel_downsamp.data, channel_downsamp.timestamps)
+                        if len(downsampled_columns) == 0:
+                            time_downsamp = indexedSlice[1]/1e9
+                            downsampled_columns.append(('Time downsamp (s)', time_downsamp - time_downsamp[0]))
+                        downsampled_columns.append((all_column_names[j], indexedSlice[0]))
+                
                 #save metadata to a .txt file
                 exp_desc = temp_file.description
                 filename_meta = filename_no_extension + "_desc.txt"
@@ -2640,19 +5129,12 @@ class CTrapGUI():
                     meta_file.write(exp_desc)
                     meta_file.close()
                 
-                ## preallocate pd DataFrame with #indices = max length of force data
-                grouped_data = pd.DataFrame(index=range(len(forces_to_save[0])))
-                for i in range(len(forces_to_save)):
-                    # if shorter than index length, append NaN: 
-                    if len(forces_to_save[i]) < len(forces_to_save[0]):
-                        forces_to_save[i] = np.append(forces_to_save[i], np.repeat(np.nan, len(forces_to_save[0])-len(forces_to_save[i])))
-                    #transpose force arrays for saving in columns
-                    forces_to_save[i]=forces_to_save[i].reshape(-1,1)
-                    grouped_data.insert(i, column_names[i], forces_to_save[i])
-                
-                grouped_data = grouped_data.fillna('') # fill NaN with ''
-                filename_force = filename_no_extension + "_force.csv"
-                grouped_data.to_csv(filename_force, sep=',', index=False, header=True)
+                try:
+                    saved_files = export_force_tables(temp_file,filename_no_extension,hf_channels,downsampled_columns,fileFormat=fileFormat)
+                except (ImportError, OSError) as e:
+                    print(f"Could not export the force data: {e}")
+                    return
+                print("Force data saved to " + ", ".join(saved_files))
                 return
             
             def extractAndDestroyForceOrigin():
@@ -2664,8 +5146,9 @@ class CTrapGUI():
                      ('Force1y downsamp', force1y_downsamp_var.get()), 
                      ('Force2x downsamp', force2x_downsamp_var.get()), 
                      ('Force2y downsamp',force2y_downsamp_var.get())]
-                extractForceCommand(settings_list)
+                fileFormat = forceFormatOpt.get()
                 forceRoot.destroy()
+                extractForceCommand(settings_list,fileFormat)
                 return
             
             #Pop Up Menu
@@ -2692,11 +5175,18 @@ class CTrapGUI():
             tk.ttk.Checkbutton(forceRoot, text="Force1y_downsamp",variable=force1y_downsamp_var).grid(row=6, sticky="w")
             tk.ttk.Checkbutton(forceRoot, text="Force2x_downsamp",variable=force2x_downsamp_var).grid(row=7, sticky="w")
             tk.ttk.Checkbutton(forceRoot, text="Force2y_downsamp",variable=force2y_downsamp_var).grid(row=8, sticky="w")
+            forceFormatFrame = tk.ttk.Frame(forceRoot)
+            forceFormatFrame.grid(row=9, sticky="w")
+            tk.ttk.Label(forceFormatFrame, text="Save as").grid(row=0, column=0, sticky="w")
+            forceFormatOpt = tk.ttk.Combobox(forceFormatFrame,values=['.csv','.parquet','.h5','.npz'],width=8)
+            forceFormatOpt.grid(row=0, column=1, sticky="w", padx=2)
+            forceFormatOpt.current(0)
             tk.ttk.Button(forceRoot, text='Extract data', command=extractAndDestroyForceOrigin).grid(row=10, sticky="w", pady=8)
             return        
         
         """
-        This function extracts the photon counts of all three channels to a .xlsx file.
+        This function extracts the photon counts of all three channels to a .xlsx file (current frame only),
+        a .tif file or, in their integer dtype with pixel size/line time/timestamps, a .npz, Parquet or Zarr file.
         """
         def extract_photon_counts(event):
             three_color_photon_data = saved_color_data
@@ -2721,8 +5211,37 @@ class CTrapGUI():
                 writer.save()
             elif extractPhotonCountsOpt.get() == ".tif":
                 tiff.imsave((((typePulldown.get()).replace(" ","_")).replace("-","_"))+".tif",three_color_photon_data)
+            else:
+                #columnar formats - the whole kymo/scan (every frame of a stack) in its own integer dtype
+                try:
+                    savedFile = export_photon_counts(three_color_photon_data,((typePulldown.get()).replace(" ","_")).replace("-","_"),extractPhotonCountsOpt.get(),photon_count_metadata())
+                except (ImportError, OSError, ValueError) as e:
+                    print(f"Could not export the photon counts: {e}")
+                    return
+                print(f"Photon counts saved to {savedFile}")
             return
         
+        #pixel size, line time and the start timestamps of every line (kymos) or frame (scans) of the selected component
+        def photon_count_metadata():
+            h5file = h5FileCache.get(directoryPulldown.get())
+            componentString = typePulldown.get()
+            splitComponent = componentString.split('-')
+            componentName = "-".join(splitComponent[1:])
+            metadata = {'source_file': os.path.basename(directoryPulldown.get()), 'component': componentString}
+            if splitComponent[0] == "kymos":
+                componentPointer = h5file.kymos[componentName]
+                metadata['line_time_s'] = float(kymo_line_time(h5file,componentString))
+                metadata['timestamps_ns'] = componentPointer.timestamps[0,:]
+            else:
+                componentPointer = h5file.scans[componentName]
+                timestampArray = componentPointer.timestamps
+                if timestampArray.ndim > 2:
+                    metadata['timestamps_ns'] = timestampArray[:,0,0]
+                else:
+                    metadata['timestamps_ns'] = timestampArray[:1,0]
+            metadata['pixelsize_um'] = [float(pixelSize) for pixelSize in componentPointer.pixelsize_um]
+            return metadata
+        
         """
         The three functions below are activated upon the "Extract Line Scans" button
         being hit. The user can click points of interest on the RGB plot and when the
@@ -2746,7 +5265,7 @@ class CTrapGUI():
             typePointer = "-".join(stringType[1:])
             stringType = stringType[0]
 
-            h5_file = lk.File(h5_filepath)
+            h5_file = h5FileCache.get(h5_filepath)
             
             color_data = saved_color_data
             if stringType == "kymos":
@@ -2835,19 +5354,20 @@ class CTrapGUI():
             entrySaveFile.insert(0,fileNameToSave)
             
             global saved_color_data
+            global savedColorKey
             h5_filepath = directoryPulldown.get()
             splitTypePulldown = (typePulldown.get()).split('-')[0]
 
             if splitTypePulldown == "fdcurves":
                 saved_color_data = 0   
-            elif splitTypePulldown == "kymos":
-                h5_filepath = directoryPulldown.get()
-                h5file = lk.File(h5_filepath)
-                saved_color_data = h5file.kymos["-".join(typePulldown.get().split('-')[1:])].rgb_image
             else:
-                h5_filepath = directoryPulldown.get()
-                h5file = lk.File(h5_filepath)
-                saved_color_data = h5file.scans["-".join(typePulldown.get().split('-')[1:])].rgb_image
+                #photon counts decoded ahead of time by the prefetcher are only handed out once
+                saved_color_data = None
+                if not memoryMapOpt.get():
+                    saved_color_data = h5Prefetcher.take_color_data(h5_filepath,typePulldown.get())
+                if saved_color_data is None:
+                    saved_color_data = photonCountCache.get(h5FileCache.get(h5_filepath),h5_filepath,typePulldown.get(),memoryMap=memoryMapOpt.get())
+            savedColorKey = (h5_filepath,typePulldown.get(),memoryMapOpt.get())
             return
         
         """
@@ -2874,13 +5394,14 @@ class CTrapGUI():
         """
         This function is used to provide visualization of the frame number since the 
         tk.ttk version of the slider does not have a natural way of displaying that
-        number.
+        number. When the plotted scan is a stack the new frame is shown straight away.
         """
         def print_scale_output(event):
             entryScaleSlider.configure(state='normal')
             entryScaleSlider.delete(0,"end")
-            entryScaleSlider.insert(0,str(int(scaleForStack.get())))
+            entryScaleSlider.insert(0,str(int(float(scaleForStack.get()))))
             entryScaleSlider.configure(state='readonly')
+            show_stack_frame(int(float(scaleForStack.get())))
             return
         
         """
@@ -2897,12 +5418,20 @@ class CTrapGUI():
             typePointer = "".join(stringType[1:])
             stringType = stringType[0]
             if stringType == "kymos": 
-                modified_RGB_data = modify_rgb_image(saved_color_data)
+                modified_RGB_data = modify_rgb_image_in_chunks(saved_color_data)
                 
                 kymoTrackerRoot = tk.Tk()
                 kymoTrackerRoot.config(bg="gray94")
                 kymoTrackerRoot.title(f'KymoTracker -- {directoryPulldown.get()} -- {typePulldown.get()}')
                 kymoTracker_gui = KymoTrackerGUI(kymoTrackerRoot,directoryPulldown.get(),typePointer,saved_color_data,modified_RGB_data) #call the Application class
+                if isinstance(modified_RGB_data, np.memmap):
+                    displayPath = modified_RGB_data.filename
+                    del modified_RGB_data
+                    def remove_window_display_file(event):
+                        if event.widget is kymoTrackerRoot:
+                            remove_display_file(displayPath)
+                        return
+                    kymoTrackerRoot.bind("<Destroy>",remove_window_display_file,add="+")
                 kymoTrackerRoot.mainloop()
             else:
                 print(f"{stringType} file type detected. Only kymograph files are applicable to use in the kymotracker functionality")
@@ -2911,6 +5440,23 @@ class CTrapGUI():
         quitButton bound event to destory the tkinter window and exit out of python
         """
         def totalQuit(event):
+            print(h5FileCache)
+            print(photonCountCache)
+            print(forceSliceCache)
+            h5Prefetcher.shutdown()
+            stop_stack_playback()
+            stackFrameBuffer.stop()
+            if drawJob['cancel'] is not None:
+                drawJob['cancel'].set()
+            drawExecutor.shutdown(wait=False)
+            if folderIndex is not None:
+                folderIndex.stop_refresh()
+            with forcePyramidLock:
+                for forcePyramid in forcePyramids.values():
+                    forcePyramid.close()
+            for displayPath in list(pendingDisplayFiles):
+                pendingDisplayFiles.remove(displayPath)
+                remove_display_file(displayPath)
             master.destroy()
             quit()
             return
@@ -2918,6 +5464,48 @@ class CTrapGUI():
         self.master = master
         #build the simple GUI
         define_Global_Defaults()
+        
+        global h5FileCache
+        h5FileCache = H5FileCache(maxOpenFiles=defaultDict['maxOpenH5Files'])
+        
+        #one figure/canvas/toolbar reused by every plot - lower the dpi if the GUI does not fit on your screen
+        global rgbCompositor
+        rgbCompositor = RGBCompositor()
+        global plotSurface
+        plotSurface = PlotSurface(master,dpi=110)
+        plotSurface.frame.grid(row=0,rowspan=20,column=0,columnspan=2,sticky="nw",padx=0,pady=0)
+        global folderIndex
+        folderIndex = None #set once a folder is opened
+        global kymoPyramid
+        kymoPyramid = None #built the first time a kymograph is drawn
+        global forceSliceCache
+        forceSliceCache = ForceSliceCache(maxMemoryMB=defaultDict['forceCacheMemoryMB'])
+        global forcePyramids
+        forcePyramids = {} #sidecar force indexes opened so far, by file path, size and modification time
+        global forcePyramidLock
+        forcePyramidLock = threading.Lock() #the draw worker and the index builder open/close indexes as well
+        global rebuildingForceIndexes
+        rebuildingForceIndexes = set() #files whose sidecar is being replaced by a new index
+        global drawSelection
+        drawSelection = {} #snapshot and prepared data of the draw generateFigure is building (see selected)
+        global componentTimeRanges
+        componentTimeRanges = {} #first/last timestamps of kymos and scans, by file path and component
+        global savedColorKey
+        savedColorKey = None #file, component and memory-map option of saved_color_data
+        global drawJob
+        drawJob = {'id': 0, 'cancel': None, 'request': None, 'active': False, 'poll': None} #poll: after() id of the scheduled poll_draw_queue
+        global drawQueue
+        drawQueue = queue.Queue()
+        global drawExecutor
+        drawExecutor = ThreadPoolExecutor(max_workers=1) #one draw is prepared at a time
+        global photonCountCache
+        photonCountCache = PhotonCountCache(maxMemoryMB=defaultDict['photonCacheMemoryMB'],maxDiskMB=defaultDict['photonCacheDiskMB'])
+        global h5Prefetcher
+        h5Prefetcher = NeighbourPrefetcher(h5FileCache,photonCountCache,memoryBudgetMB=defaultDict['prefetchMemoryBudgetMB'])
+        global stackFrameBuffer
+        stackFrameBuffer = StackFrameBuffer(maxMemoryMB=defaultDict['stackBufferMemoryMB'])
+        global stackViewer
+        stackViewer = None #image, highlight and frame times of the plotted scan stack
 
         #add directory system - values to be assigned dynamically later
         frameForFileAccess = tk.ttk.Frame(master)
@@ -2974,13 +5562,28 @@ class CTrapGUI():
         
         buttonToExtractPhotonCounts = tk.ttk.Button(frameForColorOpt,text="Extract Photon Counts")
         buttonToExtractPhotonCounts.grid(row=7,column=0,columnspan=1,pady=6)
-        extractPhotonCountsOpt = tk.ttk.Combobox(frameForColorOpt,values=[".tif",".xlsx"],width=5)
+        extractPhotonCountsOpt = tk.ttk.Combobox(frameForColorOpt,values=[".tif",".xlsx",".npz",".parquet",".zarr"],width=7)
         extractPhotonCountsOpt.grid(row=7,column=1,columnspan=1,padx=2,pady=2)
         extractPhotonCountsOpt.current('0')
         buttonToExtractLineScans = tk.ttk.Button(frameForColorOpt,text="Extract Line Scans")
         buttonToExtractLineScans.grid(row=6,column=0,columnspan=1,pady=2)
         comboboxForLineScan = tk.ttk.Combobox(frameForColorOpt,values=['Vert.','Horiz.'],width=5)
         comboboxForLineScan.grid(row=6,column=1,columnspan=1,padx=2,pady=2)
+        
+        #gamma and percentile auto-scaling of the photon count lookup tables (leave auto-scale empty to use the multipliers)
+        tk.ttk.Label(frameForColorOpt,text="Gamma").grid(row=9,column=0,sticky='w')
+        entryGamma = tk.ttk.Entry(frameForColorOpt,width=6)
+        entryGamma.insert(0,str(defaultDict['gamma']))
+        entryGamma.grid(row=9,column=1)
+        tk.ttk.Label(frameForColorOpt,text="Auto-Scale Percentile").grid(row=10,column=0,sticky='w')
+        entryAutoScale = tk.ttk.Entry(frameForColorOpt,width=6)
+        entryAutoScale.insert(0,str(defaultDict['autoScalePercentile']))
+        entryAutoScale.grid(row=10,column=1)
+        
+        #memory-mapped images are read from a .npy file on disk instead of being held in memory (for kymographs larger than RAM)
+        memoryMapOpt = tk.BooleanVar(value=defaultDict['memoryMapImages'])
+        tk.ttk.Label(frameForColorOpt,text="Memory-Map Images").grid(row=8,column=0,columnspan=1,sticky='w')
+        tk.ttk.Checkbutton(frameForColorOpt,variable=memoryMapOpt,command=lambda: preload_RGB_and_changeSaveName(1) if typePulldown.get() != '' else None).grid(row=8,column=1)
         comboboxForLineScan.current('0')
         
             
@@ -3090,20 +5693,37 @@ class CTrapGUI():
         updateH5File.grid(row=0,column=0,columnspan=5,pady=1,sticky="e")
         updatePlot = tk.ttk.Button(buttonFrame,text="Draw Plot",width=buttonWidth)
         updatePlot.pack(side="top",padx=4,pady=2)
+        drawStatusFrame = tk.ttk.Frame(buttonFrame)
+        drawStatusFrame.pack(side="top",fill="x",padx=4)
+        drawProgress = tk.ttk.Progressbar(drawStatusFrame,mode='determinate',maximum=1.0,length=100)
+        drawProgress.grid(row=0,column=0,sticky="w")
+        cancelDrawButton = tk.ttk.Button(drawStatusFrame,text="Cancel",width=8)
+        cancelDrawButton.grid(row=0,column=1,padx=2)
+        cancelDrawButton.state(['disabled'])
+        drawStatusLabel = tk.ttk.Label(drawStatusFrame,text="",font=('Helvetica', 8))
+        drawStatusLabel.grid(row=1,column=0,columnspan=2,sticky="w")
         exportForceButton = tk.ttk.Button(buttonFrame,text="Export Force",width=buttonWidth)
         exportForceButton.pack(side="top",padx=4,pady=2)
+        buildForceIndexButton = tk.ttk.Button(buttonFrame,text="Build Force Index",width=buttonWidth)
+        buildForceIndexButton.pack(side="top",padx=4,pady=2)
         exportImageButton = tk.ttk.Button(buttonFrame,text="Export Image No Axis",width=buttonWidth)
         exportImageButton.pack(side="top",padx=4,pady=2)
         exportForImageJ = tk.ttk.Button(buttonFrame,text="Export ImageJ Montage",width=buttonWidth)
         exportForImageJ.pack(side="top",padx=4,pady=2)
+        exportOMETiffButton = tk.ttk.Button(buttonFrame,text="Export OME-TIFF Stack",width=buttonWidth)
+        exportOMETiffButton.pack(side="top",padx=4,pady=2)
+        omeRawCountsOpt = tk.BooleanVar()
+        tk.ttk.Checkbutton(buttonFrame,text="OME-TIFF Raw Photon Counts",variable=omeRawCountsOpt).pack(side="top",anchor="w",padx=4)
         openKymotrackerButton = tk.ttk.Button(buttonFrame,text="Open KymoTracker",width=buttonWidth)
         openKymotrackerButton.pack(side="top",padx=4,pady=2)
         saveImageButton = tk.ttk.Button(buttonFrame,text="Save GUI Image",width=buttonWidth)
         saveImageButton.pack(side="top",padx=4,pady=2)
+        savePlotSettingsButton = tk.ttk.Button(buttonFrame,text="Save Plot Settings",width=buttonWidth)
+        savePlotSettingsButton.pack(side="top",padx=4,pady=2)
         quitButton = tk.ttk.Button(buttonFrame,text="Quit?",width=buttonWidth) #button to quit Tkinter GUI
         quitButton.pack(side="top",padx=4,pady=2)
         tk.ttk.Label(buttonFrame,text="Keyboard Shortcuts:",font=('Helvetica', 10, 'bold'),justify="left").pack(side="top",anchor="w",padx=4)
-        tk.ttk.Label(buttonFrame,text="Enter - Build Plot\nCtrl+O - Change Directory\nCtrl+C - Copy Data to Clipboard\nCtrl+R - Extract Photon Counts\nCtrl+S - Save GUI Image\nCtrl+K - Open KymoTracker\nEsc - Quit the GUI",justify="left",font=('Helvetica', 8)).pack(side="top",anchor="nw",padx=4)
+        tk.ttk.Label(buttonFrame,text="Enter - Build Plot\nCtrl+O - Change Directory\nCtrl+C - Copy Data to Clipboard\nCtrl+R - Extract Photon Counts\nCtrl+S - Save GUI Image\nCtrl+K - Open KymoTracker\nPage Down/Up - Next/Previous File\nEsc - Quit the GUI",justify="left",font=('Helvetica', 8)).pack(side="top",anchor="nw",padx=4)
         
         #Inputs and Labels for metadata
         frameForMetadata = tk.ttk.Frame(master)
@@ -3133,19 +5753,32 @@ class CTrapGUI():
         plotScanTime = tk.ttk.Checkbutton(frameForSlider,var=multiScanPlotOpt)
         #plotScanTime.select()
         plotScanTime.grid(row=4,column=1,pady=2,sticky="e")
+        
+        stackPlayback = {'running': False, 'job': None}
+        playStackButton = tk.ttk.Button(frameForSlider,text="Play",width=6)
+        playStackButton.grid(row=5,column=0,pady=2,sticky="nw")
+        tk.ttk.Label(frameForSlider,text="Frames/s:").grid(row=5,column=1,sticky="e")
+        entryStackFPS = tk.ttk.Entry(frameForSlider,width=4,justify=tk.CENTER)
+        entryStackFPS.insert(0,str(defaultDict['stackPlaybackFPS']))
+        entryStackFPS.grid(row=5,column=2,pady=2,sticky="nw")
                 
         #bind the proper buttons to the desired functions
         quitButton.bind("<ButtonRelease-1>",totalQuit)
         updateH5File.bind("<ButtonRelease-1>",changeH5FileDir)
         exportForceButton.bind("<ButtonRelease-1>",extractForceMethod)
+        buildForceIndexButton.bind("<ButtonRelease-1>",buildForceIndex)
         exportImageButton.bind("<ButtonRelease-1>",extractImageCTrap)
         exportForImageJ.bind("<ButtonRelease-1>",extractImageImageJ)
+        exportOMETiffButton.bind("<ButtonRelease-1>",extractImageOMETiff)
+        playStackButton.bind("<ButtonRelease-1>",toggleStackPlayback)
         directoryPulldown.bind("<<ComboboxSelected>>",changeFileComponents)
         updatePlot.bind("<ButtonRelease-1>",buildPlot)
+        cancelDrawButton.bind("<ButtonRelease-1>",cancelDraw)
         typePulldown.bind("<<ComboboxSelected>>",preload_RGB_and_changeSaveName)
         openKymotrackerButton.bind("<ButtonRelease-1>",callKymotracker)
         buttonToExtractPhotonCounts.bind("<ButtonRelease-1>",extract_photon_counts)
         saveImageButton.bind("<ButtonRelease-1>",saveFigure)
+        savePlotSettingsButton.bind("<ButtonRelease-1>",savePlotSettings)
         buttonToExtractLineScans.bind("<ButtonPress-1>",extract_line_scans_by_click)
         
         #bind keyboard shortcuts
@@ -3159,12 +5792,19 @@ class CTrapGUI():
         master.bind("<Control-S>",saveFigure)
         master.bind("<Control-k>",callKymotracker)
         master.bind("<Control-K>",callKymotracker)
+        master.bind("<Next>",next_file)
+        master.bind("<Prior>",previous_file)
         master.bind("<Return>",buildPlot)
         master.bind("<Escape>",totalQuit)
     
 #call commands to open the gui class and loop continuosly
-root = tk.Tk()
-root.title('C-TrapVis v1.0.1')
-root.config(bg="gray94")
-my_gui = CTrapGUI(root) #call the Application class
-root.mainloop()
\ No newline at end of file
+#(guarded so the process pool of the image export can import this file without opening another GUI)
+#with arguments the figures are rendered without the GUI, e.g. python CTrapVis.py --render FOLDER --components "kymos-*" --settings settings.json
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(batch_render_main(sys.argv[1:]))
+    root = tk.Tk()
+    root.title('C-TrapVis v1.0.1')
+    root.config(bg="gray94")
+    my_gui = CTrapGUI(root) #call the Application class
+    root.mainloop()
\ No newline at end of file
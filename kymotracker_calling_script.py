@@ -109,6 +109,7 @@ from tkinter import filedialog
 from tkinter import *
 import sys
 import os
+from kymotracker_tiles import track_kymograph_tiled
 
 def extract_lines_data(filepath,dict_kymotracking_method_storage, color_list, h5_kymo_object=""):        
     string_size_inside_loop = 74
@@ -228,22 +229,23 @@ def extract_lines_data(filepath,dict_kymotracking_method_storage, color_list, h5
         rescaled_area_of_analysis = rescaled_area_of_analysis.astype(int)
         
         while happy_with_kymotracking != "yes":
+            # long kymographs are tracked as overlapping time tiles on all cores and stitched back together (see kymotracker_tiles.py)
             if tracking_method == 1:
-                lines_tracked = lk.track_greedy(photon_count_area_of_analysis,
-                                                line_width=kymotracker_dict_values["line_width"],
-                                                pixel_threshold=kymotracker_dict_values["pixel_threshold"],
-                                                window = kymotracker_dict_values["window"],
-                                                sigma = kymotracker_dict_values["sigma"],
-                                                vel = kymotracker_dict_values["vel"],
-                                                diffusion = kymotracker_dict_values["diffusion"],
-                                                sigma_cutoff = kymotracker_dict_values["sigma_cutoff"])
+                lines_tracked = track_kymograph_tiled(photon_count_area_of_analysis, "Greedy",
+                                                dict(line_width=kymotracker_dict_values["line_width"],
+                                                     pixel_threshold=kymotracker_dict_values["pixel_threshold"],
+                                                     window = kymotracker_dict_values["window"],
+                                                     sigma = kymotracker_dict_values["sigma"],
+                                                     vel = kymotracker_dict_values["vel"],
+                                                     diffusion = kymotracker_dict_values["diffusion"],
+                                                     sigma_cutoff = kymotracker_dict_values["sigma_cutoff"]))
             else:
-                lines_tracked = lk.track_lines(photon_count_area_of_analysis,    
-                                               line_width = kymotracker_dict_values["line_width"],
-                                               max_lines = kymotracker_dict_values["max_lines"],
-                                               start_threshold = kymotracker_dict_values["start_threshold"],
-                                               continuation_threshold = kymotracker_dict_values["continuation_threshold"],
-                                               angle_weight = kymotracker_dict_values["angle_weight"])
+                lines_tracked = track_kymograph_tiled(photon_count_area_of_analysis, "Lines",
+                                               dict(line_width = kymotracker_dict_values["line_width"],
+                                                    max_lines = kymotracker_dict_values["max_lines"],
+                                                    start_threshold = kymotracker_dict_values["start_threshold"],
+                                                    continuation_threshold = kymotracker_dict_values["continuation_threshold"],
+                                                    angle_weight = kymotracker_dict_values["angle_weight"]))
                 
             filtered_tracked_lines = lk.filter_lines(lines_tracked,kymotracker_dict_values["filter_line_length"])
             
@@ -578,199 +580,201 @@ def extract_lines_data(filepath,dict_kymotracking_method_storage, color_list, h5
     
     return dict_kymotracking_method_storage, metadataDict
 
-# call tkinter dialog box to let the user navigate to the desired folder
-root = Tk()
-root.withdraw()
-folder_selected = filedialog.askdirectory()
-os.chdir(folder_selected)
-
-# collect candidate files
-filelist_1 = glob.glob("*.tdms")
-filelist_2 = glob.glob("*.h5")
-filelist = filelist_1 + filelist_2
-
-#pre-define variables
-tracking_method = 0
-file_name = 0
-colors_to_track = 0
-opt_to_extract_intensities = 0
-opt_to_extract_distance_between_foci = 0
-opt_for_area_selection = 0
-def_line_width =0
-color_to_track_distance = 0
-
-#add an option to manually define the answers
-if len(sys.argv) > 1:
-    for string_input in sys.argv:
-        if "tracking_method" in string_input:
-            if "greedy" in string_input:
-                tracking_method=1
-            if "lines" in string_input:
-                tracking_method=2
-        if "line_width" in string_input:
-            def_line_width = int((string_input.split("="))[-1])
-        if "file_name" in string_input:
-            file_name = (string_input.split("="))[-1]
-        if "colors_to_track" in string_input:
-            colors_to_track = (string_input.split("="))[-1].upper()
-        if "opt_to_extract_intensities" in string_input:
-            opt_to_extract_intensities = (string_input.split("="))[-1].lower()
-            if opt_to_extract_intensities != "yes" and opt_to_extract_intensities != "no":
-                opt_to_extract_intensities=0
-        if "opt_to_extract_distance_between_foci" in string_input:
-            opt_to_extract_distance_between_foci = (string_input.split("="))[-1].lower()
-            if opt_to_extract_distance_between_foci != "yes" and opt_to_extract_distance_between_foci != "no":
-                opt_to_extract_distance_between_foci=0
-        if "opt_for_area_selection" in string_input:
-            opt_for_area_selection = int((string_input.split("="))[-1])
-            if opt_for_area_selection != 1 and opt_for_area_selection != 2:
-                opt_to_extract_distance_between_foci=0
-        if "color_to_track_distance" in string_input:
-            color_to_track_distance = (string_input.split("="))[-1].upper()
-            if color_to_track_distance != "R" and color_to_track_distance != "G" and color_to_track_distance != "B":
-                color_to_track_distance = 0
+# the tracking worker processes import this script again, so only run the analysis when it is called directly
+if __name__ == "__main__":
+    # call tkinter dialog box to let the user navigate to the desired folder
+    root = Tk()
+    root.withdraw()
+    folder_selected = filedialog.askdirectory()
+    os.chdir(folder_selected)
+
+    # collect candidate files
+    filelist_1 = glob.glob("*.tdms")
+    filelist_2 = glob.glob("*.h5")
+    filelist = filelist_1 + filelist_2
+
+    #pre-define variables
+    tracking_method = 0
+    file_name = 0
+    colors_to_track = 0
+    opt_to_extract_intensities = 0
+    opt_to_extract_distance_between_foci = 0
+    opt_for_area_selection = 0
+    def_line_width =0
+    color_to_track_distance = 0
+
+    #add an option to manually define the answers
+    if len(sys.argv) > 1:
+        for string_input in sys.argv:
+            if "tracking_method" in string_input:
+                if "greedy" in string_input:
+                    tracking_method=1
+                if "lines" in string_input:
+                    tracking_method=2
+            if "line_width" in string_input:
+                def_line_width = int((string_input.split("="))[-1])
+            if "file_name" in string_input:
+                file_name = (string_input.split("="))[-1]
+            if "colors_to_track" in string_input:
+                colors_to_track = (string_input.split("="))[-1].upper()
+            if "opt_to_extract_intensities" in string_input:
+                opt_to_extract_intensities = (string_input.split("="))[-1].lower()
+                if opt_to_extract_intensities != "yes" and opt_to_extract_intensities != "no":
+                    opt_to_extract_intensities=0
+            if "opt_to_extract_distance_between_foci" in string_input:
+                opt_to_extract_distance_between_foci = (string_input.split("="))[-1].lower()
+                if opt_to_extract_distance_between_foci != "yes" and opt_to_extract_distance_between_foci != "no":
+                    opt_to_extract_distance_between_foci=0
+            if "opt_for_area_selection" in string_input:
+                opt_for_area_selection = int((string_input.split("="))[-1])
+                if opt_for_area_selection != 1 and opt_for_area_selection != 2:
+                    opt_to_extract_distance_between_foci=0
+            if "color_to_track_distance" in string_input:
+                color_to_track_distance = (string_input.split("="))[-1].upper()
+                if color_to_track_distance != "R" and color_to_track_distance != "G" and color_to_track_distance != "B":
+                    color_to_track_distance = 0
     
-# add option to name summary files - printing out the file names to make sure user is happy with what is in the folder
-max_filepath_length = len(max(filelist,key=len))
-max_separator_string = 78
-if max_filepath_length > max_separator_string:
-    max_separator_string = max_filepath_length
-
-
-print('-'*max_separator_string)
-print('List of files to be analyzed')
-print('#'*max_separator_string)
-for file in filelist:
-    print(file)
-print('#'*max_separator_string)
-if file_name == 0:
-    file_name = input("Please sort the files so that only similar experiments are in the same folder:\nInput file name to save (do not add any file extension)?\n")
-print('-'*max_separator_string)
-
-if tracking_method == 0:
-    tracking_method = int(input("\n" + '-'*max_separator_string + "\nPlease indicate desired tracking method from the lumicks.pylake options\n[1] track_greedy\n[2] track_lines\nInput integer number of the correct method:\n"))
-
-#allow for mistakes in the user input
-if tracking_method != 1 and tracking_method != 2:
-    while tracking_method != 1 and tracking_method !=2:
-        tracking_method = int(input("\n" + '#'*max_separator_string + "\nPlease re-indicate desired tracking method\n[1] track_greedy\n[2] track_lines\n\nInput integer number of the correct method\nDo not include brackets in the input\n" + '#'*max_separator_string + "\n"))
-
-#call correct dictionary
-dict_kymotracking_method_storage = {}
-if tracking_method == 1:
-    dict_kymotracking_method_storage["line_width"] = []
-    dict_kymotracking_method_storage["pixel_threshold"] = []  
-    dict_kymotracking_method_storage["window"] = []  
-    dict_kymotracking_method_storage["sigma"] = []  
-    dict_kymotracking_method_storage["vel"] = []  
-    dict_kymotracking_method_storage["diffusion"] = []  
-    dict_kymotracking_method_storage["sigma_cutoff"] = []
-    dict_kymotracking_method_storage["filter_line_length"] = []  
-    dict_kymotracking_method_storage["color_tracked_list"] = []
-elif tracking_method == 2:
-    dict_kymotracking_method_storage["line_width"] = []
-    dict_kymotracking_method_storage["max_lines"] = []  
-    dict_kymotracking_method_storage["start_threshold"] = []  
-    dict_kymotracking_method_storage["continuation_threshold"] = []  
-    dict_kymotracking_method_storage["angle_weight"] = []  
-    dict_kymotracking_method_storage["filter_line_length"] = []  
-    dict_kymotracking_method_storage["color_tracked_list"] = []
-else: #exit script in a controlled manner if user does not input a correct number
-    print("Correct input was not detected in the tracking method input\nPlease input the number without brackets next time\nEnding Program")
-    exit()
-
-# get user inputs
-if colors_to_track == 0:
+    # add option to name summary files - printing out the file names to make sure user is happy with what is in the folder
+    max_filepath_length = len(max(filelist,key=len))
+    max_separator_string = 78
+    if max_filepath_length > max_separator_string:
+        max_separator_string = max_filepath_length
+
+
     print('-'*max_separator_string)
-    colors_to_track = input("\n" + '-'*max_separator_string + "\nChoose colors to track for all files\nInput RGB values, Ex: RG or RGB:\n").upper()
-    print('-'*max_separator_string+"\n")
-if opt_to_extract_intensities == 0:
+    print('List of files to be analyzed')
+    print('#'*max_separator_string)
+    for file in filelist:
+        print(file)
+    print('#'*max_separator_string)
+    if file_name == 0:
+        file_name = input("Please sort the files so that only similar experiments are in the same folder:\nInput file name to save (do not add any file extension)?\n")
     print('-'*max_separator_string)
-    opt_to_extract_intensities = input("Would you like to extract the photon counts sum of the lines?\nInput yes/no:\n").lower()
-    print('-'*max_separator_string+"\n")
 
-if len(colors_to_track) > 1:
-    if opt_to_extract_distance_between_foci == 0:
+    if tracking_method == 0:
+        tracking_method = int(input("\n" + '-'*max_separator_string + "\nPlease indicate desired tracking method from the lumicks.pylake options\n[1] track_greedy\n[2] track_lines\nInput integer number of the correct method:\n"))
+
+    #allow for mistakes in the user input
+    if tracking_method != 1 and tracking_method != 2:
+        while tracking_method != 1 and tracking_method !=2:
+            tracking_method = int(input("\n" + '#'*max_separator_string + "\nPlease re-indicate desired tracking method\n[1] track_greedy\n[2] track_lines\n\nInput integer number of the correct method\nDo not include brackets in the input\n" + '#'*max_separator_string + "\n"))
+
+    #call correct dictionary
+    dict_kymotracking_method_storage = {}
+    if tracking_method == 1:
+        dict_kymotracking_method_storage["line_width"] = []
+        dict_kymotracking_method_storage["pixel_threshold"] = []  
+        dict_kymotracking_method_storage["window"] = []  
+        dict_kymotracking_method_storage["sigma"] = []  
+        dict_kymotracking_method_storage["vel"] = []  
+        dict_kymotracking_method_storage["diffusion"] = []  
+        dict_kymotracking_method_storage["sigma_cutoff"] = []
+        dict_kymotracking_method_storage["filter_line_length"] = []  
+        dict_kymotracking_method_storage["color_tracked_list"] = []
+    elif tracking_method == 2:
+        dict_kymotracking_method_storage["line_width"] = []
+        dict_kymotracking_method_storage["max_lines"] = []  
+        dict_kymotracking_method_storage["start_threshold"] = []  
+        dict_kymotracking_method_storage["continuation_threshold"] = []  
+        dict_kymotracking_method_storage["angle_weight"] = []  
+        dict_kymotracking_method_storage["filter_line_length"] = []  
+        dict_kymotracking_method_storage["color_tracked_list"] = []
+    else: #exit script in a controlled manner if user does not input a correct number
+        print("Correct input was not detected in the tracking method input\nPlease input the number without brackets next time\nEnding Program")
+        exit()
+
+    # get user inputs
+    if colors_to_track == 0:
         print('-'*max_separator_string)
-        opt_to_extract_distance_between_foci = input("Would you like to extract the distance between tracked lines?\nInput yes/no:\n").lower()
-        if opt_to_extract_distance_between_foci == "yes":
-            color_to_track_distance = input("What color would you like to use as the base for extracting this distance?\nInput R/G/B\n")
+        colors_to_track = input("\n" + '-'*max_separator_string + "\nChoose colors to track for all files\nInput RGB values, Ex: RG or RGB:\n").upper()
         print('-'*max_separator_string+"\n")
-    elif opt_to_extract_distance_between_foci == "yes" and color_to_track_distance == 0:
+    if opt_to_extract_intensities == 0:
         print('-'*max_separator_string)
-        color_to_track_distance = input("What color would you like to use as the base for extracting this distance?\nInput R/G/B\n")
+        opt_to_extract_intensities = input("Would you like to extract the photon counts sum of the lines?\nInput yes/no:\n").lower()
         print('-'*max_separator_string+"\n")
+
+    if len(colors_to_track) > 1:
+        if opt_to_extract_distance_between_foci == 0:
+            print('-'*max_separator_string)
+            opt_to_extract_distance_between_foci = input("Would you like to extract the distance between tracked lines?\nInput yes/no:\n").lower()
+            if opt_to_extract_distance_between_foci == "yes":
+                color_to_track_distance = input("What color would you like to use as the base for extracting this distance?\nInput R/G/B\n")
+            print('-'*max_separator_string+"\n")
+        elif opt_to_extract_distance_between_foci == "yes" and color_to_track_distance == 0:
+            print('-'*max_separator_string)
+            color_to_track_distance = input("What color would you like to use as the base for extracting this distance?\nInput R/G/B\n")
+            print('-'*max_separator_string+"\n")
     
-if opt_for_area_selection == 0:
-    print('-'*max_separator_string)
-    opt_for_area_selection = int(input("Choose option of how to manually input the area of analysis:\n[1] Manually define top and bottom positions of a rectangle to analyze\n[2] Manually define a more complex region (containing pulls and relaxes)\nInput integer number of the correct method\n"))
-    print('-'*max_separator_string+"\n")
-
-writer= pd.ExcelWriter(file_name+"_summary.xlsx", engine = "xlsxwriter")
-output_file = open(file_name + "_metadata_doc.csv","w")
-
-#write the metadata dictionary in a separate file
-output_file.write("Notes:\n")
-if tracking_method == 1:
-    output_file.write("Lumicks' track_greedy alogrithim is used to track lines in the trace and extract different data types\n")
-elif tracking_method == 2:
-    output_file.write("Lumicks' track_lines alogrithim is used to track lines in the trace and extract different data types\n")
-output_file.write(f"Metadata for {file_name}_summary.xlsx - all traces:\n\n")
-
-tdms_count = 1
-h5_count = 1
-for filepath in filelist:
-    if ".tdms" in filepath:        
-        #call the line extraction function
-        dict_kymotracking_method_storage, metadataDict = extract_lines_data(filepath,dict_kymotracking_method_storage, color_list=colors_to_track)
+    if opt_for_area_selection == 0:
+        print('-'*max_separator_string)
+        opt_for_area_selection = int(input("Choose option of how to manually input the area of analysis:\n[1] Manually define top and bottom positions of a rectangle to analyze\n[2] Manually define a more complex region (containing pulls and relaxes)\nInput integer number of the correct method\n"))
+        print('-'*max_separator_string+"\n")
+
+    writer= pd.ExcelWriter(file_name+"_summary.xlsx", engine = "xlsxwriter")
+    output_file = open(file_name + "_metadata_doc.csv","w")
+
+    #write the metadata dictionary in a separate file
+    output_file.write("Notes:\n")
+    if tracking_method == 1:
+        output_file.write("Lumicks' track_greedy alogrithim is used to track lines in the trace and extract different data types\n")
+    elif tracking_method == 2:
+        output_file.write("Lumicks' track_lines alogrithim is used to track lines in the trace and extract different data types\n")
+    output_file.write(f"Metadata for {file_name}_summary.xlsx - all traces:\n\n")
+
+    tdms_count = 1
+    h5_count = 1
+    for filepath in filelist:
+        if ".tdms" in filepath:        
+            #call the line extraction function
+            dict_kymotracking_method_storage, metadataDict = extract_lines_data(filepath,dict_kymotracking_method_storage, color_list=colors_to_track)
         
-        #write out metadata information to see difference in file type
-        if tdms_count == 1: # write headers
-            tdms_count += 1
-            output_file.write(",")
-            # write column headings
-            for key in metadataDict:
-                output_file.write(f"{str(key)},")
-            output_file.write("\n")
-            for key in metadataDict:
-                temp_string_to_write = str(metadataDict[key]).replace('\n',' ')
-                output_file.write(temp_string_to_write)
-                output_file.write(",")
-            output_file.write("\n")
-        else:
-            output_file.write(f"{filepath},")
-            for key in metadataDict:
-                temp_string_to_write = str(metadataDict[key]).replace('\n',' ')
-                output_file.write(temp_string_to_write)
+            #write out metadata information to see difference in file type
+            if tdms_count == 1: # write headers
+                tdms_count += 1
                 output_file.write(",")
-            output_file.write("\n")
-    
-    elif ".h5" in filepath:
-        h5_file_object = lk.File(filepath)
-        kymo_obj_list = list(h5_file_object.kymos)
-        
-        for kymo_obj in kymo_obj_list:
-            dict_kymotracking_method_storage, metadataDict = extract_lines_data(filepath,dict_kymotracking_method_storage, color_list=colors_to_track,h5_kymo_object=kymo_obj)
-            
-            metadataString = metadataDict.replace("\n",",")            
-            if h5_count == 1: # write headers
-                h5_count +=1    
-                output_file.write("Filepath,Kymograph Pointer,Description by Channel,")
+                # write column headings
+                for key in metadataDict:
+                    output_file.write(f"{str(key)},")
                 output_file.write("\n")
-                output_file.write(f"{filepath},")
-                output_file.write(f"{kymo_obj},")
-                output_file.write(f"{metadataString},")
+                for key in metadataDict:
+                    temp_string_to_write = str(metadataDict[key]).replace('\n',' ')
+                    output_file.write(temp_string_to_write)
+                    output_file.write(",")
                 output_file.write("\n")
-            else: # write metadata
+            else:
                 output_file.write(f"{filepath},")
-                output_file.write(f"{kymo_obj},")
-                output_file.write(f"{metadataString},")
+                for key in metadataDict:
+                    temp_string_to_write = str(metadataDict[key]).replace('\n',' ')
+                    output_file.write(temp_string_to_write)
+                    output_file.write(",")
                 output_file.write("\n")
-
-# convert the dictionary of kymotracker settings used for this folder as the last sheet in the summary document
-pd_data_frame = pd.DataFrame.from_dict(dict_kymotracking_method_storage)
-pd_data_frame.to_excel(writer,sheet_name="Kymotracker Settings",index=False,header=True)
-
-# properly save and close both the .xlsx summary document and the metadata .csv file
-writer.save()
-output_file.close()
\ No newline at end of file
+    
+        elif ".h5" in filepath:
+            h5_file_object = lk.File(filepath)
+            kymo_obj_list = list(h5_file_object.kymos)
+        
+            for kymo_obj in kymo_obj_list:
+                dict_kymotracking_method_storage, metadataDict = extract_lines_data(filepath,dict_kymotracking_method_storage, color_list=colors_to_track,h5_kymo_object=kymo_obj)
+            
+                metadataString = metadataDict.replace("\n",",")            
+                if h5_count == 1: # write headers
+                    h5_count +=1    
+                    output_file.write("Filepath,Kymograph Pointer,Description by Channel,")
+                    output_file.write("\n")
+                    output_file.write(f"{filepath},")
+                    output_file.write(f"{kymo_obj},")
+                    output_file.write(f"{metadataString},")
+                    output_file.write("\n")
+                else: # write metadata
+                    output_file.write(f"{filepath},")
+                    output_file.write(f"{kymo_obj},")
+                    output_file.write(f"{metadataString},")
+                    output_file.write("\n")
+
+    # convert the dictionary of kymotracker settings used for this folder as the last sheet in the summary document
+    pd_data_frame = pd.DataFrame.from_dict(dict_kymotracking_method_storage)
+    pd_data_frame.to_excel(writer,sheet_name="Kymotracker Settings",index=False,header=True)
+
+    # properly save and close both the .xlsx summary document and the metadata .csv file
+    writer.save()
+    output_file.close()
\ No newline at end of file
@@ -0,0 +1,270 @@
+"""
+#################################################################################################
+BSD 2-Clause License
+Copyright (c) 2022, John Watters
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#################################################################################################
+
+Tiled line tracking for long kymographs, shared by the KymoTracker in CTrapVis.py and
+kymotracker_calling_script.py.
+
+lumicks.pylake tracks a whole region of interest in one call on one core. Here the region is split
+into time tiles that overlap by a few line times, every tile is tracked on its own in a process
+pool and the track fragments are stitched back together across the tile seams:
+- every seam lies in the middle of the overlap of two tiles, so both tiles have tracked the points
+  around it at least half an overlap away from their edges
+- a fragment ending in the overlap is joined to the fragment of the next tile that follows the same
+  positions (within the line width) while both exist in the overlap
+- every fragment only contributes the points between its two seams, so no point is taken twice
+Lines are neither filtered by length nor refined per tile - do that on the stitched lines.
+track_lines with a max_lines limit is never tiled, since the limit would apply to every tile
+instead of to the whole region.
+
+Kymographs shorter than two tiles are tracked in one call without a process pool.
+"""
+
+import numpy as np
+import lumicks.pylake as lk
+import math
+import os
+import copy
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+
+"""
+Copies an image channel into a new shared memory block so tracking worker processes can read it
+without it being pickled through the pool. Returns the SharedMemory (close and unlink it once the
+workers are done with it) and the (name, shape, dtype) needed to attach to it again.
+"""
+def share_channel_data(channelData):
+    channelData = np.ascontiguousarray(channelData)
+    sharedMemory = shared_memory.SharedMemory(create=True, size=max(channelData.nbytes, 1))
+    np.ndarray(channelData.shape, dtype=channelData.dtype, buffer=sharedMemory.buf)[...] = channelData
+    return sharedMemory, (sharedMemory.name, channelData.shape, channelData.dtype.str)
+
+"""
+Runs lk.track_greedy (trackingMethod 'Greedy') or lk.track_lines (anything else) on one image
+with trackingParameters as the keyword arguments
+"""
+def track_image(imageData, trackingMethod, trackingParameters):
+    if trackingMethod == "Greedy":
+        return lk.track_greedy(imageData, **trackingParameters)
+    return lk.track_lines(imageData, **trackingParameters)
+
+"""
+Removes the image from tracked lines so only their coordinates are pickled back from a worker
+"""
+def detach_channel_data(lines):
+    for line in lines:
+        if getattr(line, "image_data", None) is not None:
+            line.image_data = None
+    return lines
+
+"""
+Binds lines returned by a tracking worker to the channel they were tracked on, so
+sample_from_image and the centroid refinement work on them
+"""
+def attach_channel_data(lines, channelData):
+    for line in lines:
+        if hasattr(line, "image_data"):
+            line.image_data = channelData
+    return lines
+
+"""
+Time and coordinate indices of a tracked line as float arrays
+"""
+def line_arrays(line):
+    return np.asarray(line.time_idx, dtype=np.float64), np.asarray(line.coordinate_idx, dtype=np.float64)
+
+"""
+Copy of a tracked line with new time and coordinate indices, in the same container type
+(list or array) that pylake used for the template
+"""
+def rebuild_line(templateLine, timeIndices, coordinateIndices):
+    line = copy.copy(templateLine)
+    if isinstance(templateLine.time_idx, list):
+        line.time_idx = timeIndices.tolist()
+    else:
+        line.time_idx = timeIndices
+    if isinstance(templateLine.coordinate_idx, list):
+        line.coordinate_idx = coordinateIndices.tolist()
+    else:
+        line.coordinate_idx = coordinateIndices
+    return line
+
+"""
+Default tile length for a kymograph of numTimePoints line times: one tile per worker, but never
+shorter than minTileLength so the overlaps stay a small part of every tile
+"""
+def choose_tile_length(numTimePoints, numWorkers=None, minTileLength=2048):
+    numWorkers = numWorkers or os.cpu_count() or 1
+    return max(minTileLength, math.ceil(numTimePoints / numWorkers))
+
+"""
+Overlap (in line times) between neighbouring tiles: several times the number of lines a particle
+may disappear for (greedy window) and the line width, at least 64
+"""
+def tile_overlap(trackingParameters):
+    return int(max(64, 4 * trackingParameters.get('window', 0), 4 * trackingParameters.get('line_width', 0)))
+
+"""
+Splits numTimePoints line times into tiles of tileLength plus overlap into the next tile.
+A last tile shorter than the overlap is merged into the one before it.
+Returns a list of (start, stop) time indices.
+"""
+def plan_time_tiles(numTimePoints, tileLength, overlap):
+    starts = list(range(0, numTimePoints, tileLength))
+    if len(starts) > 1 and numTimePoints - starts[-1] <= overlap:
+        starts.pop()
+    return [(start, min(numTimePoints, start + tileLength + overlap)) for start in starts[:-1]] + [(starts[-1], numTimePoints)]
+
+"""
+Tiles a kymograph of numTimePoints line times is tracked in (plan_time_tiles with the default tile
+length and overlap unless they are given). track_lines with a max_lines limit gets one tile over the
+whole channel, so it returns the same lines as tracking the whole image.
+"""
+def plan_tracking_tiles(numTimePoints, trackingMethod, trackingParameters, tileLength=None, overlap=None, maxWorkers=None):
+    if trackingMethod != "Greedy" and trackingParameters.get('max_lines') is not None:
+        return [(0, numTimePoints)]
+    tileLength = tileLength or choose_tile_length(numTimePoints, maxWorkers)
+    overlap = overlap or tile_overlap(trackingParameters)
+    return plan_time_tiles(numTimePoints, tileLength, overlap)
+
+"""
+Tracks the time tile [tileStart, tileStop) of a channel held in shared memory (runs in a tracking
+worker process). The returned lines are detached from the image and their time indices are those
+of the whole channel.
+"""
+def track_time_tile(sharedChannel, tileStart, tileStop, trackingMethod, trackingParameters):
+    sharedName, shape, dtype = sharedChannel
+    sharedMemory = shared_memory.SharedMemory(name=sharedName)
+    try:
+        channelData = np.ndarray(shape, dtype=dtype, buffer=sharedMemory.buf)
+        tileData = np.ascontiguousarray(channelData[:, tileStart:tileStop])
+        del channelData
+        lines = detach_channel_data(list(track_image(tileData, trackingMethod, trackingParameters)))
+        return [rebuild_line(line, np.asarray(line.time_idx) + tileStart, np.asarray(line.coordinate_idx)) for line in lines]
+    finally:
+        try:
+            sharedMemory.close()
+        except BufferError:
+            pass #a failed tracking run can still hold a view, the block is released with the worker
+
+"""
+Stitches the lines tracked per tile (tileLines[k] for tiles[k] of plan_time_tiles, with whole
+channel time indices) into lines across the whole channel. Fragments of neighbouring tiles are
+joined when they are on average within maxDistance pixels of each other while both exist in the
+overlap, closest pairs first. Every fragment keeps only its points between the seams (the middle
+of the overlaps) of its tile.
+Returns a list of (template line, time indices, coordinate indices) of the stitched lines.
+"""
+def stitch_tile_lines(tileLines, tiles, maxDistance):
+    seams = [(tiles[k][0] + tiles[k-1][1]) // 2 for k in range(1, len(tiles))]
+    windows = [(seams[k-1] if k > 0 else -np.inf, seams[k] if k < len(seams) else np.inf) for k in range(len(tiles))]
+
+    tracks = [] #every track is a list of (tile index, fragment)
+    openTracks = []
+    for k, lines in enumerate(tileLines):
+        fragments = [(line, *line_arrays(line)) for line in lines]
+        fragments = [fragment for fragment in fragments if len(fragment[1]) > 0]
+        matchedFragments = set()
+        if k > 0:
+            overlapStart, overlapStop = tiles[k][0], tiles[k-1][1]
+            candidates = []
+            for trackIndex, track in enumerate(openTracks):
+                leftTimes, leftCoordinates = line_arrays(track[-1][1])
+                if leftTimes[-1] < overlapStart:
+                    continue
+                for fragmentIndex, (line, rightTimes, rightCoordinates) in enumerate(fragments):
+                    if rightTimes[0] >= overlapStop:
+                        continue
+                    first = max(leftTimes[0], rightTimes[0], overlapStart)
+                    last = min(leftTimes[-1], rightTimes[-1], overlapStop - 1)
+                    if last < first:
+                        continue
+                    sampleTimes = np.arange(math.ceil(first), math.floor(last) + 1)
+                    if len(sampleTimes) == 0:
+                        sampleTimes = np.array([first])
+                    distance = np.mean(np.abs(np.interp(sampleTimes, leftTimes, leftCoordinates) - np.interp(sampleTimes, rightTimes, rightCoordinates)))
+                    if distance <= maxDistance:
+                        candidates.append((distance, trackIndex, fragmentIndex))
+            matchedTracks = set()
+            for distance, trackIndex, fragmentIndex in sorted(candidates):
+                if trackIndex in matchedTracks or fragmentIndex in matchedFragments:
+                    continue
+                openTracks[trackIndex].append((k, fragments[fragmentIndex][0]))
+                matchedTracks.add(trackIndex)
+                matchedFragments.add(fragmentIndex)
+
+        for fragmentIndex, fragment in enumerate(fragments):
+            if fragmentIndex not in matchedFragments:
+                tracks.append([(k, fragment[0])])
+        openTracks = [track for track in tracks if track[-1][0] == k]
+
+    stitchedLines = []
+    for track in tracks:
+        timeParts = []
+        coordinateParts = []
+        for k, line in track:
+            timeIndices, coordinateIndices = np.asarray(line.time_idx), np.asarray(line.coordinate_idx)
+            keep = (timeIndices >= windows[k][0]) & (timeIndices < windows[k][1])
+            timeParts.append(timeIndices[keep])
+            coordinateParts.append(coordinateIndices[keep])
+        timeIndices = np.concatenate(timeParts)
+        if len(timeIndices) > 0:
+            stitchedLines.append((track[0][1], timeIndices, np.concatenate(coordinateParts)))
+    return stitchedLines
+
+"""
+Turns stitch_tile_lines output into pylake lines bound to channelData
+"""
+def build_stitched_lines(stitchedLines, channelData):
+    return attach_channel_data([rebuild_line(templateLine, timeIndices, coordinateIndices) for templateLine, timeIndices, coordinateIndices in stitchedLines], channelData)
+
+"""
+Tracks a whole (region of interest of a) kymograph channel, pos x time, as overlapping time tiles on
+a process pool and returns the stitched pylake lines bound to channelData (not filtered by length).
+trackingMethod is 'Greedy' or 'Lines' and trackingParameters the keyword arguments of lk.track_greedy
+or lk.track_lines. Channels shorter than two tiles (and track_lines with max_lines) are tracked in one
+call in this process.
+"""
+def track_kymograph_tiled(channelData, trackingMethod, trackingParameters, tileLength=None, overlap=None, maxWorkers=None, executor=None):
+    tiles = plan_tracking_tiles(channelData.shape[1], trackingMethod, trackingParameters, tileLength, overlap, maxWorkers)
+    if len(tiles) == 1:
+        return track_image(channelData, trackingMethod, trackingParameters)
+
+    sharedMemory, sharedChannel = share_channel_data(channelData)
+    tileJobs = [(sharedChannel, tileStart, tileStop, trackingMethod, trackingParameters) for tileStart, tileStop in tiles]
+    try:
+        if executor is None:
+            #spawned rather than forked, as the caller may be a GUI process that already runs threads
+            with ProcessPoolExecutor(max_workers=maxWorkers, mp_context=multiprocessing.get_context("spawn")) as tilePool:
+                tileLines = list(tilePool.map(track_time_tile, *zip(*tileJobs)))
+        else:
+            tileLines = list(executor.map(track_time_tile, *zip(*tileJobs)))
+    finally:
+        sharedMemory.close()
+        sharedMemory.unlink()
+    return build_stitched_lines(stitch_tile_lines(tileLines, tiles, trackingParameters.get('line_width', 1)), channelData)